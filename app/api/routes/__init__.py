@@ -9,3 +9,4 @@ from .ingredients import router as ingredients
 from .guests import router as guests
 from .news import router as news
 from .images import router as images
+from .export import router as export
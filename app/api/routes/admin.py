@@ -1,5 +1,9 @@
-from fastapi import APIRouter
-from app.db.sqlite_db import init_db
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.db.sqlite_db import init_db, get_sales_metrics, rebuild_sales_rollups, db_stats
+from app.db.maintenance import CHECKPOINT_MODES, checkpoint, maintenance_stats, run_maintenance
+from app.db import snapshots
+from app.services import menu_cache
 from app.config import settings
 from app.vector.reindex import reindex_all
 router = APIRouter()
@@ -14,3 +18,49 @@ def api_init_db():
 def api_reindex():
     n = reindex_all()
     return {'indexed': n}
+
+@router.get('/admin/metrics')
+def api_metrics(days: Optional[int] = Query(None, ge=1), hours: int = Query(48, ge=1, le=24 * 31),
+                top: int = Query(10, ge=1, le=100)):
+    """Метрики продаж из агрегатов; days — окно (по умолчанию вся история)"""
+    metrics = get_sales_metrics(days=days, hours=hours, top=top)
+    metrics['dishes_count'] = len(menu_cache.list_dishes({'is_available': 1}))
+    return metrics
+
+@router.post('/admin/metrics/rebuild')
+def api_rebuild_metrics():
+    rebuild_sales_rollups()
+    return {'ok': True}
+
+@router.get('/admin/db/stats')
+def api_db_stats():
+    """Пул соединений и очередь записи: глубина очереди, размер пачек, время COMMIT"""
+    return db_stats()
+
+@router.get('/admin/db/maintenance')
+def api_db_maintenance():
+    """Размер WAL, страницы базы, длительность последних checkpoint / optimize / ANALYZE"""
+    return maintenance_stats()
+
+@router.post('/admin/db/maintenance')
+def api_run_db_maintenance(checkpoint_mode: Optional[str] = Query(None)):
+    """Без параметров — полный проход обслуживания, с checkpoint_mode — только checkpoint"""
+    if checkpoint_mode is None:
+        return run_maintenance(force=True)
+    if checkpoint_mode.upper() not in CHECKPOINT_MODES:
+        raise HTTPException(status_code=400, detail=f"checkpoint_mode must be one of {', '.join(CHECKPOINT_MODES)}")
+    return checkpoint(checkpoint_mode)
+
+@router.get('/admin/db/snapshots')
+def api_db_snapshots():
+    """Ход текущего (последнего) снимка и список сохранённых снимков"""
+    return {'current': snapshots.snapshot_status(), 'snapshots': snapshots.list_snapshots()}
+
+@router.post('/admin/db/snapshots', status_code=202)
+def api_create_db_snapshot():
+    """Запускает онлайн-снимок в фоне; ход — GET /admin/db/snapshots"""
+    try:
+        snapshots.start_snapshot()
+    except snapshots.SnapshotInProgress:
+        raise HTTPException(status_code=409, detail="snapshot already running")
+    return {'started': True}
@@ -1,12 +1,17 @@
 # app/api/routes/categories.py
-from fastapi import APIRouter, Body, HTTPException
-from app.db.sqlite_db import list_categories, create_category
+from fastapi import APIRouter, Body, HTTPException, Request, Response
+from app.db.sqlite_db import create_category
+from app.services import menu_cache
 
 router = APIRouter()
 
 @router.get('/categories')
-def api_list_categories():
-    return list_categories()
+def api_list_categories(request: Request, response: Response):
+    menu = menu_cache.get_menu()
+    if menu_cache.etag_matches(request.headers.get('if-none-match'), menu.etag):
+        return Response(status_code=304, headers={'ETag': menu.etag})
+    response.headers['ETag'] = menu.etag
+    return menu_cache.list_categories(snapshot=menu)
 
 @router.post('/categories')
 def api_create_category(payload: dict = Body(...)):
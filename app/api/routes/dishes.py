@@ -1,6 +1,11 @@
 # app/api/routes/dishes.py
-from fastapi import APIRouter, HTTPException, Body
-from app.db.sqlite_db import list_dishes, get_dish, create_dish, update_dish, delete_dish
+import csv
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Body, File, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from app.db.sqlite_db import create_dish, update_dish, delete_dish, get_dish
+from app.services import menu_cache
+from app.services.menu_import import MenuImportError, import_menu, parse_csv
 from app.vector.reindex import reindex_dish
 
 router = APIRouter()
@@ -31,8 +36,15 @@ def add_image_url(dish: dict):
 # 🟢 GET /dishes — список блюд
 # =========================================================
 @router.get('/dishes')
-def api_list_dishes(category_id: int = None, spice_max: int = None,
-                    is_vegan: bool = None, max_price: float = None):
+def api_list_dishes(request: Request, response: Response,
+                    category_id: int = None, spice_max: int = None,
+                    is_vegan: bool = None, max_price: float = None,
+                    with_relations: bool = False,
+                    limit: Optional[int] = None, cursor: Optional[str] = None):
+    menu = menu_cache.get_menu()
+    if menu_cache.etag_matches(request.headers.get('if-none-match'), menu.etag):
+        return Response(status_code=304, headers={'ETag': menu.etag})
+    response.headers['ETag'] = menu.etag
 
     filters = {
         'category_id': category_id,
@@ -42,7 +54,18 @@ def api_list_dishes(category_id: int = None, spice_max: int = None,
         'max_price': max_price
     }
 
-    dishes = list_dishes(filters)
+    # постранично — только если клиент просил limit/cursor, иначе прежний массив
+    if limit is not None or cursor:
+        try:
+            page = menu_cache.list_dishes_page(filters, with_relations=with_relations,
+                                               limit=limit, cursor=cursor, snapshot=menu)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        page['items'] = [add_image_url(d) for d in page['items']]
+        return page
+
+    # из снимка меню в памяти; with_relations=true — сразу с tags/ingredients (для админки)
+    dishes = menu_cache.list_dishes(filters, with_relations=with_relations, snapshot=menu)
 
     # 🔥 ДОБАВЛЯЕМ image_url К КАЖДОМУ БЛЮДУ
     return [add_image_url(d) for d in dishes]
@@ -52,10 +75,14 @@ def api_list_dishes(category_id: int = None, spice_max: int = None,
 # 🟢 GET /dishes/{id} — одно блюдо
 # =========================================================
 @router.get('/dishes/{id}')
-def api_get_dish(id: int):
-    d = get_dish(id)
+def api_get_dish(id: int, request: Request, response: Response):
+    menu = menu_cache.get_menu()
+    d = menu_cache.get_dish(id, snapshot=menu)
     if not d:
         raise HTTPException(status_code=404, detail='not found')
+    if menu_cache.etag_matches(request.headers.get('if-none-match'), menu.etag):
+        return Response(status_code=304, headers={'ETag': menu.etag})
+    response.headers['ETag'] = menu.etag
 
     return add_image_url(d)
 
@@ -80,11 +107,43 @@ def api_create_dish(payload: dict = Body(...)):
     return add_image_url(dish)
 
 
+# =========================================================
+# 🟢 POST /dishes/import — массовый импорт (JSON) и /dishes/import/csv
+# =========================================================
+def _import(rows):
+    try:
+        return import_menu(rows)
+    except MenuImportError as e:
+        raise HTTPException(status_code=400, detail={'message': 'menu import rejected', 'errors': e.errors})
+
+
+@router.post('/dishes/import')
+def api_import_dishes(payload=Body(...)):
+    """Список блюд (или {"dishes": [...]}): всё или ничего, одна транзакция и одна переиндексация"""
+    rows = payload.get('dishes') if isinstance(payload, dict) else payload
+    return _import(rows)
+
+
+@router.post('/dishes/import/csv')
+async def api_import_dishes_csv(file: UploadFile = File(...)):
+    """CSV с заголовком: name,price,category,... ; tags / ingredients через ';'"""
+    try:
+        text = (await file.read()).decode('utf-8')
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV must be UTF-8")
+    try:
+        rows = parse_csv(text)
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"invalid CSV: {e}")
+    return await run_in_threadpool(_import, rows)
+
+
 # =========================================================
 # 🟢 PUT /dishes/{id} — обновить блюдо
 # =========================================================
 @router.put('/dishes/{id}')
 def api_update_dish(id: int, payload: dict = Body(...)):
+    # существование цели записи — по базе: снимок меню у каждого процесса свой и живёт ttl_seconds
     if not get_dish(id):
         raise HTTPException(status_code=404, detail='not found')
 
@@ -0,0 +1,67 @@
+# app/api/routes/export.py
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.db.sqlite_db import (
+    iter_orders_export, iter_dishes_export,
+    ORDER_EXPORT_COLUMNS, ORDER_ITEM_EXPORT_COLUMNS, DISH_EXPORT_COLUMNS,
+)
+from app.services.export import FORMATS, csv_stream, ndjson_stream, group_items
+
+router = APIRouter()
+
+
+def _check_format(fmt):
+    if fmt not in FORMATS:
+        raise HTTPException(400, detail=f"format must be one of: {list(FORMATS)}")
+
+
+def _parse_date(value, name):
+    """'YYYY-MM-DD' или ISO-время -> строка в формате created_at"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(400, detail=f"{name} must be YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS")
+    if len(value) <= 10:
+        return parsed.strftime('%Y-%m-%d')
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _stream(body, fmt, filename):
+    return StreamingResponse(body, media_type=FORMATS[fmt],
+                             headers={'Content-Disposition': f'attachment; filename="{filename}.{fmt}"'})
+
+
+@router.get('/export/orders')
+def api_export_orders(format: str = 'ndjson', date_from: Optional[str] = None, date_to: Optional[str] = None,
+                      status: Optional[str] = None, include_items: bool = False,
+                      include_archive: bool = True):
+    """Потоковая выгрузка заказов (по возрастанию created_at), память не растёт с объёмом.
+
+    date_from включительно, date_to не включительно. NDJSON: заказ на строку
+    (с items при include_items), CSV: строка на позицию при include_items.
+    """
+    _check_format(format)
+    rows = iter_orders_export(_parse_date(date_from, 'date_from'), _parse_date(date_to, 'date_to'),
+                              status, include_items=include_items, include_archive=include_archive)
+    if format == 'csv':
+        columns = ORDER_EXPORT_COLUMNS + (ORDER_ITEM_EXPORT_COLUMNS if include_items else ())
+        return _stream(csv_stream(rows, columns), format, 'orders')
+    if include_items:
+        records = group_items(rows, ORDER_EXPORT_COLUMNS, ORDER_ITEM_EXPORT_COLUMNS)
+    else:
+        records = (dict(zip(ORDER_EXPORT_COLUMNS, r)) for r in rows)
+    return _stream(ndjson_stream(records), format, 'orders')
+
+
+@router.get('/export/dishes')
+def api_export_dishes(format: str = 'ndjson', available_only: bool = False):
+    """Потоковая выгрузка меню; tags / ingredients — названия через '; '"""
+    _check_format(format)
+    rows = iter_dishes_export(available_only=available_only)
+    if format == 'csv':
+        return _stream(csv_stream(rows, DISH_EXPORT_COLUMNS), format, 'dishes')
+    return _stream(ndjson_stream(dict(zip(DISH_EXPORT_COLUMNS, r)) for r in rows), format, 'dishes')
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from fastapi import status
-from app.db.sqlite_db import find_or_create_guest_by_phone
+from app.db.sqlite_db import find_or_create_guest_by_phone, normalize_phone
 
 router = APIRouter(prefix="/guests", tags=["Guests"])
 
@@ -12,5 +12,5 @@ def find_or_create_guest(payload: dict):
         raise HTTPException(status_code=400, detail="phone required")
     gid = find_or_create_guest_by_phone(phone, name)
     if not gid:
-        raise HTTPException(status_code=500, detail="failed to create guest")
-    return {"success": True, "data": {"id": gid, "phone": phone, "name": name}}
\ No newline at end of file
+        raise HTTPException(status_code=400, detail="invalid phone")
+    return {"success": True, "data": {"id": gid, "phone": normalize_phone(phone), "name": name}}
\ No newline at end of file
@@ -1,12 +1,17 @@
 # app/api/routes/ingredients.py
-from fastapi import APIRouter, Body, HTTPException
-from app.db.sqlite_db import list_ingredients, create_ingredient
+from fastapi import APIRouter, Body, HTTPException, Request, Response
+from app.db.sqlite_db import create_ingredient
+from app.services import menu_cache
 
 router = APIRouter()
 
 @router.get('/ingredients')
-def api_list_ingredients():
-    return list_ingredients()
+def api_list_ingredients(request: Request, response: Response):
+    menu = menu_cache.get_menu()
+    if menu_cache.etag_matches(request.headers.get('if-none-match'), menu.etag):
+        return Response(status_code=304, headers={'ETag': menu.etag})
+    response.headers['ETag'] = menu.etag
+    return menu_cache.list_ingredients(snapshot=menu)
 
 @router.post('/ingredients')
 def api_create_ingredient(payload: dict = Body(...)):
@@ -39,12 +39,18 @@ from app.db.sqlite_db import (
     get_order_with_items,
     update_order_status,
     delete_order_if_completed,
-    list_orders_filtered
+    list_orders_filtered,
+    list_orders_page,
+    update_order_statuses,
+    ORDER_STATUS_FLOW,
+    OrderValidationError
 )
 
+MAX_STATUS_BATCH = 500
+
 router = APIRouter()
 
-# Существующий POST /orders - БЕЗ ИЗМЕНЕНИЙ
+# Существующий POST /orders (+ проверка блюд в create_order)
 @router.post('/orders')
 def api_create_order(payload: dict = Body(...)):
     table = payload.get('table_number')
@@ -63,25 +69,52 @@ def api_create_order(payload: dict = Body(...)):
         if 'dish_id' not in it or 'quantity' not in it:
             raise HTTPException(status_code=400, detail="each item must contain dish_id and quantity")
 
-    oid = create_order(guest_id, table, items)
+    try:
+        oid = create_order(guest_id, table, items)
+    except OrderValidationError as e:
+        raise HTTPException(status_code=400, detail={
+            'message': 'order contains unknown or unavailable dishes or quantities below 1',
+            'unknown_dish_ids': e.unknown,
+            'unavailable_dish_ids': e.unavailable,
+            'bad_quantity_dish_ids': e.bad_quantity
+        })
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="dish_id and quantity must be integers")
     return {'order_id': oid}
 
 # Обновленный GET /orders с обратной совместимостью
 @router.get('/orders')
-def api_list_orders(status: Optional[str] = Query(None)):
-    """Получить заказы, с опциональной фильтрацией по статусу"""
-    
-    # Для обратной совместимости: если статус не указан, работает как раньше
-    if status is None:
-        return list_orders()
-    
-    # Если статус указан, используем фильтрацию
+def api_list_orders(status: Optional[str] = Query(None),
+                    include_items: Optional[bool] = Query(None),
+                    limit: Optional[int] = Query(None),
+                    cursor: Optional[str] = Query(None),
+                    include_archive: bool = Query(False)):
+    """Получить заказы, с опциональной фильтрацией по статусу
+
+    include_items — добавить позиции заказа (по умолчанию: только при фильтре по статусу, как раньше)
+    limit/cursor — постраничная выдача {'items', 'next_cursor', 'limit'} (keyset, новые сверху)
+    include_archive — вместе с архивными (давно выданными) заказами, для истории и аналитики
+    """
     valid_statuses = ['ожидает', 'готовится', 'готов', 'выдан']
-    if status not in valid_statuses:
+    if status is not None and status not in valid_statuses:
         # Мягкая валидация: если статус невалидный, все равно возвращаем все заказы
-        return list_orders()
-    
-    return list_orders_filtered(status)
+        status = None
+
+    if include_items is None:
+        include_items = status is not None
+
+    if limit is not None or cursor:
+        try:
+            return list_orders_page(status, include_items=include_items, limit=limit, cursor=cursor,
+                                    include_archive=include_archive)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Для обратной совместимости: без статуса и без позиций работает как раньше
+    if status is None and not include_items:
+        return list_orders(include_archive=include_archive)
+
+    return list_orders_filtered(status, include_items=include_items, include_archive=include_archive)
 
 # НОВЫЙ: Детали заказа с блюдами
 @router.get('/orders/{order_id}/details')
@@ -111,6 +144,42 @@ def api_update_order_status(order_id: int, payload: dict = Body(...)):
     
     return {'ok': True, 'order_id': order_id, 'new_status': status}
 
+# НОВЫЙ: Пакетная смена статусов (доска кухни)
+@router.post('/orders/status/batch')
+def api_update_order_statuses(payload: dict = Body(...)):
+    """Сменить статус нескольких заказов одной транзакцией.
+
+    {"changes": [{"order_id": 1, "status": "готов"}, ...]} или {"order_ids": [1, 2], "status": "готов"}.
+    Статусы только вперёд: ожидает -> готовится -> готов -> выдан.
+    """
+    if 'changes' in payload:
+        raw = payload.get('changes')
+        if not isinstance(raw, list) or not all(isinstance(c, dict) for c in raw):
+            raise HTTPException(400, detail="'changes' must be a list of {order_id, status}")
+        changes = [(c.get('order_id'), c.get('status')) for c in raw]
+    else:
+        ids = payload.get('order_ids')
+        if not isinstance(ids, list):
+            raise HTTPException(400, detail="Either 'changes' or 'order_ids' with 'status' is required")
+        changes = [(oid, payload.get('status')) for oid in ids]
+
+    if not changes:
+        raise HTTPException(400, detail="No status changes given")
+    if len(changes) > MAX_STATUS_BATCH:
+        raise HTTPException(400, detail=f"At most {MAX_STATUS_BATCH} changes per request")
+    try:
+        changes = [(int(oid), status) for oid, status in changes]
+    except (TypeError, ValueError):
+        raise HTTPException(400, detail="order_id must be an integer")
+
+    results = update_order_statuses(changes)
+    return {
+        'ok': all(r['ok'] for r in results),
+        'updated': sum(1 for r in results if r['ok'] and not r.get('unchanged')),
+        'statuses': list(ORDER_STATUS_FLOW),
+        'results': results,
+    }
+
 # НОВЫЙ: Удаление заказа
 @router.delete('/orders/{order_id}')
 def api_delete_order(order_id: int):
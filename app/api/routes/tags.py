@@ -1,12 +1,17 @@
 # app/api/routes/tags.py
-from fastapi import APIRouter, Body, HTTPException
-from app.db.sqlite_db import list_tags, create_tag
+from fastapi import APIRouter, Body, HTTPException, Request, Response
+from app.db.sqlite_db import create_tag
+from app.services import menu_cache
 
 router = APIRouter()
 
 @router.get('/tags')
-def api_list_tags():
-    return list_tags()
+def api_list_tags(request: Request, response: Response):
+    menu = menu_cache.get_menu()
+    if menu_cache.etag_matches(request.headers.get('if-none-match'), menu.etag):
+        return Response(status_code=304, headers={'ETag': menu.etag})
+    response.headers['ETag'] = menu.etag
+    return menu_cache.list_tags(snapshot=menu)
 
 @router.post('/tags')
 def api_create_tag(payload: dict = Body(...)):
@@ -0,0 +1,150 @@
+# app/db/analytics.py
+"""
+Агрегаты продаж для /api/admin/metrics.
+
+Rollup-таблицы (миграция 0003) обновляются инкрементально в той же
+транзакции, что и сам заказ: record_order() из create_order,
+record_status_change() из update_order_status. Отчёт читает только
+агрегаты, поэтому его стоимость не зависит от числа заказов.
+Время — UTC, как created_at/completed_at.
+
+  sales_hourly         — час: заказы, выручка, выданные заказы
+  sales_dish_daily     — день × блюдо: порции, выручка
+  sales_category_daily — день × категория (0 — без категории)
+  guest_stats          — гость: число заказов, сумма, первый/последний заказ
+
+Удаление выданного заказа агрегаты не уменьшает: продажа состоялась.
+"""
+
+# {orders}/{items} — таблицы или представления, {where} — условие на заказы o.
+# Одни и те же запросы и для одного нового заказа, и для полной пересборки.
+# Цена и категория — снимок в позиции (миграция 0006): dishes не читается.
+_ORDER_ROLLUPS = (
+    """
+    INSERT INTO sales_hourly (hour, orders, revenue)
+    SELECT strftime('%Y-%m-%d %H:00', o.created_at), COUNT(*), SUM(IFNULL(o.total, 0))
+    FROM {orders} o WHERE {where} GROUP BY 1
+    ON CONFLICT(hour) DO UPDATE SET orders = orders + excluded.orders,
+                                    revenue = revenue + excluded.revenue
+    """,
+    """
+    INSERT INTO sales_dish_daily (day, dish_id, quantity, revenue)
+    SELECT date(o.created_at), IFNULL(oi.dish_id, 0), SUM(oi.quantity), SUM(oi.quantity * IFNULL(oi.unit_price, 0))
+    FROM {orders} o JOIN {items} oi ON oi.order_id = o.id
+    WHERE {where} GROUP BY 1, 2
+    ON CONFLICT(day, dish_id) DO UPDATE SET quantity = quantity + excluded.quantity,
+                                            revenue = revenue + excluded.revenue
+    """,
+    """
+    INSERT INTO sales_category_daily (day, category_id, quantity, revenue)
+    SELECT date(o.created_at), IFNULL(oi.category_id, 0), SUM(oi.quantity), SUM(oi.quantity * IFNULL(oi.unit_price, 0))
+    FROM {orders} o JOIN {items} oi ON oi.order_id = o.id
+    WHERE {where} GROUP BY 1, 2
+    ON CONFLICT(day, category_id) DO UPDATE SET quantity = quantity + excluded.quantity,
+                                                revenue = revenue + excluded.revenue
+    """,
+    """
+    INSERT INTO guest_stats (guest_id, orders, revenue, first_order_at, last_order_at)
+    SELECT o.guest_id, COUNT(*), SUM(IFNULL(o.total, 0)), MIN(o.created_at), MAX(o.created_at)
+    FROM {orders} o WHERE o.guest_id IS NOT NULL AND {where} GROUP BY 1
+    ON CONFLICT(guest_id) DO UPDATE SET orders = orders + excluded.orders,
+                                        revenue = revenue + excluded.revenue,
+                                        first_order_at = MIN(first_order_at, excluded.first_order_at),
+                                        last_order_at = MAX(last_order_at, excluded.last_order_at)
+    """,
+)
+
+_COMPLETED_ROLLUP = """
+    INSERT INTO sales_hourly (hour, completed)
+    SELECT strftime('%Y-%m-%d %H:00', o.completed_at), COUNT(*)
+    FROM orders_all o WHERE o.status = 'выдан' AND o.completed_at IS NOT NULL GROUP BY 1
+    ON CONFLICT(hour) DO UPDATE SET completed = completed + excluded.completed
+"""
+
+_ROLLUP_TABLES = ('sales_hourly', 'sales_dish_daily', 'sales_category_daily', 'guest_stats')
+
+
+def record_order(cur, order_id):
+    """Добавляет только что созданный заказ в агрегаты (вызывать в транзакции заказа)"""
+    for sql in _ORDER_ROLLUPS:
+        cur.execute(sql.format(orders='orders', items='order_items', where='o.id = ?'), (order_id,))
+
+
+def record_status_change(cur, old_status, old_completed_at, new_status):
+    """Учитывает выдачу заказа (или её отмену) в sales_hourly.completed"""
+    if new_status == old_status:
+        return
+    if new_status == 'выдан':
+        record_completions(cur, 1)
+    elif old_status == 'выдан' and old_completed_at:
+        cur.execute("UPDATE sales_hourly SET completed = completed - 1 WHERE hour = strftime('%Y-%m-%d %H:00', ?)",
+                    (old_completed_at,))
+
+
+def record_completions(cur, count):
+    """count заказов выдано только что (пакетная смена статусов — одним запросом)"""
+    if count:
+        cur.execute("""
+            INSERT INTO sales_hourly (hour, completed) VALUES (strftime('%Y-%m-%d %H:00', 'now'), ?)
+            ON CONFLICT(hour) DO UPDATE SET completed = completed + excluded.completed
+        """, (count,))
+
+
+def rebuild_rollups(conn):
+    """Пересобирает все агрегаты с нуля по orders_all / order_items_all"""
+    for table in _ROLLUP_TABLES:
+        conn.execute(f"DELETE FROM {table}")
+    for sql in _ORDER_ROLLUPS:
+        conn.execute(sql.format(orders='orders_all', items='order_items_all', where='1'))
+    conn.execute(_COMPLETED_ROLLUP)
+
+
+def sales_metrics(conn, days=None, hours=48, top=10):
+    """Сводка, ряды по дням/часам, топ блюд и категорий.
+
+    days — окно для рядов и топов (None — вся история), hours — длина почасового ряда.
+    """
+    since = "date('now', ?)" if days else "'0000-00-00'"
+    window = (f'-{int(days) - 1} days',) if days else ()
+
+    summary = dict(conn.execute(f"""
+        SELECT IFNULL(SUM(orders), 0) AS orders, IFNULL(SUM(revenue), 0) AS revenue,
+               IFNULL(SUM(completed), 0) AS completed
+        FROM sales_hourly WHERE hour >= {since}
+    """, window).fetchone())
+    summary['revenue'] = round(summary['revenue'], 2)
+    summary['avg_check'] = round(summary['revenue'] / summary['orders'], 2) if summary['orders'] else 0
+    summary['guests'] = conn.execute(
+        f"SELECT COUNT(*) FROM guest_stats WHERE last_order_at >= {since}", window).fetchone()[0]
+
+    daily = conn.execute(f"""
+        SELECT substr(hour, 1, 10) AS day, SUM(orders) AS orders, ROUND(SUM(revenue), 2) AS revenue,
+               SUM(completed) AS completed
+        FROM sales_hourly WHERE hour >= {since} GROUP BY 1 ORDER BY 1
+    """, window).fetchall()
+
+    hourly = conn.execute("""
+        SELECT hour, orders, ROUND(revenue, 2) AS revenue, completed
+        FROM sales_hourly WHERE hour >= strftime('%Y-%m-%d %H:00', 'now', ?) ORDER BY hour
+    """, (f'-{int(hours) - 1} hours',)).fetchall()
+
+    top_dishes = conn.execute(f"""
+        SELECT s.dish_id, d.name, SUM(s.quantity) AS quantity, ROUND(SUM(s.revenue), 2) AS revenue
+        FROM sales_dish_daily s LEFT JOIN dishes d ON d.id = s.dish_id
+        WHERE s.day >= {since} GROUP BY s.dish_id ORDER BY quantity DESC, s.dish_id LIMIT ?
+    """, window + (int(top),)).fetchall()
+
+    categories = conn.execute(f"""
+        SELECT s.category_id, c.name, SUM(s.quantity) AS quantity, ROUND(SUM(s.revenue), 2) AS revenue
+        FROM sales_category_daily s LEFT JOIN categories c ON c.id = s.category_id
+        WHERE s.day >= {since} GROUP BY s.category_id ORDER BY revenue DESC, s.category_id
+    """, window).fetchall()
+
+    return {
+        'days': days,
+        'summary': summary,
+        'daily': [dict(r) for r in daily],
+        'hourly': [dict(r) for r in hourly],
+        'top_dishes': [dict(r) for r in top_dishes],
+        'categories': [dict(r) for r in categories],
+    }
@@ -0,0 +1,124 @@
+# app/db/archive.py
+"""
+Архивация выданных заказов.
+
+Заказы со статусом 'выдан', выданные раньше чем archive.after_hours назад,
+переносятся вместе с позициями из orders/order_items в orders_archive/
+order_items_archive. Перенос идёт пачками по archive.batch_size, каждая
+пачка — отдельное задание очереди записи, чтобы не держать блокировку записи.
+Доска заказов читает только горячие таблицы, история и аналитика —
+представления orders_all / order_items_all (UNION ALL обеих частей).
+"""
+import logging
+import threading
+
+from app.config import settings
+from app.db import sqlite_db
+
+logger = logging.getLogger(__name__)
+
+_CFG = settings.get('archive', {})
+ARCHIVE_AFTER_HOURS = _CFG.get('after_hours', 24)
+ARCHIVE_BATCH_SIZE = _CFG.get('batch_size', 500)
+ARCHIVE_INTERVAL = _CFG.get('interval_seconds', 600)
+
+_ORDER_COLS = "id, guest_id, table_number, total, status, created_at, completed_at"
+_ITEM_COLS = "id, order_id, dish_id, quantity, created_at, unit_price, dish_name, dish_image_path, category_id"
+
+
+def archive_batch(older_than_hours=None, batch_size=None):
+    """Переносит одну пачку заказов в архив; возвращает число перенесённых заказов"""
+    hours = ARCHIVE_AFTER_HOURS if older_than_hours is None else older_than_hours
+    limit = ARCHIVE_BATCH_SIZE if batch_size is None else batch_size
+    return sqlite_db.write(_move_batch, hours, limit)
+
+
+def _move_batch(conn, hours, limit):
+    ids = [r[0] for r in conn.execute(
+        "SELECT id FROM orders WHERE status = 'выдан' AND completed_at <= datetime('now', ?) "
+        "ORDER BY completed_at LIMIT ?", (f'-{float(hours)} hours', int(limit)))]
+    if not ids:
+        return 0
+    marks = ','.join('?' * len(ids))
+    conn.execute(f"INSERT INTO orders_archive ({_ORDER_COLS}) "
+                 f"SELECT {_ORDER_COLS} FROM orders WHERE id IN ({marks})", ids)
+    conn.execute(f"INSERT INTO order_items_archive ({_ITEM_COLS}) "
+                 f"SELECT {_ITEM_COLS} FROM order_items WHERE order_id IN ({marks})", ids)
+    conn.execute(f"DELETE FROM order_items WHERE order_id IN ({marks})", ids)
+    conn.execute(f"DELETE FROM orders WHERE id IN ({marks})", ids)
+    return len(ids)
+
+
+def archive_completed_orders(older_than_hours=None, batch_size=None, max_batches=None):
+    """Переносит все подходящие заказы (пачками); возвращает общее число"""
+    batch_size = ARCHIVE_BATCH_SIZE if batch_size is None else batch_size
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(older_than_hours, batch_size)
+        total += moved
+        batches += 1
+        if moved < batch_size:
+            break
+    if total:
+        logger.info("Archived %d completed orders", total)
+    return total
+
+
+def archive_stats():
+    with sqlite_db.connection() as conn:
+        row = conn.execute("""
+            SELECT (SELECT COUNT(*) FROM orders) AS hot_orders,
+                   (SELECT COUNT(*) FROM orders WHERE status = 'выдан') AS hot_completed,
+                   (SELECT COUNT(*) FROM orders_archive) AS archived_orders
+        """).fetchone()
+    return dict(row)
+
+
+class ArchiveWorker:
+    """Фоновый поток: раз в interval секунд вызывает archive_completed_orders"""
+
+    def __init__(self, interval=ARCHIVE_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='order-archiver', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                archive_completed_orders()
+            except Exception:
+                logger.exception("Order archiving failed")
+            self._stop.wait(self.interval)
+
+
+_WORKER = None
+
+
+def start_archiver():
+    global _WORKER
+    if not _CFG.get('enabled', True):
+        return None
+    if _WORKER is None:
+        _WORKER = ArchiveWorker()
+    _WORKER.start()
+    return _WORKER
+
+
+def stop_archiver():
+    global _WORKER
+    if _WORKER is not None:
+        _WORKER.stop()
+        _WORKER = None
@@ -0,0 +1,31 @@
+# app/db/fts.py
+"""
+Полнотекстовый поиск блюд по индексу dishes_fts (миграция 0004): веса колонок
+для bm25, разбор запроса в выражение MATCH и сам запрос.
+
+Модуль без зависимостей от приложения: его же по пути к файлу загружает
+my_ai_dishes (core/lexical_index.py), чтобы оба поиска ранжировали одинаково.
+"""
+import re
+
+FTS_WEIGHTS = (10.0, 2.0, 5.0, 3.0)  # name, description, ingredients, tags
+_FTS_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_query(text):
+    """Свободный текст -> выражение MATCH: слова как префиксы через OR (None, если слов нет)"""
+    tokens = [t for t in _FTS_TOKEN_RE.findall((text or '').lower()) if len(t) > 1]
+    if not tokens:
+        return None
+    return ' OR '.join(f'"{t}"*' for t in dict.fromkeys(tokens))
+
+
+def search_sql(available_only=True):
+    """SELECT d.id, d.name, bm25 — лучшие первыми; параметры: (*FTS_WEIGHTS, match, limit)"""
+    available = "AND d.is_available = 1" if available_only else ""
+    return f"""
+        SELECT d.id, d.name, bm25(dishes_fts, ?, ?, ?, ?) AS bm25
+        FROM dishes_fts JOIN dishes d ON d.id = dishes_fts.rowid
+        WHERE dishes_fts MATCH ? {available}
+        ORDER BY bm25 LIMIT ?
+    """
@@ -0,0 +1,214 @@
+# app/db/maintenance.py
+"""
+Обслуживание базы: checkpoint WAL, PRAGMA optimize, ANALYZE, incremental vacuum.
+
+Фоновый поток раз в maintenance.interval_seconds делает PASSIVE checkpoint
+(не ждёт читателей и писателей). Остальное — только в «тихие» периоды,
+когда очередь записи простаивает не меньше quiet_seconds:
+  * TRUNCATE checkpoint, если -wal вырос больше wal_truncate_mb;
+  * PRAGMA optimize раз в optimize_interval_seconds, ANALYZE раз в
+    analyze_interval_seconds;
+  * PRAGMA incremental_vacuum, если база в режиме auto_vacuum=INCREMENTAL
+    и в ней есть свободные страницы;
+  * плановый снимок базы раз в snapshots.interval_hours (app/db/snapshots.py,
+    в отдельном потоке).
+Checkpoint идёт через соединение пула, вне очереди записи: задания очереди
+выполняются внутри транзакции своей пачки (BEGIN IMMEDIATE ... COMMIT
+открывается на каждую пачку), а внутри транзакции checkpoint не работает.
+Между пачками поток записи транзакцию не держит. Остальное — заданиями
+очереди записи.
+"""
+import logging
+import os
+import threading
+import time
+
+from app.config import settings
+from app.db import snapshots, sqlite_db
+
+logger = logging.getLogger(__name__)
+
+_CFG = settings.get('maintenance', {})
+MAINTENANCE_INTERVAL = _CFG.get('interval_seconds', 60)
+QUIET_SECONDS = _CFG.get('quiet_seconds', 30)
+WAL_TRUNCATE_BYTES = int(_CFG.get('wal_truncate_mb', 64) * 1024 * 1024)
+OPTIMIZE_INTERVAL = _CFG.get('optimize_interval_seconds', 3600)
+ANALYZE_INTERVAL = _CFG.get('analyze_interval_seconds', 86400)
+VACUUM_PAGES = _CFG.get('incremental_vacuum_pages', 1000)
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+_STATS_LOCK = threading.Lock()
+_STATS = {'runs': 0, 'checkpoints': 0, 'last_checkpoint': None, 'last_optimize': None,
+          'last_analyze': None, 'last_vacuum': None}
+# time.monotonic() последнего выполнения; None — ещё не было в этом процессе
+_LAST_RUN = {'optimize': None, 'analyze': None}
+
+
+def _record(key, **values):
+    with _STATS_LOCK:
+        _STATS[key] = {**values, 'at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+
+
+def wal_size():
+    """Размер файла -wal в байтах (0, если его нет)"""
+    try:
+        return os.path.getsize(sqlite_db.DB + '-wal')
+    except OSError:
+        return 0
+
+
+def is_quiet(quiet_seconds=None):
+    """Очередь записи пуста и простаивает не меньше quiet_seconds"""
+    writer = sqlite_db.get_writer()
+    if writer is None:
+        return True
+    return writer.idle_seconds() >= (QUIET_SECONDS if quiet_seconds is None else quiet_seconds)
+
+
+def checkpoint(mode='PASSIVE'):
+    """PRAGMA wal_checkpoint(mode); возвращает busy, страницы WAL, перенесённые страницы и время"""
+    mode = mode.upper()
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f"unknown checkpoint mode: {mode}")
+    wal_before = wal_size()
+    started = time.perf_counter()
+    with sqlite_db.connection() as conn:
+        busy, log_pages, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    result = {'mode': mode, 'busy': bool(busy), 'wal_pages': log_pages, 'checkpointed_pages': checkpointed,
+              'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+              'wal_bytes_before': wal_before, 'wal_bytes_after': wal_size()}
+    with _STATS_LOCK:
+        _STATS['checkpoints'] += 1
+    _record('last_checkpoint', **result)
+    return result
+
+
+def _timed_write(key, sql):
+    started = time.perf_counter()
+    sqlite_db.write(lambda conn: conn.execute(sql).fetchall())
+    ms = round((time.perf_counter() - started) * 1000, 3)
+    _LAST_RUN[key] = time.monotonic()
+    _record(f'last_{key}', duration_ms=ms)
+    return ms
+
+
+def optimize():
+    return _timed_write('optimize', "PRAGMA optimize")
+
+
+def analyze():
+    return _timed_write('analyze', "ANALYZE")
+
+
+def incremental_vacuum(pages=None):
+    """Возвращает в ФС до pages свободных страниц; None, если база не в режиме auto_vacuum=INCREMENTAL"""
+    pages = VACUUM_PAGES if pages is None else pages
+
+    def job(conn):
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return None
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if before:
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    started = time.perf_counter()
+    freed = sqlite_db.write(job)
+    if freed is not None:
+        _record('last_vacuum', freed_pages=freed, duration_ms=round((time.perf_counter() - started) * 1000, 3))
+    return freed
+
+
+def _due(key, interval):
+    last = _LAST_RUN[key]
+    return last is None or time.monotonic() - last >= interval
+
+
+def run_maintenance(force=False):
+    """Один проход обслуживания; force — не ждать тихого периода и интервалов"""
+    done = {}
+    quiet = force or is_quiet()
+    if quiet:
+        if force or _due('optimize', OPTIMIZE_INTERVAL):
+            done['optimize_ms'] = optimize()
+        if force or _due('analyze', ANALYZE_INTERVAL):
+            done['analyze_ms'] = analyze()
+        freed = incremental_vacuum()
+        if freed:
+            done['vacuum_freed_pages'] = freed
+        if snapshots.snapshot_due():
+            try:
+                snapshots.start_snapshot()
+                done['snapshot_started'] = True
+            except snapshots.SnapshotInProgress:
+                pass
+    # checkpoint последним — в него попадают и страницы, изменённые выше
+    mode = 'TRUNCATE' if quiet and (force or wal_size() >= WAL_TRUNCATE_BYTES) else 'PASSIVE'
+    done['checkpoint'] = checkpoint(mode)
+    with _STATS_LOCK:
+        _STATS['runs'] += 1
+    return done
+
+
+def maintenance_stats():
+    """Размер WAL и базы, страницы и последние результаты обслуживания"""
+    with sqlite_db.connection() as conn:
+        pages = {name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+                 for name in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum', 'wal_autocheckpoint')}
+    with _STATS_LOCK:
+        stats = {k: (dict(v) if isinstance(v, dict) else v) for k, v in _STATS.items()}
+    try:
+        db_bytes = os.path.getsize(sqlite_db.DB)
+    except OSError:
+        db_bytes = 0
+    return {'wal_bytes': wal_size(), 'db_bytes': db_bytes, **pages, 'quiet': is_quiet(), **stats}
+
+
+class MaintenanceWorker:
+    """Фоновый поток: раз в interval секунд вызывает run_maintenance"""
+
+    def __init__(self, interval=MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='db-maintenance', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                run_maintenance()
+            except Exception:
+                logger.exception("Database maintenance failed")
+
+
+_WORKER = None
+
+
+def start_maintenance():
+    global _WORKER
+    if not _CFG.get('enabled', True):
+        return None
+    if _WORKER is None:
+        _WORKER = MaintenanceWorker()
+    _WORKER.start()
+    return _WORKER
+
+
+def stop_maintenance():
+    global _WORKER
+    if _WORKER is not None:
+        _WORKER.stop()
+        _WORKER = None
@@ -0,0 +1,53 @@
+# app/db/migrations.py
+"""
+Версионированные миграции схемы.
+
+Файлы db/migrations/NNNN_описание.sql применяются по возрастанию номера,
+номер последней применённой миграции хранится в PRAGMA user_version.
+Каждая миграция выполняется в своей транзакции вместе с обновлением
+user_version, поэтому либо применяется целиком, либо не применяется вовсе.
+"""
+import re
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / 'db' / 'migrations'
+_NAME_RE = re.compile(r'^(\d{4})_(.+)\.sql$')
+
+
+def list_migrations(migrations_dir=MIGRATIONS_DIR):
+    """[(version, name, path)] по возрастанию version"""
+    found = []
+    for path in Path(migrations_dir).glob('*.sql'):
+        m = _NAME_RE.match(path.name)
+        if m:
+            found.append((int(m.group(1)), m.group(2), path))
+    found.sort()
+    return found
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn, migrations_dir=MIGRATIONS_DIR):
+    """Применяет все миграции новее user_version; возвращает список применённых версий"""
+    applied = []
+    version = current_version(conn)
+    for num, name, path in list_migrations(migrations_dir):
+        if num <= version:
+            continue
+        sql = path.read_text(encoding='utf-8')
+        logger.info("Applying migration %04d_%s", num, name)
+        try:
+            conn.executescript(f"BEGIN;\n{sql}\nPRAGMA user_version = {num};\nCOMMIT;")
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            logger.exception("Migration %04d_%s failed", num, name)
+            raise
+        applied.append(num)
+        version = num
+    return applied
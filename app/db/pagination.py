@@ -0,0 +1,36 @@
+# app/db/pagination.py
+"""
+Keyset-пагинация: курсор — непрозрачная строка с ключом последней строки
+страницы (например [created_at, id] для заказов).
+"""
+import base64
+import json
+
+from app.config import settings
+
+_cfg = settings.get('pagination', {})
+DEFAULT_LIMIT = int(_cfg.get('default_limit', 50))
+MAX_LIMIT = int(_cfg.get('max_limit', 200))
+
+
+def clamp_limit(limit):
+    if limit is None:
+        return DEFAULT_LIMIT
+    return max(1, min(int(limit), MAX_LIMIT))
+
+
+def encode_cursor(key):
+    raw = json.dumps(list(key), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Ключ из курсора; ValueError, если курсор битый"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        key = json.loads(raw.decode('utf-8'))
+    except Exception:
+        raise ValueError('invalid cursor')
+    if not isinstance(key, list) or len(key) != size:
+        raise ValueError('invalid cursor')
+    return tuple(key)
@@ -0,0 +1,155 @@
+# app/db/pool.py
+"""
+Пул соединений SQLite.
+
+Соединения открываются один раз, PRAGMA выполняются один раз на соединение,
+дальше соединение переиспользуется между запросами. Перед выдачей давно
+простаивающего соединения выполняется проверка `SELECT 1`; сломанные
+соединения закрываются и заменяются новыми.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_PRAGMAS = {
+    'auto_vacuum': 'INCREMENTAL',  # действует только для новой базы (или после VACUUM)
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,       # ~16 МБ страничного кэша на соединение
+    'mmap_size': 268435456,     # 256 МБ
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+
+class PoolTimeout(Exception):
+    """Не удалось получить соединение из пула за отведённое время"""
+
+
+class ConnectionPool:
+    def __init__(self, path, size=8, timeout=10, pragmas=None, health_check_interval=30):
+        self.path = path
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._last_used = {}
+        self._stats = {'opened': 0, 'closed': 0, 'acquired': 0, 'health_checks': 0, 'replaced': 0}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=self.timeout)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value};")
+        with self._lock:
+            self._stats['opened'] += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._stats['closed'] += 1
+        self._last_used.pop(id(conn), None)
+
+    def _is_healthy(self, conn):
+        with self._lock:
+            self._stats['health_checks'] += 1
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._created < self.size
+                if can_open:
+                    self._created += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f"no free sqlite connection after {self.timeout}s")
+
+        idle_for = time.monotonic() - self._last_used.get(id(conn), time.monotonic())
+        if idle_for > self.health_check_interval and not self._is_healthy(conn):
+            self._discard(conn)
+            with self._lock:
+                self._created += 1
+                self._stats['replaced'] += 1
+            conn = self._connect()
+
+        with self._lock:
+            self._stats['acquired'] += 1
+        return conn
+
+    def release(self, conn, broken=False):
+        if not broken and conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
+        if broken:
+            self._discard(conn)
+            return
+        self._last_used[id(conn)] = time.monotonic()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Выдаёт соединение из пула. При успешном выходе из блока делает commit,
+        при исключении — rollback; соединение возвращается в пул.
+        """
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except sqlite3.DatabaseError as e:
+            broken = not isinstance(e, (sqlite3.IntegrityError, sqlite3.OperationalError))
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
+            raise
+        except BaseException:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'size': self.size, 'open': self._created, 'idle': self._idle.qsize()}
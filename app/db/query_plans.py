@@ -0,0 +1,123 @@
+# app/db/query_plans.py
+"""
+Проверка планов запросов sqlite_db.
+
+Прогоняет функции sqlite_db на временной базе (init.sql + миграции),
+перехватывает все выполненные SELECT/UPDATE/DELETE (пул и поток записи) и для каждого с WHERE
+смотрит EXPLAIN QUERY PLAN. Полный просмотр таблицы ("SCAN t" без индекса)
+в таком запросе считается ошибкой.
+
+Запуск:
+    python -m app.db.query_plans     (код возврата 1, если есть полные сканы)
+"""
+import os
+import re
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from app.db import archive, sqlite_db
+
+INIT_SQL = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'db', 'init.sql')
+_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+_SUBQUERY_RE = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (\w+)$')
+
+
+@contextmanager
+def _traced_database():
+    tmpdir = tempfile.mkdtemp(prefix='tea_plans_')
+    old_db = sqlite_db.DB
+    sqlite_db.close_pool()
+    sqlite_db.DB = os.path.join(tmpdir, 'plans.db')
+    statements = []
+    try:
+        sqlite_db.init_db(INIT_SQL)
+        # один коннект в пуле -> trace видит все запросы
+        pool = sqlite_db.get_pool()
+        pool.size = 1
+        conn = pool.acquire()
+        conn.set_trace_callback(statements.append)
+        pool.release(conn)
+        # и соединение потока записи
+        sqlite_db.write(lambda c: c.set_trace_callback(statements.append))
+        yield statements
+    finally:
+        sqlite_db.close_pool()
+        sqlite_db.DB = old_db
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _workload():
+    """Типичные вызовы sqlite_db — те же, что делают роуты"""
+    db = sqlite_db
+    db.list_categories(); db.list_tags(); db.list_ingredients()
+    db.list_dishes({'is_available': 1})
+    db.list_dishes({'is_available': 1, 'category_id': 3, 'max_price': 20, 'spice_max': 2, 'is_vegan': False}, with_relations=True)
+    db.get_dish(1)
+    db.search_dishes_fts('плов морковь')
+    did = db.create_dish({'name': 'plan check', 'price': 1, 'category_id': 1, 'tags': [1], 'ingredients': ['Рис', 'plan ingredient']})
+    db.update_dish(did, {'name': 'plan check', 'price': 2, 'category_id': 1, 'tags': [2], 'ingredients': [{'id': 3, 'quantity': '1'}]})
+    gid = db.find_or_create_guest_by_phone('+70000000000', 'plan')
+    oid = db.create_order(gid, '1', [{'dish_id': 1, 'quantity': 1}, {'dish_id': did, 'quantity': 2}])
+    db.list_orders()
+    db.list_orders_filtered()
+    db.list_orders_filtered('готов', include_items=False)
+    page = db.list_orders_page('готов', limit=1)
+    db.list_orders_page('готов', limit=1, cursor=page['next_cursor'])
+    db.list_dishes({'is_available': 1}, after=(1, 1), limit=5)
+    db.get_order_with_items(oid)
+    db.update_order_statuses([(oid, 'готов'), (oid + 1, 'готов')])
+    db.update_order_status(oid, 'выдан')
+    archive.archive_batch(older_than_hours=0)
+    db.list_orders(include_archive=True)
+    db.list_orders_page('выдан', limit=1, include_archive=True)
+    db.get_order_with_items(oid)
+    oid = db.create_order(gid, '1', [{'dish_id': 1, 'quantity': 1}])
+    db.update_order_status(oid, 'выдан')
+    db.delete_order_if_completed(oid)
+    list(db.iter_orders_export(date_from='2000-01-01', include_items=True))
+    list(db.iter_orders_export(date_from='2000-01-01', date_to='2100-01-01', status='выдан'))
+    list(db.iter_dishes_export(available_only=True))
+    db.get_sales_metrics()
+    db.get_sales_metrics(days=7, hours=24)
+    db.delete_dish(did)
+
+
+def collect_statements(workload=_workload):
+    with _traced_database() as statements:
+        workload()
+        seen = []
+        for sql in statements:
+            head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+            if head in ('SELECT', 'UPDATE', 'DELETE', 'WITH') and sql not in seen:
+                seen.append(sql)
+        with sqlite_db.connection() as conn:
+            conn.set_trace_callback(None)
+            return [(sql, [r['detail'] for r in conn.execute("EXPLAIN QUERY PLAN " + sql)]) for sql in seen]
+
+
+def full_scans(plans):
+    """[(sql, [таблицы])] для запросов с WHERE, где таблица читается целиком"""
+    bad = []
+    for sql, details in plans:
+        if not re.search(r'\bWHERE\b', sql, re.IGNORECASE):
+            continue
+        subqueries = {m.group(1) for d in details for m in [_SUBQUERY_RE.match(d)] if m}
+        tables = [m.group(1) for d in details for m in [_SCAN_RE.match(d)] if m and m.group(1) not in subqueries]
+        if tables:
+            bad.append((sql, tables))
+    return bad
+
+
+def main():
+    plans = collect_statements()
+    bad = full_scans(plans)
+    print(f"checked {len(plans)} statements")
+    for sql, tables in bad:
+        print(f"FULL SCAN of {', '.join(tables)}:\n    {' '.join(sql.split())}")
+    return 1 if bad else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# app/db/snapshots.py
+"""
+Онлайн-снимки базы через sqlite3 backup API.
+
+Снимок копируется шагами по snapshots.pages_per_step страниц: каждый шаг —
+короткая читающая транзакция, в WAL она не мешает записи, между шагами
+пауза step_sleep_ms. Если базу меняют во время копирования, SQLite
+начинает копирование заново; после max_restarts таких перезапусков
+оставшееся копируется одним шагом (одна читающая транзакция — в WAL
+запись при этом тоже не ждёт). Снимок пишется во временный файл,
+проверяется PRAGMA quick_check и переименовывается; в snapshots.dir
+остаются последние snapshots.keep снимков.
+
+Одновременно выполняется не больше одного снимка; ход текущего — snapshot_status().
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from app.config import settings
+from app.db import sqlite_db
+
+logger = logging.getLogger(__name__)
+
+_CFG = settings.get('snapshots', {})
+SNAPSHOT_DIR = _CFG.get('dir', 'db/snapshots')
+SNAPSHOT_KEEP = _CFG.get('keep', 7)
+PAGES_PER_STEP = _CFG.get('pages_per_step', 256)
+STEP_SLEEP = _CFG.get('step_sleep_ms', 5) / 1000
+MAX_RESTARTS = _CFG.get('max_restarts', 3)
+SNAPSHOT_INTERVAL = _CFG.get('interval_hours', 0) * 3600
+
+_PREFIX = 'snapshot-'
+_SUFFIX = '.db'
+
+_LOCK = threading.Lock()
+_CURRENT = None      # состояние последнего снимка (dict), см. snapshot_status
+_THREAD = None
+
+
+class SnapshotInProgress(RuntimeError):
+    """Снимок уже выполняется"""
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _snapshot_path(directory):
+    # время до микросекунд: имена одной длины и сортируются по времени создания
+    now = time.time()
+    while True:
+        name = time.strftime('%Y%m%d-%H%M%S', time.gmtime(now)) + f'-{int(now * 1e6) % 1000000:06d}'
+        path = os.path.join(directory, f'{_PREFIX}{name}{_SUFFIX}')
+        if not os.path.exists(path):
+            return path
+        now += 1e-6
+
+
+def backup_database(src_path, dst_path, pages_per_step=None, step_sleep=None, max_restarts=None, progress=None):
+    """Копирует src_path в dst_path шагами; progress(done, total, restarts). Возвращает число перезапусков"""
+    pages_per_step = PAGES_PER_STEP if pages_per_step is None else pages_per_step
+    step_sleep = STEP_SLEEP if step_sleep is None else step_sleep
+    max_restarts = MAX_RESTARTS if max_restarts is None else max_restarts
+    tmp_path = dst_path + '.tmp'
+    state = {'restarts': 0, 'last_done': 0}
+
+    def on_step(status, remaining, total):
+        done = total - remaining
+        if remaining and done <= state['last_done']:
+            # источник изменился — backup начал заново (прогресса нет)
+            state['restarts'] += 1
+            if state['restarts'] > max_restarts:
+                raise _Restarted()
+        state['last_done'] = done
+        if progress:
+            progress(done, total, state['restarts'])
+        if step_sleep and remaining:
+            time.sleep(step_sleep)
+
+    src = sqlite3.connect(src_path, timeout=settings['database'].get('timeout', 10))
+    try:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        dst = sqlite3.connect(tmp_path)
+        try:
+            try:
+                src.backup(dst, pages=int(pages_per_step) if pages_per_step > 0 else -1, progress=on_step)
+            except _Restarted:
+                logger.info("Snapshot restarted %d times, copying the rest in one step", state['restarts'] - 1)
+                src.backup(dst, pages=-1)
+                if progress:
+                    total = src.execute("PRAGMA page_count").fetchone()[0]
+                    progress(total, total, state['restarts'])
+            check = dst.execute("PRAGMA quick_check").fetchone()[0]
+            if check != 'ok':
+                raise sqlite3.DatabaseError(f"snapshot quick_check failed: {check}")
+        finally:
+            dst.close()
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        src.close()
+    return state['restarts']
+
+
+def list_snapshots(directory=None):
+    """Снимки в каталоге, новые первыми (по времени изменения файла, при равенстве — по имени)"""
+    directory = directory or SNAPSHOT_DIR
+    if not os.path.isdir(directory):
+        return []
+    result = []
+    for name in os.listdir(directory):
+        if name.startswith(_PREFIX) and name.endswith(_SUFFIX):
+            path = os.path.join(directory, name)
+            st = os.stat(path)
+            result.append({'name': name, 'path': path, 'bytes': st.st_size, 'mtime': st.st_mtime,
+                           'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(st.st_mtime))})
+    result.sort(key=lambda snap: (snap['mtime'], snap['name']), reverse=True)
+    for snap in result:
+        del snap['mtime']
+    return result
+
+
+def rotate_snapshots(keep=None, directory=None):
+    """Удаляет всё, кроме последних keep снимков; возвращает имена удалённых"""
+    keep = SNAPSHOT_KEEP if keep is None else keep
+    removed = []
+    for snap in list_snapshots(directory)[max(0, keep):]:
+        os.remove(snap['path'])
+        removed.append(snap['name'])
+    return removed
+
+
+def create_snapshot(directory=None, keep=None):
+    """Синхронно снимает базу sqlite_db.DB в directory, затем ротация; возвращает состояние снимка"""
+    if not _LOCK.acquire(blocking=False):
+        raise SnapshotInProgress("snapshot already running")
+    return _create_locked(directory, keep)
+
+
+def _create_locked(directory, keep):
+    """create_snapshot при уже взятом _LOCK; отпускает его по завершении"""
+    global _CURRENT
+    directory = directory or SNAPSHOT_DIR
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = _snapshot_path(directory)
+        state = {'status': 'running', 'path': path, 'pages_done': 0, 'pages_total': None, 'restarts': 0,
+                 'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'duration_ms': None,
+                 'error': None}
+        _CURRENT = state
+        started = time.perf_counter()
+
+        def progress(done, total, restarts):
+            state.update(pages_done=done, pages_total=total, restarts=restarts)
+
+        try:
+            backup_database(sqlite_db.DB, path, progress=progress)
+        except Exception as e:
+            logger.exception("Database snapshot failed")
+            state.update(status='failed', error=repr(e))
+        else:
+            state.update(status='done', bytes=os.path.getsize(path), rotated=rotate_snapshots(keep, directory))
+        state['duration_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        return dict(state)
+    finally:
+        _LOCK.release()
+
+
+def start_snapshot(directory=None, keep=None):
+    """create_snapshot в фоновом потоке; SnapshotInProgress, если снимок уже идёт"""
+    global _THREAD
+    # блокировку берёт вызывающий и передаёт потоку: два одновременных запуска не пройдут оба
+    if not _LOCK.acquire(blocking=False):
+        raise SnapshotInProgress("snapshot already running")
+    try:
+        _THREAD = threading.Thread(target=_create_locked, args=(directory, keep), name='db-snapshot', daemon=True)
+        _THREAD.start()
+    except BaseException:
+        _LOCK.release()
+        raise
+
+
+def snapshot_status():
+    """Состояние текущего или последнего снимка (None, если снимков в этом процессе не было)"""
+    state = _CURRENT
+    if state is None:
+        return None
+    state = dict(state)
+    if state['pages_total']:
+        state['progress'] = round(state['pages_done'] / state['pages_total'], 4)
+    return state
+
+
+def snapshot_due():
+    """Пора ли делать плановый снимок (snapshots.interval_hours > 0)"""
+    if not SNAPSHOT_INTERVAL or _LOCK.locked():
+        return False
+    latest = list_snapshots()
+    if not latest:
+        return True
+    return time.time() - os.path.getmtime(latest[0]['path']) >= SNAPSHOT_INTERVAL
+
+
+def restore_snapshot(snapshot_path, dst_path):
+    """Разворачивает снимок в новую базу dst_path (для стендов и замеров); исходный снимок не меняется"""
+    if os.path.exists(dst_path):
+        raise FileExistsError(dst_path)
+    backup_database(snapshot_path, dst_path, pages_per_step=-1, step_sleep=0)
+    return dst_path
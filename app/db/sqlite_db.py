@@ -1,52 +1,215 @@
 # app/db/sqlite_db.py
 import sqlite3, json
+import heapq
+import re
+import threading
+from collections import OrderedDict
 from app.config import settings
+from app.db.pool import ConnectionPool, DEFAULT_PRAGMAS
+from app.db.writer import WriteQueue
+from app.db.migrations import apply_migrations
+from app.db.analytics import record_order, record_status_change, record_completions, rebuild_rollups, sales_metrics
+from app.db.pagination import clamp_limit, encode_cursor, decode_cursor
+from app.db.fts import FTS_WEIGHTS, fts_query, search_sql
 DB = settings['database']['sqlite_path']
 
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+def get_pool():
+    """Общий пул соединений (создаётся при первом обращении)"""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                db_cfg = settings['database']
+                _POOL = ConnectionPool(
+                    DB,
+                    size=db_cfg.get('pool_size', 8),
+                    timeout=db_cfg.get('timeout', 10),
+                    pragmas=db_cfg.get('pragmas', DEFAULT_PRAGMAS),
+                    health_check_interval=db_cfg.get('health_check_interval', 30),
+                )
+    return _POOL
+
+def connection():
+    """with connection() as conn: ... — соединение из пула, commit/rollback автоматически"""
+    return get_pool().connection()
+
+_WRITER = None
+
+def get_writer():
+    """Общий поток записи (app/db/writer.py); None, если database.writer.enabled = false"""
+    global _WRITER
+    cfg = settings['database'].get('writer', {})
+    if not cfg.get('enabled', True):
+        return None
+    if _WRITER is None:
+        with _POOL_LOCK:
+            if _WRITER is None:
+                _WRITER = WriteQueue(get_conn, max_batch=cfg.get('max_batch', 64),
+                                     max_delay=cfg.get('max_delay_ms', 0) / 1000)
+    return _WRITER
+
+_LOCAL_HOOKS = threading.local()  # без потока записи: соединение и on_commit внешнего write()
+
+def write(fn, *args, **kwargs):
+    """Выполняет fn(conn, ...) в потоке записи (group commit) и возвращает результат после COMMIT"""
+    writer = get_writer()
+    if writer is not None:
+        return writer.run(fn, *args, **kwargs)
+    outer = getattr(_LOCAL_HOOKS, 'conn', None)
+    if outer is not None:
+        # вложенный write без потока записи — соединение и транзакция внешнего
+        return fn(outer, *args, **kwargs)
+    _LOCAL_HOOKS.hooks = []
+    try:
+        with connection() as conn:
+            _LOCAL_HOOKS.conn = conn
+            result = fn(conn, *args, **kwargs)
+        hooks = _LOCAL_HOOKS.hooks
+    finally:
+        _LOCAL_HOOKS.hooks = None
+        _LOCAL_HOOKS.conn = None
+    for callback in hooks:
+        callback()
+    return result
+
+def after_commit(callback):
+    """Из задания write(): callback() после COMMIT; при откате задания не вызывается"""
+    writer = _WRITER
+    if writer is not None and writer.in_writer_thread():
+        writer.on_commit(callback)
+    elif getattr(_LOCAL_HOOKS, 'hooks', None) is not None:
+        _LOCAL_HOOKS.hooks.append(callback)
+    else:
+        callback()
+
+def close_pool():
+    """Закрывает пул и останавливает поток записи (дописав очередь)"""
+    global _POOL, _WRITER
+    with _POOL_LOCK:
+        if _WRITER is not None:
+            _WRITER.close()
+            _WRITER = None
+        if _POOL is not None:
+            _POOL.close_all()
+            _POOL = None
+
+def db_stats():
+    writer = _WRITER
+    return {'pool': get_pool().stats(), 'writer': writer.stats() if writer else None}
+
+# Версия меню: растёт при каждом изменении блюд, категорий, тегов, ингредиентов
+# в этом процессе (по ней app/services/menu_cache понимает, что снимок устарел)
+_MENU_VERSION = 0
+_MENU_VERSION_LOCK = threading.Lock()
+
+def menu_version():
+    return _MENU_VERSION
+
+def _menu_changed():
+    global _MENU_VERSION
+    with _MENU_VERSION_LOCK:
+        _MENU_VERSION += 1
+
 def get_conn():
-    conn = sqlite3.connect(DB, check_same_thread=False, timeout=10)
+    """Отдельное (не пуловое) соединение; вызывающий сам его закрывает"""
+    conn = sqlite3.connect(DB, check_same_thread=False, timeout=settings['database'].get('timeout', 10))
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL;")
+    for name, value in settings['database'].get('pragmas', DEFAULT_PRAGMAS).items():
+        conn.execute(f"PRAGMA {name}={value};")
     return conn
 
 def init_db(sql_path):
-    conn = get_conn()
-    cur = conn.cursor()
+    """Создаёт недостающие таблицы и начальные данные (init.sql), затем применяет миграции"""
     with open(sql_path, 'r', encoding='utf-8') as f:
-        cur.executescript(f.read())
-    conn.commit()
-    conn.close()
+        script = f.read()
+    with connection() as conn:
+        conn.executescript(script)
+    migrate()
+    _menu_changed()
+    with _INGREDIENT_IDS_LOCK:
+        _INGREDIENT_IDS.clear()
+    with _GUEST_IDS_LOCK:
+        _GUEST_IDS.clear()
+
+def migrate():
+    """Применяет новые миграции из db/migrations (см. app/db/migrations.py)"""
+    with connection() as conn:
+        applied = apply_migrations(conn)
+        if 3 in applied:
+            # появились агрегаты продаж — заполняем их по уже накопленной истории
+            rebuild_rollups(conn)
+        return applied
+
+def ensure_schema(sql_path):
+    """При старте: пустая база -> init_db, иначе только недостающие миграции"""
+    with connection() as conn:
+        has_schema = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='dishes'").fetchone()
+    if not has_schema:
+        init_db(sql_path)
+        return
+    migrate()
 
 # Categories
 def list_categories():
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("SELECT * FROM categories ORDER BY id")
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM categories ORDER BY id")
+        return [dict(r) for r in cur.fetchall()]
+
+def list_meal_times():
+    with connection() as conn:
+        return [dict(r) for r in conn.execute("SELECT * FROM meal_times ORDER BY id")]
 
 # Tags
 def list_tags():
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("SELECT * FROM tags ORDER BY id")
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM tags ORDER BY id")
+        return [dict(r) for r in cur.fetchall()]
 
 # Ingredients
 def list_ingredients():
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("SELECT * FROM ingredients ORDER BY id")
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM ingredients ORDER BY id")
+        return [dict(r) for r in cur.fetchall()]
 
 # Dishes
-def list_dishes(filters=None):
-    conn = get_conn(); cur = conn.cursor()
+DISH_SELECT = "SELECT d.*, c.name as category_name, m.name as meal_time_name FROM dishes d LEFT JOIN categories c ON d.category_id = c.id LEFT JOIN meal_times m ON d.meal_time_id = m.id"
+IN_BATCH = 500  # ограничение на число параметров в одном IN (...)
+
+def _chunks(seq, n=IN_BATCH):
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+def _attach_relations(cur, dishes):
+    """Подгружает tags и ingredients для набора блюд: по 2 запроса на пачку из IN_BATCH id"""
+    by_id = {}
+    for d in dishes:
+        d['tags'] = []
+        d['ingredients'] = []
+        by_id[d['id']] = d
+    ids = list(by_id)
+    for batch in _chunks(ids):
+        marks = ','.join('?' * len(batch))
+        cur.execute(f"SELECT dt.dish_id as _dish_id, t.* FROM tags t JOIN dish_tags dt ON t.id = dt.tag_id WHERE dt.dish_id IN ({marks}) ORDER BY dt.dish_id, dt.id", batch)
+        for x in cur.fetchall():
+            tag = dict(x)
+            by_id[tag.pop('_dish_id')]['tags'].append(tag)
+        cur.execute(f"SELECT di.*, ing.name as ingredient_name, ing.description as ingredient_description FROM dish_ingredients di JOIN ingredients ing ON di.ingredient_id = ing.id WHERE di.dish_id IN ({marks}) ORDER BY di.dish_id, di.id", batch)
+        for x in cur.fetchall():
+            ing = dict(x)
+            by_id[ing['dish_id']]['ingredients'].append(ing)
+    return dishes
+
+def list_dishes(filters=None, with_relations=False, after=None, limit=None):
+    """Блюда по фильтрам. after/limit — keyset по (category_id, id), порядок тогда фиксирован"""
     if filters is None:
         filters = {}
-    q = "SELECT d.*, c.name as category_name, m.name as meal_time_name FROM dishes d LEFT JOIN categories c ON d.category_id = c.id LEFT JOIN meal_times m ON d.meal_time_id = m.id WHERE 1=1"
+    q = DISH_SELECT + " WHERE 1=1"
     params = []
     if 'category_id' in filters and filters['category_id']:
         q += " AND d.category_id = ?"; params.append(filters['category_id'])
@@ -58,153 +221,359 @@ def list_dishes(filters=None):
         q += " AND d.is_available = ?"; params.append(1 if filters['is_available'] else 0)
     if 'max_price' in filters and filters['max_price'] is not None:
         q += " AND d.price <= ?"; params.append(filters['max_price'])
-    cur.execute(q, params)
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
+    if after is not None:
+        q += " AND (IFNULL(d.category_id, 0), d.id) > (?, ?)"; params.extend(after)
+    if after is not None or limit is not None:
+        q += " ORDER BY IFNULL(d.category_id, 0), d.id"
+    if limit is not None:
+        q += " LIMIT ?"; params.append(int(limit))
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(q, params)
+        rows = [dict(r) for r in cur.fetchall()]
+        if with_relations:
+            _attach_relations(cur, rows)
     return rows
 
+def get_dishes(ids):
+    """Блюда с tags/ingredients по списку id (порядок как во входном списке, отсутствующие пропускаются)"""
+    ids = list(dict.fromkeys(int(i) for i in ids))
+    if not ids:
+        return []
+    found = {}
+    with connection() as conn:
+        cur = conn.cursor()
+        for batch in _chunks(ids):
+            marks = ','.join('?' * len(batch))
+            cur.execute(f"{DISH_SELECT} WHERE d.id IN ({marks})", batch)
+            for r in cur.fetchall():
+                found[r['id']] = dict(r)
+        _attach_relations(cur, list(found.values()))
+    return [found[i] for i in ids if i in found]
+
 def get_dish(did):
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("SELECT d.*, c.name as category_name, m.name as meal_time_name FROM dishes d LEFT JOIN categories c ON d.category_id = c.id LEFT JOIN meal_times m ON d.meal_time_id = m.id WHERE d.id = ?", (did,))
-    r = cur.fetchone()
-    if not r:
-        conn.close(); return None
-    dish = dict(r)
-    # tags
-    cur.execute("SELECT t.* FROM tags t JOIN dish_tags dt ON t.id = dt.tag_id WHERE dt.dish_id = ?", (did,))
-    tags = [dict(x) for x in cur.fetchall()]
-    # ingredients
-    cur.execute("SELECT di.*, ing.name as ingredient_name, ing.description as ingredient_description FROM dish_ingredients di JOIN ingredients ing ON di.ingredient_id = ing.id WHERE di.dish_id = ?", (did,))
-    ingredients = [dict(x) for x in cur.fetchall()]
-    # assemble
-    dish['tags'] = tags
-    dish['ingredients'] = ingredients
-    conn.close()
-    return dish
+    dishes = get_dishes([did])
+    return dishes[0] if dishes else None
+
+def search_dishes_fts(text, limit=50, available_only=True):
+    """Лексический поиск блюд по индексу: [{'id', 'name', 'bm25', 'score'}], лучшие первыми.
+
+    score — bm25, нормированный на лучшее совпадение (0..1].
+    """
+    match = fts_query(text)
+    if match is None:
+        return []
+    with connection() as conn:
+        rows = conn.execute(search_sql(available_only), (*FTS_WEIGHTS, match, int(limit))).fetchall()
+    if not rows:
+        return []
+    best = -rows[0]['bm25'] or 1.0
+    return [{'id': r['id'], 'name': r['name'], 'bm25': r['bm25'], 'score': round(-r['bm25'] / best, 4)}
+            for r in rows]
 
 def create_category(name):
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("INSERT INTO categories (name) VALUES (?)", (name,))
-    conn.commit(); cid = cur.lastrowid; conn.close(); return cid
+    cid = write(lambda conn: conn.execute("INSERT INTO categories (name) VALUES (?)", (name,)).lastrowid)
+    _menu_changed()
+    return cid
 
 def create_tag(name, tag_type=None):
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("INSERT INTO tags (name, tag_type) VALUES (?,?)", (name, tag_type))
-    conn.commit(); tid = cur.lastrowid; conn.close(); return tid
+    tid = write(lambda conn: conn.execute("INSERT INTO tags (name, tag_type) VALUES (?,?)", (name, tag_type)).lastrowid)
+    _menu_changed()
+    return tid
 
 def create_ingredient(name, description=None):
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("INSERT INTO ingredients (name, description) VALUES (?,?)", (name, description))
-    conn.commit(); iid = cur.lastrowid; conn.close(); return iid
+    iid = write(lambda conn: conn.execute("INSERT INTO ingredients (name, description) VALUES (?,?)",
+                                          (name, description)).lastrowid)
+    _menu_changed()
+    return iid
 
-def create_dish(d):
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("""INSERT INTO dishes (name,description,price,category_id,meal_time_id,spice_level,is_vegan,cooking_time,image_path,is_available)
-    VALUES (?,?,?,?,?,?,?,?,?,?)""", (d.get('name'), d.get('description',''), d.get('price'), d.get('category_id'),
-    d.get('meal_time_id'), d.get('spice_level',0), 1 if d.get('is_vegan') else 0, d.get('cooking_time',0), d.get('image_path',''), 1 if d.get('is_available', True) else 0))
-    conn.commit()
-    did = cur.lastrowid
-    # tags
+# Кэш name -> id ингредиентов (ингредиенты не удаляются, сбрасывается в init_db).
+# Пополняется только после COMMIT (after_commit): id из откатившейся транзакции сюда не попадут.
+_INGREDIENT_IDS = {}
+_INGREDIENT_IDS_LOCK = threading.Lock()
+
+def resolve_ingredient_ids(cur, names):
+    """name -> id для списка названий; отсутствующие ингредиенты создаются одним executemany"""
+    names = list(dict.fromkeys(names))
+    with _INGREDIENT_IDS_LOCK:
+        ids = {n: _INGREDIENT_IDS[n] for n in names if n in _INGREDIENT_IDS}
+    missing = [n for n in names if n not in ids]
+    if not missing:
+        return ids
+
+    def _select(batch_names):
+        for batch in _chunks(batch_names):
+            marks = ','.join('?' * len(batch))
+            cur.execute(f"SELECT name, MIN(id) as id FROM ingredients WHERE name IN ({marks}) GROUP BY name", batch)
+            for r in cur.fetchall():
+                ids[r['name']] = r['id']
+
+    _select(missing)
+    new_names = [n for n in missing if n not in ids]
+    if new_names:
+        cur.executemany("INSERT INTO ingredients (name) VALUES (?)", [(n,) for n in new_names])
+        _select(new_names)
+    found = {n: ids[n] for n in missing}
+
+    def _remember():
+        with _INGREDIENT_IDS_LOCK:
+            _INGREDIENT_IDS.update(found)
+
+    after_commit(_remember)
+    return ids
+
+def _dish_values(d):
+    return (d.get('name'), d.get('description',''), d.get('price'), d.get('category_id'),
+            d.get('meal_time_id'), d.get('spice_level',0), 1 if d.get('is_vegan') else 0, d.get('cooking_time',0),
+            d.get('image_path',''), 1 if d.get('is_available', True) else 0)
+
+def _wanted_relations(cur, d):
+    """Из payload: набор tag_id и {ingredient_id: (quantity, is_primary)} (первое вхождение побеждает)"""
+    tag_ids = []
     for t in d.get('tags', []):
         tid = t.get('Id') if isinstance(t, dict) and t.get('Id') else t if isinstance(t, int) else None
         if tid:
-            cur.execute("INSERT INTO dish_tags (dish_id, tag_id) VALUES (?,?)", (did, tid))
-    # ingredients
-    for ing in d.get('ingredients', []):
+            tag_ids.append(int(tid))
+
+    ings = d.get('ingredients', [])
+    name_ids = resolve_ingredient_ids(cur, [ing for ing in ings if not isinstance(ing, dict)])
+    ingredients = {}
+    for ing in ings:
         if isinstance(ing, dict):
             iid = ing.get('Id') or ing.get('id')
-            qty = ing.get('quantity')
-            is_primary = 1 if ing.get('is_primary') else 0
             if iid:
-                cur.execute("INSERT INTO dish_ingredients (dish_id, ingredient_id, quantity, is_primary) VALUES (?,?,?,?)", (did, iid, qty, is_primary))
+                ingredients.setdefault(int(iid), (ing.get('quantity'), 1 if ing.get('is_primary') else 0))
         else:
-            cur.execute("SELECT id FROM ingredients WHERE name = ?", (ing,))
-            row = cur.fetchone()
-            if row:
-                iid = row['id']
+            ingredients.setdefault(name_ids[ing], (None, 0))
+    return list(dict.fromkeys(tag_ids)), ingredients
+
+def _save_dish_relations(cur, did, d, is_new=False):
+    """Приводит dish_tags / dish_ingredients к payload, трогая только изменившиеся строки"""
+    tag_ids, ingredients = _wanted_relations(cur, d)
+
+    # tags
+    current = set()
+    if not is_new:
+        cur.execute("SELECT tag_id FROM dish_tags WHERE dish_id = ?", (did,))
+        current = {r['tag_id'] for r in cur.fetchall()}
+    removed = list(current - set(tag_ids))
+    if removed:
+        marks = ','.join('?' * len(removed))
+        cur.execute(f"DELETE FROM dish_tags WHERE dish_id = ? AND tag_id IN ({marks})", [did, *removed])
+    added = [tid for tid in tag_ids if tid not in current]
+    if added:
+        cur.executemany("INSERT INTO dish_tags (dish_id, tag_id) VALUES (?,?)", [(did, tid) for tid in added])
+
+    # ingredients
+    current = {}
+    stale_rows = []
+    if not is_new:
+        cur.execute("SELECT id, ingredient_id, quantity, is_primary FROM dish_ingredients WHERE dish_id = ? ORDER BY id", (did,))
+        for r in cur.fetchall():
+            if r['ingredient_id'] in current or r['ingredient_id'] not in ingredients:
+                stale_rows.append(r['id'])  # дубликаты и убранные ингредиенты
             else:
-                cur.execute("INSERT INTO ingredients (name) VALUES (?)", (ing,))
-                iid = cur.lastrowid
-            cur.execute("INSERT INTO dish_ingredients (dish_id, ingredient_id, quantity, is_primary) VALUES (?,?,?,?)", (did, iid, None, 0))
-    conn.commit()
-    conn.close()
+                current[r['ingredient_id']] = (r['id'], r['quantity'], r['is_primary'])
+    for batch in _chunks(stale_rows):
+        marks = ','.join('?' * len(batch))
+        cur.execute(f"DELETE FROM dish_ingredients WHERE id IN ({marks})", batch)
+    changed = [(qty, primary, current[iid][0]) for iid, (qty, primary) in ingredients.items()
+               if iid in current and current[iid][1:] != (qty, primary)]
+    if changed:
+        cur.executemany("UPDATE dish_ingredients SET quantity = ?, is_primary = ? WHERE id = ?", changed)
+    added = [(did, iid, qty, primary) for iid, (qty, primary) in ingredients.items() if iid not in current]
+    if added:
+        cur.executemany("INSERT INTO dish_ingredients (dish_id, ingredient_id, quantity, is_primary) VALUES (?,?,?,?)", added)
+
+def _create_dish(conn, d):
+    cur = conn.cursor()
+    cur.execute("""INSERT INTO dishes (name,description,price,category_id,meal_time_id,spice_level,is_vegan,cooking_time,image_path,is_available)
+    VALUES (?,?,?,?,?,?,?,?,?,?)""", _dish_values(d))
+    did = cur.lastrowid
+    _save_dish_relations(cur, did, d, is_new=True)
     return did
 
-def update_dish(did, d):
-    conn = get_conn(); cur = conn.cursor()
+def create_dish(d):
+    did = write(_create_dish, d)
+    _menu_changed()
+    return did
+
+def _resolve_tag_ids(cur, names, tag_type='import'):
+    """name -> id тегов; отсутствующие создаются одним executemany"""
+    names = list(dict.fromkeys(names))
+    ids = {}
+
+    def _select(batch_names):
+        for batch in _chunks(batch_names):
+            marks = ','.join('?' * len(batch))
+            cur.execute(f"SELECT name, MIN(id) as id FROM tags WHERE name IN ({marks}) GROUP BY name", batch)
+            ids.update({r['name']: r['id'] for r in cur.fetchall()})
+
+    _select(names)
+    new_names = [n for n in names if n not in ids]
+    if new_names:
+        cur.executemany("INSERT INTO tags (name, tag_type) VALUES (?,?)", [(n, tag_type) for n in new_names])
+        _select(new_names)
+    return ids
+
+def _import_dishes(conn, dishes):
+    cur = conn.cursor()
+    # все названия тегов и ингредиентов пачки — разом, дальше только из словарей
+    tag_ids = _resolve_tag_ids(cur, [t for d in dishes for t in d.get('tags', []) if isinstance(t, str)])
+    ing_names = [i['name'] if isinstance(i, dict) else i for d in dishes for i in d.get('ingredients', [])
+                 if not isinstance(i, dict) or not i.get('id')]
+    ing_ids = resolve_ingredient_ids(cur, ing_names)
+    ids, dish_tags, dish_ingredients = [], [], []
+    for d in dishes:
+        cur.execute("""INSERT INTO dishes (name,description,price,category_id,meal_time_id,spice_level,is_vegan,cooking_time,image_path,is_available)
+        VALUES (?,?,?,?,?,?,?,?,?,?)""", _dish_values(d))
+        did = cur.lastrowid
+        ids.append(did)
+        rel = {
+            'tags': [tag_ids[t] if isinstance(t, str) else t for t in d.get('tags', [])],
+            'ingredients': [{**i, 'id': i.get('id') or ing_ids[i['name']]} if isinstance(i, dict) else i
+                            for i in d.get('ingredients', [])],
+        }
+        tids, ingredients = _wanted_relations(cur, rel)
+        dish_tags.extend((did, tid) for tid in tids)
+        dish_ingredients.extend((did, iid, qty, primary) for iid, (qty, primary) in ingredients.items())
+    cur.executemany("INSERT INTO dish_tags (dish_id, tag_id) VALUES (?,?)", dish_tags)
+    cur.executemany("INSERT INTO dish_ingredients (dish_id, ingredient_id, quantity, is_primary) VALUES (?,?,?,?)",
+                    dish_ingredients)
+    return ids
+
+def import_dishes(dishes):
+    """Пачка блюд одной транзакцией (одно задание очереди записи); id в порядке входа.
+
+    dishes уже проверены (app/services/menu_import.py): category_id / meal_time_id — id,
+    tags — id или названия (новые теги создаются), ingredients — названия или
+    {'id' | 'name', 'quantity', 'is_primary'}.
+    """
+    ids = write(_import_dishes, dishes)
+    _menu_changed()
+    return ids
+
+def _update_dish(conn, did, d):
+    cur = conn.cursor()
     cur.execute("""UPDATE dishes SET name=?,description=?,price=?,category_id=?,meal_time_id=?,spice_level=?,is_vegan=?,cooking_time=?,image_path=?,is_available=?
-    WHERE id=?""", (d.get('name'), d.get('description',''), d.get('price'), d.get('category_id'),
-    d.get('meal_time_id'), d.get('spice_level',0), 1 if d.get('is_vegan') else 0, d.get('cooking_time',0), d.get('image_path',''), 1 if d.get('is_available', True) else 0, did))
-    # update tags -> delete old and insert new
-    cur.execute("DELETE FROM dish_tags WHERE dish_id = ?", (did,))
-    for t in d.get('tags', []):
-        tid = t.get('Id') if isinstance(t, dict) and t.get('Id') else t if isinstance(t, int) else None
-        if tid:
-            cur.execute("INSERT INTO dish_tags (dish_id, tag_id) VALUES (?,?)", (did, tid))
-    # update ingredients -> delete and recreate
-    cur.execute("DELETE FROM dish_ingredients WHERE dish_id = ?", (did,))
-    for ing in d.get('ingredients', []):
-        if isinstance(ing, dict):
-            iid = ing.get('Id') or ing.get('id')
-            qty = ing.get('quantity')
-            is_primary = 1 if ing.get('is_primary') else 0
-            if iid:
-                cur.execute("INSERT INTO dish_ingredients (dish_id, ingredient_id, quantity, is_primary) VALUES (?,?,?,?)", (did, iid, qty, is_primary))
-        else:
-            cur.execute("SELECT id FROM ingredients WHERE name = ?", (ing,))
-            row = cur.fetchone()
-            if row:
-                iid = row['id']
-            else:
-                cur.execute("INSERT INTO ingredients (name) VALUES (?)", (ing,))
-                iid = cur.lastrowid
-            cur.execute("INSERT INTO dish_ingredients (dish_id, ingredient_id, quantity, is_primary) VALUES (?,?,?,?)", (did, iid, None, 0))
-    conn.commit()
-    conn.close()
+    WHERE id=?""", (*_dish_values(d), did))
+    # tags / ingredients -> только разница с тем, что уже в БД
+    _save_dish_relations(cur, did, d)
+
+def update_dish(did, d):
+    write(_update_dish, did, d)
+    _menu_changed()
 
 def delete_dish(did):
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("DELETE FROM dishes WHERE id = ?", (did,))
-    conn.commit()
-    conn.close()
+    write(lambda conn: conn.execute("DELETE FROM dishes WHERE id = ?", (did,)))
+    _menu_changed()
 
 # Guests and orders
+def normalize_phone(phone):
+    """'8 (999) 123-45-67' / '9991234567' / '+7 999 123 45 67' -> '+79991234567'; None, если цифр нет"""
+    digits = re.sub(r'\D', '', str(phone or ''))
+    if not digits:
+        return None
+    if len(digits) == 11 and digits[0] == '8':
+        return '+7' + digits[1:]
+    if len(digits) == 10:
+        return '+7' + digits
+    return '+' + digits
+
+# LRU-кэш phone -> (guest_id, есть ли имя) (гости не удаляются, сбрасывается в init_db)
+GUEST_CACHE_SIZE = settings.get('cache', {}).get('guest_cache_size', 10000)
+_GUEST_IDS = OrderedDict()
+_GUEST_IDS_LOCK = threading.Lock()
+
+def _upsert_guest(conn, phone, name):
+    # один запрос и для нового, и для вернувшегося гостя; имя дописывается, только если его не было
+    gid, stored = conn.execute("""
+        INSERT INTO guests (phone, name) VALUES (?, ?)
+        ON CONFLICT(phone) DO UPDATE SET name = COALESCE(NULLIF(guests.name, ''), excluded.name)
+        RETURNING id, name
+    """, (phone, name or None)).fetchone()
+    return gid, bool(stored)
+
 def find_or_create_guest_by_phone(phone, name=None):
+    phone = normalize_phone(phone)
     if not phone:
         return None
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("SELECT id FROM guests WHERE phone = ?", (phone,))
-    row = cur.fetchone()
-    if row:
-        conn.close(); return row['id']
-    cur.execute("INSERT INTO guests (phone, name) VALUES (?,?)", (phone, name))
-    conn.commit()
-    gid = cur.lastrowid
-    conn.close()
+    with _GUEST_IDS_LOCK:
+        cached = _GUEST_IDS.get(phone)
+        # гость без имени в кэше: пришло имя — идём в базу, чтобы его записать
+        if cached is not None and (cached[1] or not name):
+            _GUEST_IDS.move_to_end(phone)
+            return cached[0]
+    gid, has_name = write(_upsert_guest, phone, name)
+    with _GUEST_IDS_LOCK:
+        _GUEST_IDS[phone] = (gid, has_name)
+        if len(_GUEST_IDS) > GUEST_CACHE_SIZE:
+            _GUEST_IDS.popitem(last=False)
     return gid
 
+class OrderValidationError(ValueError):
+    """Заказ ссылается на несуществующие или недоступные блюда или содержит количество < 1"""
+    def __init__(self, unknown=(), unavailable=(), bad_quantity=()):
+        self.unknown = sorted(unknown)
+        self.unavailable = sorted(unavailable)
+        self.bad_quantity = sorted(bad_quantity)
+        super().__init__(f"unknown dishes: {self.unknown}, unavailable dishes: {self.unavailable}, "
+                         f"bad quantity for dishes: {self.bad_quantity}")
+
+def _dish_prices(cur, dish_ids):
+    """Цены (и снимок для order_items) блюд одним SELECT ... WHERE id IN (...)"""
+    prices = {}
+    for batch in _chunks(dish_ids):
+        marks = ','.join('?' * len(batch))
+        cur.execute(f"SELECT id, price, is_available, name, image_path, category_id FROM dishes WHERE id IN ({marks})",
+                    batch)
+        for r in cur.fetchall():
+            prices[r['id']] = (r['price'], bool(r['is_available']), r['name'], r['image_path'], r['category_id'])
+    return prices
+
 def create_order(guest_id, table_number, items):
-    conn = get_conn(); cur = conn.cursor()
-    total = 0.0
-    for it in items:
-        cur.execute("SELECT price FROM dishes WHERE id = ?", (it['dish_id'],))
-        r = cur.fetchone()
-        price = r['price'] if r else 0.0
-        total += price * it['quantity']
+    """Создать заказ: одна выборка цен, один INSERT заказа, один executemany позиций.
+
+    Цены и доступность читаются внутри задания записи, в той же транзакции, что
+    и INSERT-ы: блюдо не может пропасть или подорожать между проверкой и записью
+    (в том числе из-за другого процесса). Бросает OrderValidationError, если
+    среди позиций есть неизвестные или недоступные блюда или количество < 1.
+    """
+    lines = [(int(it['dish_id']), int(it['quantity'])) for it in items]
+    bad_quantity = {did for did, qty in lines if qty < 1}
+    if bad_quantity:
+        raise OrderValidationError(bad_quantity=bad_quantity)
+    return write(_insert_order, guest_id, table_number, lines)
+
+def _insert_order(conn, guest_id, table_number, lines):
+    cur = conn.cursor()
+    dish_ids = list(dict.fromkeys(did for did, _ in lines))
+    prices = _dish_prices(cur, dish_ids)
+    unknown = [did for did in dish_ids if did not in prices]
+    unavailable = [did for did in dish_ids if did in prices and not prices[did][1]]
+    if unknown or unavailable:
+        raise OrderValidationError(unknown, unavailable)
+    total = sum(prices[did][0] * qty for did, qty in lines)
+    # цена, название, картинка и категория фиксируются в позиции на момент заказа
+    lines = [(did, qty, price, name, image, category)
+             for did, qty in lines for price, _, name, image, category in [prices[did]]]
     cur.execute("INSERT INTO orders (guest_id, table_number, total) VALUES (?,?,?)", (guest_id, table_number, total))
     order_id = cur.lastrowid
-    for it in items:
-        cur.execute("INSERT INTO order_items (order_id, dish_id, quantity) VALUES (?,?,?)", (order_id, it['dish_id'], it['quantity']))
-    conn.commit()
-    conn.close()
+    cur.executemany("""INSERT INTO order_items (order_id, dish_id, quantity, unit_price, dish_name, dish_image_path, category_id)
+                       VALUES (?,?,?,?,?,?,?)""", [(order_id, *line) for line in lines])
+    record_order(cur, order_id)
     return order_id
 
-def list_orders():
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("SELECT o.*, g.phone as guest_phone, g.name as guest_name FROM orders o LEFT JOIN guests g ON o.guest_id = g.id ORDER BY o.created_at DESC")
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
+def _orders_source(include_archive):
+    # горячие таблицы или вся история (представления из миграции 0002)
+    return ('orders_all', 'order_items_all') if include_archive else ('orders', 'order_items')
+
+def list_orders(include_archive=False):
+    orders_table, _ = _orders_source(include_archive)
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT o.*, g.phone as guest_phone, g.name as guest_name FROM {orders_table} o LEFT JOIN guests g ON o.guest_id = g.id ORDER BY o.created_at DESC")
+        return [dict(r) for r in cur.fetchall()]
 # ==========================================================
 # COMPATIBILITY LAYER for frontend & route imports
 # ==========================================================
@@ -220,127 +589,329 @@ def findOrCreateGuest(phone, name=None):
 # ==========================================================
 
 def get_order_with_items(order_id):
-    """Получить заказ с деталями блюд (дополнение к list_orders)"""
-    conn = get_conn()
-    cur = conn.cursor()
-    
-    # Основная информация о заказе (совместимо с list_orders)
-    cur.execute("""
-        SELECT o.*, g.phone as guest_phone, g.name as guest_name 
-        FROM orders o 
-        LEFT JOIN guests g ON o.guest_id = g.id 
-        WHERE o.id = ?
-    """, (order_id,))
-    
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        return None
-    
-    order = dict(row)
-    
-    # Блюда в заказе (расширяем существующую логику)
-    cur.execute("""
-        SELECT oi.*, d.name as dish_name, d.price as dish_price, 
-               d.image_path as dish_image_path
-        FROM order_items oi
-        JOIN dishes d ON oi.dish_id = d.id
-        WHERE oi.order_id = ?
-    """, (order_id,))
-    
+    """Получить заказ с деталями блюд (дополнение к list_orders), в том числе из архива"""
+    with connection() as conn:
+        cur = conn.cursor()
+
+        # Основная информация о заказе (совместимо с list_orders)
+        cur.execute("""
+            SELECT o.*, g.phone as guest_phone, g.name as guest_name 
+            FROM orders_all o 
+            LEFT JOIN guests g ON o.guest_id = g.id 
+            WHERE o.id = ?
+        """, (order_id,))
+
+        row = cur.fetchone()
+        if not row:
+            return None
+
+        order = dict(row)
+
+        # Блюда в заказе: снимок из самой позиции (миграция 0006), без JOIN с dishes
+        cur.execute("""
+            SELECT oi.*, oi.unit_price as dish_price
+            FROM order_items_all oi
+            WHERE oi.order_id = ?
+        """, (order_id,))
+        item_rows = cur.fetchall()
+
     items = []
-    for item in cur.fetchall():
+    for item in item_rows:
         item_dict = dict(item)
         # Совместимость: добавляем только новые поля
         if item_dict.get('dish_image_path'):
             item_dict['dish_image_url'] = f"/static/{item_dict['dish_image_path'].lstrip('/')}"
         items.append(item_dict)
-    
+
     order['items'] = items
-    conn.close()
     return order
 
-def update_order_status(order_id, status):
-    """Обновить статус заказа"""
-    conn = get_conn()
+def _update_order_status(conn, order_id, status):
     cur = conn.cursor()
-    
+
     # Проверяем, что заказ существует
-    cur.execute("SELECT id FROM orders WHERE id = ?", (order_id,))
-    if not cur.fetchone():
-        conn.close()
+    cur.execute("SELECT status, completed_at FROM orders WHERE id = ?", (order_id,))
+    old = cur.fetchone()
+    if not old:
         return False
-    
-    # Обновляем статус (поле уже есть в таблице)
-    cur.execute("UPDATE orders SET status = ? WHERE id = ?", (status, order_id))
-    
-    # Дополнительно: если статус "выдан", ставим дату завершения
-    # (поле completed_at должно существовать, если нет - это опционально)
-    if status == 'выдан':
-        try:
-            from datetime import datetime
-            cur.execute("UPDATE orders SET completed_at = ? WHERE id = ?", 
-                       (datetime.now().isoformat(), order_id))
-        except:
-            pass  # Если поля нет, игнорируем
-    
-    conn.commit()
-    conn.close()
+
+    # Обновляем статус; для "выдан" ставим время выдачи (по нему работает архивация),
+    # в том же формате UTC, что и created_at
+    cur.execute("""
+        UPDATE orders
+        SET status = ?,
+            completed_at = CASE WHEN ? = 'выдан' THEN COALESCE(completed_at, CURRENT_TIMESTAMP) END
+        WHERE id = ?
+    """, (status, status, order_id))
+    record_status_change(cur, old['status'], old['completed_at'], status)
     return True
 
-def delete_order_if_completed(order_id):
-    """Удалить заказ только если он имеет статус 'выдан'"""
-    conn = get_conn()
+def update_order_status(order_id, status):
+    """Обновить статус заказа"""
+    return write(_update_order_status, order_id, status)
+
+# Порядок статусов для пакетной смены: только вперёд. Английские — старые значения
+# в базе (init.sql, DEFAULT 'pending'), у каждого ранг русского аналога
+ORDER_STATUS_FLOW = ('ожидает', 'готовится', 'готов', 'выдан')
+LEGACY_ORDER_STATUSES = {'pending': 'ожидает', 'cooking': 'готовится', 'ready': 'готов', 'completed': 'выдан'}
+_STATUS_RANK = {s: i for i, s in enumerate(ORDER_STATUS_FLOW)}
+_STATUS_RANK.update((old, _STATUS_RANK[new]) for old, new in LEGACY_ORDER_STATUSES.items())
+
+def _update_order_statuses(conn, changes):
+    cur = conn.cursor()
+    ids = list(dict.fromkeys(oid for oid, _ in changes))
+    current = {}
+    for batch in _chunks(ids):
+        marks = ','.join('?' * len(batch))
+        cur.execute(f"SELECT id, status FROM orders WHERE id IN ({marks})", batch)
+        current.update((r['id'], r['status']) for r in cur.fetchall())
+
+    results, by_status, seen = [], {}, set()
+    for oid, status in changes:
+        res = {'order_id': oid, 'status': status, 'previous_status': current.get(oid), 'ok': False}
+        old = current.get(oid)
+        if oid in seen:
+            res['error'] = 'duplicate'
+        elif status not in ORDER_STATUS_FLOW:
+            res['error'] = 'invalid_status'
+        elif oid not in current:
+            res['error'] = 'not_found'
+        elif old not in _STATUS_RANK:
+            res['error'] = 'unknown_current_status'
+        elif _STATUS_RANK[old] == _STATUS_RANK[status]:
+            # тот же статус (или его старое английское название) — без изменений
+            res.update(ok=True, unchanged=True)
+        elif _STATUS_RANK[old] > _STATUS_RANK[status]:
+            res['error'] = 'invalid_transition'
+        else:
+            res['ok'] = True
+            by_status.setdefault(status, []).append(oid)
+        seen.add(oid)
+        results.append(res)
+
+    # один UPDATE на целевой статус
+    for status, order_ids in by_status.items():
+        for batch in _chunks(order_ids):
+            marks = ','.join('?' * len(batch))
+            cur.execute(f"""
+                UPDATE orders
+                SET status = ?,
+                    completed_at = CASE WHEN ? = 'выдан' THEN COALESCE(completed_at, CURRENT_TIMESTAMP) END
+                WHERE id IN ({marks})
+            """, (status, status, *batch))
+    record_completions(cur, len(by_status.get('выдан', ())))
+    return results
+
+def update_order_statuses(changes):
+    """Пакетная смена статусов [(order_id, status)] одной транзакцией.
+
+    Переходы только вперёд по ORDER_STATUS_FLOW (тот же статус — без изменений);
+    результат по каждому заказу: ok, previous_status, error
+    (not_found / invalid_status / invalid_transition / unknown_current_status / duplicate).
+    """
+    changes = [(int(oid), status) for oid, status in changes]
+    if not changes:
+        return []
+    return write(_update_order_statuses, changes)
+
+def _delete_order_if_completed(conn, order_id):
     cur = conn.cursor()
-    
+
     # Проверяем статус заказа
     cur.execute("SELECT status FROM orders WHERE id = ?", (order_id,))
     row = cur.fetchone()
-    
+
     if not row or row['status'] != 'выдан':
-        conn.close()
         return False
-    
+
     # Удаляем элементы заказа
     cur.execute("DELETE FROM order_items WHERE order_id = ?", (order_id,))
     # Удаляем заказ
     cur.execute("DELETE FROM orders WHERE id = ?", (order_id,))
-    
-    conn.commit()
-    conn.close()
     return True
 
-def list_orders_filtered(status=None):
-    """Получить заказы с фильтрацией (совместимо с list_orders)"""
-    conn = get_conn()
-    cur = conn.cursor()
-    
+def delete_order_if_completed(order_id):
+    """Удалить заказ только если он имеет статус 'выдан'"""
+    return write(_delete_order_if_completed, order_id)
+
+def iter_orders(status=None, include_items=True, after=None, limit=None, batch_size=500,
+                include_archive=False):
+    """Генератор заказов в порядке (created_at, id) по убыванию, без fetchall всей таблицы.
+
+    after — ключ (created_at, id) последнего уже отданного заказа (keyset),
+    limit — максимум строк, include_archive — вместе с архивом (история).
+    Соединение из пула занято, пока генератор не исчерпан/закрыт.
+    """
+    orders_table, _ = _orders_source(include_archive)
+    items_from = "order_items oi WHERE oi.order_id = o.id"
+    if include_archive:
+        # условие внутри каждой ветки UNION, иначе представление сканируется целиком
+        items_from = """(SELECT dish_id, quantity, dish_name, unit_price FROM order_items WHERE order_id = o.id
+                          UNION ALL
+                          SELECT dish_id, quantity, dish_name, unit_price FROM order_items_archive
+                          WHERE order_id = o.id) oi"""
+    items_col = ""
+    if include_items:
+        items_col = f""",
+            (SELECT json_group_array(json_object('dish_id', oi.dish_id, 'quantity', oi.quantity,
+                                                 'dish_name', oi.dish_name, 'unit_price', oi.unit_price))
+             FROM {items_from}) as items_json"""
+
     # Базовый запрос такой же как в list_orders
-    query = """
-        SELECT o.*, g.phone as guest_phone, g.name as guest_name 
-        FROM orders o 
+    query = f"""
+        SELECT o.*, g.phone as guest_phone, g.name as guest_name{items_col}
+        FROM {orders_table} o 
         LEFT JOIN guests g ON o.guest_id = g.id 
         WHERE 1=1
     """
     params = []
-    
+
     if status:
         query += " AND o.status = ?"
         params.append(status)
-    
-    query += " ORDER BY o.created_at DESC"
-    
-    cur.execute(query, params)
-    rows = [dict(r) for r in cur.fetchall()]
-    
-    # Добавляем items для каждого заказа (совместимо с текущим форматом)
-    for order in rows:
-        cur.execute("""
-            SELECT oi.dish_id, oi.quantity
-            FROM order_items oi
-            WHERE oi.order_id = ?
-        """, (order['id'],))
-        order['items'] = [dict(item) for item in cur.fetchall()]
-    
-    conn.close()
-    return rows
\ No newline at end of file
+
+    if after is not None:
+        query += " AND (o.created_at, o.id) < (?, ?)"
+        params.extend(after)
+
+    query += " ORDER BY o.created_at DESC, o.id DESC"
+
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(int(limit))
+
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        while True:
+            chunk = cur.fetchmany(batch_size)
+            if not chunk:
+                break
+            for r in chunk:
+                order = dict(r)
+                if include_items:
+                    order['items'] = json.loads(order.pop('items_json'))
+                yield order
+
+# Выгрузка (app/api/routes/export.py): кортежи вместо dict, курсор читается пачками
+ORDER_EXPORT_COLUMNS = ('id', 'created_at', 'completed_at', 'status', 'table_number', 'total',
+                        'guest_id', 'guest_phone', 'guest_name')
+ORDER_ITEM_EXPORT_COLUMNS = ('item_id', 'dish_id', 'dish_name', 'quantity', 'unit_price')
+DISH_EXPORT_COLUMNS = ('id', 'name', 'description', 'price', 'category_id', 'category_name', 'meal_time_id',
+                       'spice_level', 'is_vegan', 'cooking_time', 'is_available', 'created_at', 'tags', 'ingredients')
+
+def _iter_keyset(page_query, key):
+    """Строки запроса страницами по ключу: page_query(after) -> (sql, params), after — key
+    последней строки прошлой страницы (None для первой). Соединение пула берётся на одну
+    страницу и сразу отдаётся: медленный клиент выгрузки не держит ни соединение, ни
+    снимок WAL (иначе TRUNCATE checkpoint ждал бы его до конца выгрузки)."""
+    after = None
+    while True:
+        with connection() as conn:
+            rows = [tuple(r) for r in conn.execute(*page_query(after)).fetchall()]
+        if not rows:
+            return
+        yield from rows
+        after = key(rows[-1])
+
+def _iter_rows(streams, key=None):
+    """Один упорядоченный поток строк или слияние нескольких по key"""
+    return streams[0] if len(streams) == 1 else heapq.merge(*streams, key=key)
+
+def _order_export_query(orders_table, items_table, where, params, include_items, after, batch_size):
+    cols = """o.id, o.created_at, o.completed_at, o.status, o.table_number, o.total,
+              o.guest_id, g.phone, g.name"""
+    joins = "LEFT JOIN guests g ON g.id = o.guest_id"
+    order = "o.created_at, o.id"
+    if include_items:
+        cols += ", oi.id, oi.dish_id, oi.dish_name, oi.quantity, oi.unit_price"
+        joins += f" LEFT JOIN {items_table} oi ON oi.order_id = o.id"
+        order += ", oi.id"
+    if after is not None:
+        where = f"{where} AND (o.created_at, o.id) > (?, ?)"
+        params = [*params, *after]
+    # страница — batch_size заказов (по индексу created_at / status+created_at), к ним все их позиции;
+    # CTE называется как алиас o, чтобы условия и колонки писались одинаково
+    return f"""
+        WITH o AS (SELECT o.* FROM {orders_table} o WHERE {where} ORDER BY o.created_at, o.id LIMIT ?)
+        SELECT {cols} FROM o {joins} ORDER BY {order}
+    """, [*params, batch_size]
+
+def iter_orders_export(date_from=None, date_to=None, status=None, include_items=False, include_archive=True,
+                       batch_size=1000):
+    """Заказы по возрастанию (created_at, id) кортежами ORDER_EXPORT_COLUMNS
+    (+ ORDER_ITEM_EXPORT_COLUMNS при include_items — строка на позицию).
+
+    date_from включительно, date_to не включительно (строки 'YYYY-MM-DD[ HH:MM:SS]').
+    Архив и горячие таблицы читаются страницами по batch_size заказов (keyset по
+    (created_at, id)) и сливаются на лету, поэтому память не зависит от числа строк.
+    Каждая страница — отдельное короткое чтение: заказ, переехавший в архив между
+    страницами, может попасть в выгрузку дважды или не попасть.
+    """
+    where, params = ["1=1"], []
+    if date_from:
+        where.append("o.created_at >= ?"); params.append(date_from)
+    if date_to:
+        where.append("o.created_at < ?"); params.append(date_to)
+    if status:
+        where.append("o.status = ?"); params.append(status)
+    where = " AND ".join(where)
+    tables = [('orders', 'order_items')]
+    if include_archive:
+        tables.insert(0, ('orders_archive', 'order_items_archive'))
+    streams = [_iter_keyset(lambda after, t=t: _order_export_query(*t, where, params, include_items, after, batch_size),
+                            key=lambda r: (r[1], r[0]))
+               for t in tables]
+    return _iter_rows(streams, key=lambda r: (r[1] or '', r[0]))
+
+def iter_dishes_export(available_only=False, batch_size=1000):
+    """Блюда кортежами DISH_EXPORT_COLUMNS; tags / ingredients — названия через '; '"""
+    query = """
+        SELECT d.id, d.name, d.description, d.price, d.category_id, c.name, d.meal_time_id,
+               d.spice_level, d.is_vegan, d.cooking_time, d.is_available, d.created_at,
+               (SELECT group_concat(t.name, '; ') FROM dish_tags dt JOIN tags t ON t.id = dt.tag_id
+                WHERE dt.dish_id = d.id),
+               (SELECT group_concat(i.name, '; ') FROM dish_ingredients di JOIN ingredients i ON i.id = di.ingredient_id
+                WHERE di.dish_id = d.id)
+        FROM dishes d LEFT JOIN categories c ON c.id = d.category_id
+    """
+    where = "d.id > ?" + (" AND d.is_available = 1" if available_only else "")
+
+    def page(after):
+        return query + f" WHERE {where} ORDER BY d.id LIMIT ?", [after[0] if after else 0, batch_size]
+
+    return _iter_keyset(page, key=lambda r: (r[0],))
+
+def list_orders_filtered(status=None, include_items=True, include_archive=False):
+    """Получить заказы с фильтрацией (совместимо с list_orders)
+
+    Позиции заказа собираются в том же запросе (json_group_array по индексу
+    order_items(order_id)), include_items=False — без позиций.
+    """
+    return list(iter_orders(status, include_items=include_items, include_archive=include_archive))
+
+def list_orders_page(status=None, include_items=True, limit=None, cursor=None, include_archive=False):
+    """Страница заказов: {'items': [...], 'next_cursor': str|None, 'limit': int}"""
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor, 2) if cursor else None
+    # берём на одну строку больше, чтобы понять, есть ли следующая страница
+    rows = list(iter_orders(status, include_items=include_items, after=after, limit=limit + 1,
+                            include_archive=include_archive))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor((rows[-1]['created_at'], rows[-1]['id']))
+    return {'items': rows, 'next_cursor': next_cursor, 'limit': limit}
+
+# ==========================================================
+# АНАЛИТИКА (агрегаты, см. app/db/analytics.py)
+# ==========================================================
+
+def get_sales_metrics(days=None, hours=48, top=10):
+    """Готовые ряды для /api/admin/metrics — читаются только rollup-таблицы"""
+    with connection() as conn:
+        return sales_metrics(conn, days=days, hours=hours, top=top)
+
+def rebuild_sales_rollups():
+    """Пересобрать агрегаты по всей истории (после ручных правок в заказах)"""
+    write(rebuild_rollups)
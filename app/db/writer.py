@@ -0,0 +1,203 @@
+# app/db/writer.py
+"""
+Очередь записи SQLite с group commit.
+
+Все изменения данных выполняет один поток со своим соединением: вызывающий
+кладёт в очередь функцию fn(conn) и получает Future. Поток забирает из
+очереди всё, что накопилось (до max_batch заданий), выполняет задания в
+одной транзакции — каждое под своим SAVEPOINT, так что ошибка одного
+задания откатывает только его, — и делает один COMMIT на всю пачку.
+Результаты отдаются только после COMMIT. Чтение идёт мимо очереди, через
+пул (WAL позволяет читать параллельно с записью).
+
+Задание может зарегистрировать on_commit(callback) — например, обновить
+кэш в памяти: callback вызывается только после успешного COMMIT и
+отбрасывается, если задание откатилось или COMMIT не удался.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteQueue:
+    def __init__(self, connect, max_batch=64, max_delay=0.0):
+        self._connect = connect
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._conn = None
+        self._lock = threading.Lock()
+        self._stats = {'jobs': 0, 'failed': 0, 'batches': 0, 'commit_errors': 0,
+                       'max_batch_size': 0, 'commit_ms_total': 0.0, 'commit_ms_max': 0.0,
+                       'commit_ms_last': 0.0, 'wait_ms_total': 0.0}
+        self._last_batch_at = time.monotonic()
+        self._job_hooks = None   # on_commit текущего задания (только в потоке записи)
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Ставит fn(conn, *args, **kwargs) в очередь; Future с результатом после COMMIT"""
+        future = Future()
+        self._queue.put((fn, args, kwargs, future, time.monotonic()))
+        return future
+
+    def run(self, fn, *args, **kwargs):
+        """Синхронный вариант submit: ждёт COMMIT и возвращает результат (или бросает исключение fn)"""
+        if threading.current_thread() is self._thread:
+            # вызов изнутри задания — уже в транзакции потока записи
+            return fn(self._conn, *args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    def in_writer_thread(self):
+        return threading.current_thread() is self._thread
+
+    def on_commit(self, callback):
+        """Из задания: вызвать callback() после COMMIT пачки, если задание не откатится"""
+        if not self.in_writer_thread() or self._job_hooks is None:
+            raise RuntimeError("on_commit can only be called from a write job")
+        self._job_hooks.append(callback)
+
+    def close(self, timeout=10):
+        """Дописывает то, что уже в очереди, и останавливает поток"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        batches = s['batches'] or 1
+        jobs = s['jobs'] or 1
+        return {
+            'queue_depth': self._queue.qsize(),
+            'jobs': s['jobs'],
+            'failed': s['failed'],
+            'batches': s['batches'],
+            'commit_errors': s['commit_errors'],
+            'avg_batch_size': round(s['jobs'] / batches, 2),
+            'max_batch_size': s['max_batch_size'],
+            'commit_ms_avg': round(s['commit_ms_total'] / batches, 3),
+            'commit_ms_max': round(s['commit_ms_max'], 3),
+            'commit_ms_last': round(s['commit_ms_last'], 3),
+            'wait_ms_avg': round(s['wait_ms_total'] / jobs, 3),
+            'idle_s': round(self.idle_seconds(), 3),
+        }
+
+    def idle_seconds(self):
+        """Сколько секунд не было записей (0, если в очереди есть задания)"""
+        if self._queue.qsize():
+            return 0.0
+        return time.monotonic() - self._last_batch_at
+
+    # --- поток записи ---
+
+    def _take_batch(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(job)
+            if job is _STOP:
+                break
+        return batch
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = self._take_batch(self._queue.get())
+            if batch[-1] is _STOP:
+                stopping = True
+                batch.pop()
+            if batch:
+                try:
+                    self._execute(batch)
+                except Exception as e:
+                    # поток записи не должен умирать: иначе write() будет ждать вечно
+                    logger.exception("SQLite writer failed on a batch of %d writes", len(batch))
+                    for job in batch:
+                        if not job[3].done():
+                            job[3].set_exception(e)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _execute(self, batch):
+        conn = None
+        results = []
+        hooks = []
+        try:
+            if self._conn is None:
+                self._conn = self._connect()
+                self._conn.isolation_level = None  # транзакциями управляем сами
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, kwargs, future, _ in batch:
+                conn.execute("SAVEPOINT job")
+                self._job_hooks = []
+                try:
+                    results.append((True, fn(conn, *args, **kwargs)))
+                    conn.execute("RELEASE job")
+                    hooks.extend(self._job_hooks)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    results.append((False, e))
+                finally:
+                    self._job_hooks = None
+            started = time.monotonic()
+            conn.execute("COMMIT")
+            commit_ms = (time.monotonic() - started) * 1000
+        except Exception as e:
+            # не удалось открыть соединение / транзакцию / COMMIT: пачка целиком не записана
+            logger.exception("Group commit of %d writes failed", len(batch))
+            if conn is not None and conn.in_transaction:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    pass
+            if self._conn is not None and (conn is None or not isinstance(e, (sqlite3.IntegrityError, sqlite3.OperationalError))):
+                # соединение не донастроено или в неизвестном состоянии: следующая пачка откроет новое
+                try:
+                    self._conn.close()
+                except sqlite3.Error:
+                    pass
+                self._conn = None
+            with self._lock:
+                self._stats['commit_errors'] += 1
+            for job in batch:
+                job[3].set_exception(e)
+            return
+
+        done = time.monotonic()
+        with self._lock:
+            st = self._stats
+            st['batches'] += 1
+            st['jobs'] += len(batch)
+            st['failed'] += sum(1 for ok, _ in results if not ok)
+            st['max_batch_size'] = max(st['max_batch_size'], len(batch))
+            st['commit_ms_total'] += commit_ms
+            st['commit_ms_last'] = commit_ms
+            st['commit_ms_max'] = max(st['commit_ms_max'], commit_ms)
+            st['wait_ms_total'] += sum((done - job[4]) * 1000 for job in batch)
+        self._last_batch_at = done
+        for callback in hooks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("on_commit callback failed")
+        for job, (ok, value) in zip(batch, results):
+            if ok:
+                job[3].set_result(value)
+            else:
+                job[3].set_exception(value)
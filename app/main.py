@@ -1,11 +1,15 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
-from app.api.routes import dishes, orders, search, admin, categories, tags, ingredients
+from app.api.routes import dishes, orders, search, admin, categories, tags, ingredients, export
 from app.api.routes.guests import router as guests
 from app.api.routes.news import router as news
 from app.api.routes.images import router as uploads
 from app.api.routes.ai_chat import router as ai_chat
+from app.db.sqlite_db import ensure_schema, close_pool
+from app.db.archive import start_archiver, stop_archiver
+from app.db.maintenance import start_maintenance, stop_maintenance
+from app.vector.vector_store import start_vector_flusher, stop_vector_flusher
 
 app = FastAPI(title=settings['app']['name'])
 
@@ -23,11 +27,41 @@ app.include_router(admin, prefix='/api')
 app.include_router(categories, prefix='/api')
 app.include_router(tags, prefix='/api')
 app.include_router(ingredients, prefix='/api')
+app.include_router(export, prefix='/api')
 app.include_router(guests, prefix="/api")
 app.include_router(news, prefix="/api")
 app.include_router(uploads, prefix="/api")
 app.include_router(ai_chat, prefix='/api')
 
+@app.on_event('startup')
+def apply_schema_migrations():
+    # пустая база -> db/init.sql, иначе только новые миграции из db/migrations
+    ensure_schema('db/init.sql')
+
+@app.on_event('startup')
+def start_order_archiver():
+    # выданные заказы старше archive.after_hours уезжают в архивные таблицы
+    start_archiver()
+
+@app.on_event('startup')
+def start_db_maintenance():
+    # checkpoint WAL, PRAGMA optimize / ANALYZE / incremental vacuum в тихие периоды
+    start_maintenance()
+
+@app.on_event('startup')
+def start_vector_store_flusher():
+    # журнал векторного индекса сворачивается в базовые файлы раз в vector.flush_interval_seconds
+    start_vector_flusher()
+
+@app.on_event('shutdown')
+def stop_background_workers():
+    stop_archiver()
+    stop_maintenance()
+    # несохранённые изменения векторного индекса — в базовые файлы
+    stop_vector_flusher()
+    # дописать очередь записи и закрыть соединения
+    close_pool()
+
 @app.get('/api/health')
 def health():
     return {'status':'ok'}
@@ -0,0 +1,63 @@
+# app/services/export.py
+"""
+Сериализация выгрузок построчно: NDJSON и CSV.
+
+На вход — итератор кортежей из sqlite_db.iter_*_export, на выход — итератор
+кусков байт примерно по CHUNK_BYTES (для StreamingResponse). В памяти только
+текущий кусок, поэтому размер выгрузки ограничен лишь диском клиента.
+"""
+import csv
+import io
+import json
+
+CHUNK_BYTES = 64 * 1024
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+
+
+def _chunked(lines):
+    buf, size = [], 0
+    for line in lines:
+        buf.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield ''.join(buf).encode('utf-8')
+            buf, size = [], 0
+    if buf:
+        yield ''.join(buf).encode('utf-8')
+
+
+def group_items(rows, columns, item_columns):
+    """Строки «заказ + позиция» подряд идущие по заказу -> dict заказа с items"""
+    n = len(columns)
+    order, current_id = None, object()
+    for row in rows:
+        if row[0] != current_id:
+            if order is not None:
+                yield order
+            current_id = row[0]
+            order = dict(zip(columns, row[:n]))
+            order['items'] = []
+        if row[n] is not None:
+            order['items'].append(dict(zip(item_columns, row[n:])))
+    if order is not None:
+        yield order
+
+
+def ndjson_stream(records):
+    """records — dict'ы; одна JSON-строка на запись"""
+    return _chunked(json.dumps(r, ensure_ascii=False, default=str) + '\n' for r in records)
+
+
+def csv_stream(rows, columns):
+    """rows — кортежи в порядке columns; первая строка — заголовок"""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        if out.tell() >= CHUNK_BYTES:
+            yield out.getvalue().encode('utf-8')
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue().encode('utf-8')
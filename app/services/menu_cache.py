@@ -0,0 +1,145 @@
+# app/services/menu_cache.py
+"""
+Read-model меню в памяти процесса.
+
+Снимок (блюда с tags/ingredients, категории, теги, ингредиенты) строится за
+несколько запросов и дальше отдаётся без обращений к БД. Снимок
+пересобирается, когда sqlite_db.menu_version() изменилась (любая запись в
+меню этим процессом) или истёк cache.ttl_seconds (изменения из других
+воркеров). etag снимка — хэш содержимого, одинаковый во всех процессах.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from app.config import settings
+from app.db import sqlite_db
+from app.db.pagination import clamp_limit, encode_cursor, decode_cursor
+
+MENU_TTL = settings.get('cache', {}).get('ttl_seconds', 300)
+_RELATION_KEYS = ('tags', 'ingredients')
+
+
+class MenuSnapshot:
+    __slots__ = ('version', 'etag', 'built_at', 'dishes', 'dishes_by_id', 'dishes_flat',
+                 'categories', 'tags', 'ingredients')
+
+    def __init__(self, version, dishes, categories, tags, ingredients):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.dishes = tuple(sorted(dishes, key=lambda d: d['id']))
+        self.dishes_by_id = {d['id']: d for d in self.dishes}
+        # то же без tags/ingredients — форма обычного /api/dishes
+        self.dishes_flat = tuple({k: v for k, v in d.items() if k not in _RELATION_KEYS} for d in self.dishes)
+        self.categories = tuple(categories)
+        self.tags = tuple(tags)
+        self.ingredients = tuple(ingredients)
+        payload = json.dumps([self.dishes, self.categories, self.tags, self.ingredients],
+                             ensure_ascii=False, sort_keys=True, default=str)
+        self.etag = '"menu-' + hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16] + '"'
+
+
+_SNAPSHOT = None
+_LOCK = threading.Lock()
+
+
+def _is_fresh(snap):
+    return (snap is not None and snap.version == sqlite_db.menu_version()
+            and time.monotonic() - snap.built_at < MENU_TTL)
+
+
+def get_menu():
+    """Актуальный снимок меню (пересобирается только при изменениях / по TTL)"""
+    global _SNAPSHOT
+    snap = _SNAPSHOT
+    if _is_fresh(snap):
+        return snap
+    with _LOCK:
+        snap = _SNAPSHOT
+        if _is_fresh(snap):
+            return snap
+        version = sqlite_db.menu_version()
+        snap = MenuSnapshot(
+            version,
+            dishes=sqlite_db.list_dishes({}, with_relations=True),
+            categories=sqlite_db.list_categories(),
+            tags=sqlite_db.list_tags(),
+            ingredients=sqlite_db.list_ingredients(),
+        )
+        _SNAPSHOT = snap
+    return snap
+
+
+def invalidate():
+    global _SNAPSHOT
+    with _LOCK:
+        _SNAPSHOT = None
+
+
+def _matches(d, filters):
+    """Те же условия, что в sqlite_db.list_dishes"""
+    if filters.get('category_id') and d['category_id'] != int(filters['category_id']):
+        return False
+    if filters.get('spice_max') is not None and d['spice_level'] > int(filters['spice_max']):
+        return False
+    if filters.get('is_vegan') is not None and d['is_vegan'] != (1 if filters['is_vegan'] else 0):
+        return False
+    if 'is_available' in filters and d['is_available'] != (1 if filters['is_available'] else 0):
+        return False
+    if filters.get('max_price') is not None and d['price'] > filters['max_price']:
+        return False
+    return True
+
+
+def list_dishes(filters=None, with_relations=False, snapshot=None):
+    snap = snapshot or get_menu()
+    source = snap.dishes if with_relations else snap.dishes_flat
+    filters = filters or {}
+    return [dict(d) for d in source if _matches(d, filters)]
+
+
+def _dish_key(d):
+    # тот же порядок, что в sqlite_db.list_dishes(after=...)
+    return (d['category_id'] or 0, d['id'])
+
+
+def list_dishes_page(filters=None, with_relations=False, limit=None, cursor=None, snapshot=None):
+    """Страница блюд, keyset по (category_id, id): {'items', 'next_cursor', 'limit'}"""
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor, 2) if cursor else None
+    snap = snapshot or get_menu()
+    source = snap.dishes if with_relations else snap.dishes_flat
+    filters = filters or {}
+    matching = sorted((d for d in source if _matches(d, filters)), key=_dish_key)
+    if after is not None:
+        matching = [d for d in matching if _dish_key(d) > tuple(after)]
+    page = [dict(d) for d in matching[:limit]]
+    next_cursor = encode_cursor(_dish_key(page[-1])) if len(matching) > limit else None
+    return {'items': page, 'next_cursor': next_cursor, 'limit': limit}
+
+
+def get_dish(did, snapshot=None):
+    snap = snapshot or get_menu()
+    d = snap.dishes_by_id.get(int(did))
+    return dict(d) if d else None
+
+
+def list_categories(snapshot=None):
+    return [dict(c) for c in (snapshot or get_menu()).categories]
+
+
+def list_tags(snapshot=None):
+    return [dict(t) for t in (snapshot or get_menu()).tags]
+
+
+def list_ingredients(snapshot=None):
+    return [dict(i) for i in (snapshot or get_menu()).ingredients]
+
+
+def etag_matches(if_none_match, etag):
+    """Совпадает ли заголовок If-None-Match с etag снимка"""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
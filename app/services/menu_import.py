@@ -0,0 +1,215 @@
+# app/services/menu_import.py
+"""
+Массовый импорт меню (POST /api/dishes/import, JSON или CSV).
+
+Сначала проверяется весь файл: ошибки всех строк собираются в
+MenuImportError и ничего не пишется. Категории и время подачи — по id
+или названию (должны существовать), теги — по id (должны существовать)
+или названию (новые создаются), ингредиенты — по названию (новые
+создаются) или id. Затем все блюда вставляются одной транзакцией
+(sqlite_db.import_dishes), эмбеддинги считаются одним пакетом и векторный
+индекс сохраняется один раз (app/vector/reindex.reindex_dishes).
+"""
+import csv
+import io
+import logging
+
+from app.db import sqlite_db
+from app.vector.reindex import reindex_dishes
+
+logger = logging.getLogger(__name__)
+
+MAX_IMPORT_DISHES = 5000
+CSV_LIST_SEPARATOR = ';'
+_TRUE = {'1', 'true', 'yes', 'y', 'да', 'on'}
+_FALSE = {'0', 'false', 'no', 'n', 'нет', 'off', ''}
+
+
+class MenuImportError(ValueError):
+    """Файл импорта не прошёл проверку; errors — [{'row': n, 'field': ..., 'error': ...}]"""
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} import errors")
+
+
+def parse_csv(text):
+    """CSV с заголовком -> список dict; tags / ingredients — через ';', ингредиент 'Рис:200 г'"""
+    rows = []
+    for raw in csv.DictReader(io.StringIO(text.lstrip('\ufeff'))):
+        row = {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in raw.items() if k}
+        for key in ('tags', 'ingredients'):
+            value = row.get(key) or ''
+            row[key] = [part.strip() for part in value.split(CSV_LIST_SEPARATOR) if part.strip()]
+        ingredients = []
+        for ing in row['ingredients']:
+            name, sep, qty = ing.partition(':')
+            ingredients.append({'name': name.strip(), 'quantity': qty.strip()} if sep else name)
+        row['ingredients'] = ingredients
+        rows.append(row)
+    return rows
+
+
+def _bool(value, default):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+def _number(value, cast, what):
+    """cast(value) с понятной ошибкой вместо текста исключения Python"""
+    if isinstance(value, bool):
+        raise ValueError(f"must be {what}")
+    try:
+        return cast(str(value).strip().replace(',', '.') if isinstance(value, str) else value)
+    except (TypeError, ValueError):
+        raise ValueError(f"must be {what}") from None
+
+
+def _ingredient_id(value):
+    try:
+        return _number(value, int, 'an integer')
+    except ValueError:
+        raise ValueError(f"ingredient id must be an integer, got {value!r}") from None
+
+
+def _int(value, default=0, minimum=0):
+    if value is None or value == '':
+        return default
+    number = _number(value, int, 'an integer')
+    if number < minimum:
+        raise ValueError(f"must be >= {minimum}")
+    return number
+
+
+def _by_name(items):
+    return {str(x['name']).strip().lower(): x['id'] for x in items}
+
+
+def _reference(value, ids, names, what):
+    """id или название -> id; None, если значения нет"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, int) or str(value).isdigit():
+        if int(value) not in ids:
+            raise ValueError(f"unknown {what} id {value}")
+        return int(value)
+    key = str(value).strip().lower()
+    if key not in names:
+        raise ValueError(f"unknown {what} {value!r}")
+    return names[key]
+
+
+def validate_dishes(rows):
+    """Проверяет и нормализует строки; MenuImportError со всеми ошибками, если они есть"""
+    if not isinstance(rows, list) or not rows:
+        raise MenuImportError([{'row': None, 'field': None, 'error': 'expected a non-empty list of dishes'}])
+    if len(rows) > MAX_IMPORT_DISHES:
+        raise MenuImportError([{'row': None, 'field': None,
+                                'error': f'too many dishes: {len(rows)} > {MAX_IMPORT_DISHES}'}])
+    categories = sqlite_db.list_categories()
+    meal_times = sqlite_db.list_meal_times()
+    tags = sqlite_db.list_tags()
+    cat_ids, cat_names = {c['id'] for c in categories}, _by_name(categories)
+    meal_ids, meal_names = {m['id'] for m in meal_times}, _by_name(meal_times)
+    tag_ids = {t['id'] for t in tags}
+    ingredient_ids = {i['id'] for i in sqlite_db.list_ingredients()}
+
+    errors, dishes, seen = [], [], {}
+    for n, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({'row': n, 'field': None, 'error': 'dish must be an object'})
+            continue
+
+        def check(field, fn):
+            try:
+                return fn()
+            except (TypeError, ValueError) as e:
+                message = str(e)
+                if message.startswith('must '):
+                    message = f"{field} {message}"
+                errors.append({'row': n, 'field': field, 'error': message})
+
+        name = str(row.get('name') or '').strip()
+        if not name:
+            errors.append({'row': n, 'field': 'name', 'error': 'name is required'})
+        elif name.lower() in seen:
+            errors.append({'row': n, 'field': 'name', 'error': f'duplicate of row {seen[name.lower()]}'})
+        else:
+            seen[name.lower()] = n
+
+        def price():
+            raw = row.get('price')
+            if raw is None or (isinstance(raw, str) and not raw.strip()):
+                raise ValueError("price is required")
+            value = _number(raw, float, 'a number')
+            if value != value or value in (float('inf'), float('-inf')):
+                raise ValueError("must be a number")
+            if value < 0:
+                raise ValueError("must be >= 0")
+            return value
+
+        dish = {
+            'name': name,
+            'description': row.get('description') or '',
+            'price': check('price', price),
+            'category_id': check('category', lambda: _reference(
+                row.get('category_id', row.get('category')), cat_ids, cat_names, 'category')),
+            'meal_time_id': check('meal_time', lambda: _reference(
+                row.get('meal_time_id', row.get('meal_time')), meal_ids, meal_names, 'meal time')),
+            'spice_level': check('spice_level', lambda: _int(row.get('spice_level'))),
+            'is_vegan': check('is_vegan', lambda: _bool(row.get('is_vegan'), False)),
+            'cooking_time': check('cooking_time', lambda: _int(row.get('cooking_time'))),
+            'image_path': row.get('image_path') or '',
+            'is_available': check('is_available', lambda: _bool(row.get('is_available'), True)),
+            'tags': [],
+            'ingredients': [],
+        }
+        for tag in row.get('tags') or []:
+            if isinstance(tag, int) or str(tag).isdigit():
+                if int(tag) not in tag_ids:
+                    errors.append({'row': n, 'field': 'tags', 'error': f'unknown tag id {tag}'})
+                dish['tags'].append(int(tag))
+            elif str(tag).strip():
+                dish['tags'].append(str(tag).strip())
+        for ing in row.get('ingredients') or []:
+            if isinstance(ing, dict):
+                if not (ing.get('id') or str(ing.get('name') or '').strip()):
+                    errors.append({'row': n, 'field': 'ingredients', 'error': 'ingredient needs id or name'})
+                    continue
+                iid = check('ingredients', lambda: _ingredient_id(ing['id'])) if ing.get('id') else None
+                if iid is not None and iid not in ingredient_ids:
+                    errors.append({'row': n, 'field': 'ingredients', 'error': f'unknown ingredient id {iid}'})
+                dish['ingredients'].append({
+                    'id': iid,
+                    'name': str(ing.get('name') or '').strip() or None,
+                    'quantity': ing.get('quantity') or None,
+                    'is_primary': bool(ing.get('is_primary')),
+                })
+            elif str(ing).strip():
+                dish['ingredients'].append(str(ing).strip())
+        dishes.append(dish)
+
+    if errors:
+        raise MenuImportError(errors)
+    return dishes
+
+
+def import_menu(rows, reindex=True):
+    """Проверка, вставка одной транзакцией, пакетная переиндексация; {'created': n, 'ids': [...], 'indexed': k}"""
+    dishes = validate_dishes(rows)
+    ids = sqlite_db.import_dishes(dishes)
+    indexed = 0
+    if reindex:
+        try:
+            indexed = reindex_dishes(ids)
+        except Exception:
+            # блюда уже сохранены; индекс догонит /api/admin/reindex
+            logger.exception("Batch reindex after menu import failed")
+    return {'created': len(ids), 'ids': ids, 'indexed': indexed}
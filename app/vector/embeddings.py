@@ -6,6 +6,16 @@ import logging
 logger = logging.getLogger(__name__)
 
 LM_STUDIO_URL = "http://127.0.0.1:1234/v1/embeddings"
+EMBED_BATCH = 64  # текстов в одном запросе get_embeddings
+
+def _fallback_embedding(text):
+    # детерминированный псевдослучайный вектор
+    np.random.seed(hash(text) % (2**32))
+    embedding = np.random.randn(384).astype("float32")
+    norm = np.linalg.norm(embedding)
+    if norm > 0:
+        embedding = embedding / norm
+    return embedding
 
 def get_embedding(text: str):
     if not text:
@@ -40,10 +50,27 @@ def get_embedding(text: str):
 
     except Exception as e:
         logger.exception(f"LM Studio embedding error: {e}")
-        # fallback: детерминированный псевдослучайный вектор
-        np.random.seed(hash(text) % (2**32))
-        embedding = np.random.randn(384).astype("float32")
-        norm = np.linalg.norm(embedding)
-        if norm > 0:
-            embedding = embedding / norm
-        return embedding
\ No newline at end of file
+        return _fallback_embedding(text)
+
+def get_embeddings(texts, batch_size=EMBED_BATCH):
+    """Эмбеддинги списка текстов: один запрос на batch_size текстов (input — список)"""
+    texts = [t or "" for t in texts]
+    result = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        payload = {
+            "input": batch,
+            "model": "text-embedding-all-minilm-l6-v2-embedding"
+        }
+        try:
+            response = requests.post(LM_STUDIO_URL, json=payload, timeout=30 + len(batch))
+            if response.status_code != 200:
+                raise ValueError(f"LM Studio error: {response.status_code}")
+            data = sorted(response.json()["data"], key=lambda item: item.get("index", 0))
+            if len(data) != len(batch):
+                raise ValueError(f"expected {len(batch)} embeddings, got {len(data)}")
+            result.extend(np.array(item["embedding"], dtype="float32") for item in data)
+        except Exception as e:
+            logger.exception(f"LM Studio batch embedding error: {e}")
+            result.extend(_fallback_embedding(text) for text in batch)
+    return result
\ No newline at end of file
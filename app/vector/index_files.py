@@ -0,0 +1,261 @@
+# app/vector/index_files.py
+"""
+Версионированный формат файлов векторного индекса (format 2).
+
+Каждое сохранение — новое поколение N:
+  embeddings.NNNNNN.npy   — матрица float32, строки в порядке ids
+  meta.NNNNNN.json        — {"ids": [...], "metadata": {id: {...}}}
+  manifest.NNNNNN.json    — format, generation, model, dim, rows, sha256 обоих файлов
+  manifest.json           — копия манифеста текущего поколения
+Файлы пишутся во временные, fsync и os.replace; manifest.json заменяется
+последним — это и есть момент фиксации. Файлы поколения после записи не
+меняются, поэтому читатель, прочитавший манифест, видит согласованный
+снимок. При загрузке манифест проверяется (размеры, контрольные суммы);
+если поколение битое или недописано — берётся предыдущее целое, а
+restore_generation() возвращает на него manifest.json и убирает с пути
+файлы более новых (битых) поколений.
+Хранятся последние KEEP_GENERATIONS поколений.
+
+load_index(..., mmap=True) отображает embeddings в память (np.load с
+mmap_mode='r'): матрица не копируется в память процесса, и несколько
+процессов делят одну копию в page cache. Контрольная сумма embeddings
+считается один раз на файл поколения в процессе (при записи — из уже
+посчитанной, иначе при первом открытии, потоком по файлу): файлы поколения
+не меняются, и повторные загрузки того же поколения файл целиком не читают.
+
+Старый формат (embeddings.npy + meta.json без манифеста) читается, если
+манифеста нет и число строк совпадает с числом ключей meta.json.
+"""
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+KEEP_GENERATIONS = 2
+MANIFEST = 'manifest.json'
+LEGACY_EMB = 'embeddings.npy'
+LEGACY_META = 'meta.json'
+
+_GEN_MANIFEST = re.compile(r'^manifest\.(\d{6,})\.json$')
+
+# путь embeddings -> (размер, mtime_ns, sha256) уже проверенных в этом процессе файлов
+_VERIFIED = {}
+
+
+class IndexCorrupt(ValueError):
+    """Поколение индекса не прошло проверку"""
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _sha256_file(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _file_key(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _remember_verified(path, sha):
+    _VERIFIED[os.path.abspath(path)] = (*_file_key(path), sha)
+
+
+def _embeddings_sha256(path):
+    """sha256 файла embeddings: из _VERIFIED, если файл с тех пор не менялся"""
+    key = os.path.abspath(path)
+    cached = _VERIFIED.get(key)
+    if cached and cached[:2] == _file_key(path):
+        return cached[2]
+    sha = _sha256_file(path)
+    _remember_verified(path, sha)
+    return sha
+
+
+def _fsync_dir(directory):
+    if os.name != 'posix':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_atomic(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _gen_name(prefix, generation, ext):
+    return f'{prefix}.{generation:06d}.{ext}'
+
+
+def generations(directory):
+    """Номера поколений, для которых есть манифест, новые первыми"""
+    found = []
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        m = _GEN_MANIFEST.match(name)
+        if m:
+            found.append(int(m.group(1)))
+    return sorted(found, reverse=True)
+
+
+def read_manifest(directory):
+    """Манифест текущего поколения или None"""
+    path = os.path.join(directory, MANIFEST)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_index(directory, ids, emb, metadata, model=None):
+    """Пишет новое поколение; возвращает его манифест"""
+    os.makedirs(directory, exist_ok=True)
+    emb = np.ascontiguousarray(emb, dtype='float32')
+    if emb.ndim != 2 or len(emb) != len(ids):
+        raise ValueError(f"rows mismatch: {emb.shape} vs {len(ids)} ids")
+    current = read_manifest(directory)
+    known = generations(directory)
+    generation = max([current['generation'] if current else 0] + known) + 1
+
+    buf = io.BytesIO()
+    np.save(buf, emb)
+    emb_bytes = buf.getvalue()
+    meta_bytes = json.dumps({'ids': list(ids), 'metadata': metadata}, ensure_ascii=False).encode('utf-8')
+    manifest = {
+        'format': FORMAT_VERSION,
+        'generation': generation,
+        'model': model,
+        'dim': int(emb.shape[1]),
+        'rows': len(ids),
+        'embeddings': _gen_name('embeddings', generation, 'npy'),
+        'meta': _gen_name('meta', generation, 'json'),
+        'sha256': {'embeddings': _sha256(emb_bytes), 'meta': _sha256(meta_bytes)},
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+    manifest_bytes = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+    _write_atomic(os.path.join(directory, manifest['embeddings']), emb_bytes)
+    _remember_verified(os.path.join(directory, manifest['embeddings']), manifest['sha256']['embeddings'])
+    _write_atomic(os.path.join(directory, manifest['meta']), meta_bytes)
+    _write_atomic(os.path.join(directory, _gen_name('manifest', generation, 'json')), manifest_bytes)
+    _write_atomic(os.path.join(directory, MANIFEST), manifest_bytes)
+    _fsync_dir(directory)
+    _prune(directory, generation)
+    return manifest
+
+
+def _prune(directory, generation):
+    keep = generation - KEEP_GENERATIONS
+    for path in glob.glob(os.path.join(directory, '*.*.*')):
+        parts = os.path.basename(path).split('.')
+        if len(parts) >= 3 and parts[1].isdigit() and int(parts[1]) <= keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def restore_generation(directory, manifest):
+    """После отката: manifest.json снова указывает на поколение manifest.
+
+    Файлы более новых поколений (данные, манифесты, журналы) переименовываются в
+    *.damaged: load_index их больше не пробует, журнал битого поколения не
+    проигрывается поверх следующего с тем же номером. Удаляет их _prune.
+    """
+    generation = manifest['generation']
+    for path in glob.glob(os.path.join(directory, '*.*.*')):
+        parts = os.path.basename(path).split('.')
+        if len(parts) == 3 and parts[1].isdigit() and int(parts[1]) > generation:
+            os.replace(path, path + '.damaged')
+    _write_atomic(os.path.join(directory, MANIFEST),
+                  json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+    _fsync_dir(directory)
+    logger.warning("Vector index manifest restored to generation %s", generation)
+
+
+def _load_generation(directory, manifest, mmap=False):
+    if manifest.get('format') != FORMAT_VERSION:
+        raise IndexCorrupt(f"unsupported format {manifest.get('format')}")
+    emb_path = os.path.join(directory, manifest['embeddings'])
+    with open(os.path.join(directory, manifest['meta']), 'rb') as f:
+        meta_bytes = f.read()
+    if _embeddings_sha256(emb_path) != manifest['sha256']['embeddings']:
+        raise IndexCorrupt("embeddings checksum mismatch")
+    if _sha256(meta_bytes) != manifest['sha256']['meta']:
+        raise IndexCorrupt("meta checksum mismatch")
+    emb = np.load(emb_path, mmap_mode='r' if mmap else None)
+    meta = json.loads(meta_bytes)
+    ids = meta['ids']
+    if emb.ndim != 2 or emb.shape != (manifest['rows'], manifest['dim']) or len(ids) != manifest['rows']:
+        raise IndexCorrupt(f"shape mismatch: {emb.shape}, {len(ids)} ids, manifest {manifest['rows']}x{manifest['dim']}")
+    return ids, emb, meta['metadata'], manifest
+
+
+def _load_legacy(directory, mmap=False):
+    emb_path = os.path.join(directory, LEGACY_EMB)
+    meta_path = os.path.join(directory, LEGACY_META)
+    if not (os.path.exists(emb_path) and os.path.exists(meta_path)):
+        return None
+    emb = np.load(emb_path, mmap_mode='r' if mmap else None)
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if emb.ndim != 2 or len(emb) != len(meta):
+        raise IndexCorrupt(f"legacy index mismatch: {len(emb)} rows vs {len(meta)} ids")
+    return list(meta.keys()), emb, meta, None
+
+
+def load_index(directory, mmap=False):
+    """(ids, emb, metadata, manifest) последнего целого поколения; None, если индекса нет.
+
+    manifest — None для старого формата. IndexCorrupt, если ни одно поколение не прошло проверку.
+    mmap — emb отображается в память только для чтения.
+    """
+    candidates = []
+    current = read_manifest(directory)
+    if current:
+        candidates.append(current)
+    for generation in generations(directory):
+        if current and generation == current.get('generation'):
+            continue
+        try:
+            with open(os.path.join(directory, _gen_name('manifest', generation, 'json')), 'r', encoding='utf-8') as f:
+                candidates.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    candidates.sort(key=lambda m: m.get('generation', 0), reverse=True)
+    errors = []
+    for manifest in candidates:
+        try:
+            result = _load_generation(directory, manifest, mmap)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            errors.append(f"generation {manifest.get('generation')}: {e}")
+            logger.warning("Vector index generation %s is damaged, rolling back: %s", manifest.get('generation'), e)
+            continue
+        if errors:
+            logger.warning("Vector index rolled back to generation %s", manifest['generation'])
+        return result
+    if candidates:
+        raise IndexCorrupt("; ".join(errors))
+    return _load_legacy(directory, mmap)
@@ -1,6 +1,6 @@
 # app/vector/reindex.py
 from app.db import sqlite_db
-from app.vector.embeddings import get_embedding  # <-- Важно: импорт здесь
+from app.vector.embeddings import get_embedding, get_embeddings  # <-- Важно: импорт здесь
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,6 +13,10 @@ def build_doc_for_dish(did):
     d = sqlite_db.get_dish(did)
     if not d:
         return None
+    return build_doc(d)
+
+def build_doc(d):
+    """То же, что build_doc_for_dish, но из уже загруженного блюда (с tags/ingredients)"""
     # flatten ingredients names
     ing_names = []
     for ing in d.get('ingredients', []):
@@ -35,6 +39,10 @@ def reindex_dish(did):
     doc = build_doc_for_dish(did)
     if not doc:
         return False
+    return index_doc(doc)
+
+def index_doc(doc):
+    did = doc['id']
     try:
         from app.vector.vector_store import VECTOR_STORE
     except Exception:
@@ -57,13 +65,30 @@ def reindex_dish(did):
         logger.info("VECTOR_STORE not available; reindex skipped for dish %s", did)
         return False
 
+def index_docs(docs):
+    """Пакетный index_doc: эмбеддинги пачками (get_embeddings), индекс сохраняется один раз"""
+    try:
+        from app.vector.vector_store import VECTOR_STORE
+    except Exception:
+        VECTOR_STORE = None
+    if not VECTOR_STORE:
+        logger.info("VECTOR_STORE not available; reindex skipped for %d dishes", len(docs))
+        return 0
+    if not docs:
+        return 0
+    embeddings = get_embeddings([doc['text'] for doc in docs])
+    return VECTOR_STORE.upsert_many((doc['id'], emb, doc['metadata']) for doc, emb in zip(docs, embeddings))
+
+def reindex_dishes(ids):
+    """Переиндексация набора блюд (после массового импорта); число проиндексированных"""
+    dishes = sqlite_db.get_dishes(ids)
+    n = index_docs([build_doc(d) for d in dishes])
+    logger.info(f"Reindexed {n}/{len(ids)} dishes")
+    return n
+
 def reindex_all():
-    dishes = sqlite_db.list_dishes({'is_available':1})
-    n = 0
-    for d in dishes:
-        if reindex_dish(d['id']):
-            n += 1
-        else:
-            logger.warning(f"Failed to reindex dish {d['id']}: {d.get('name')}")
+    # блюда вместе с tags/ingredients за константное число запросов, индекс пишется один раз
+    dishes = sqlite_db.list_dishes({'is_available':1}, with_relations=True)
+    n = index_docs([build_doc(d) for d in dishes])
     logger.info(f"Reindex completed: {n}/{len(dishes)} dishes indexed")
     return n
\ No newline at end of file
@@ -1,85 +1,530 @@
-import os, json, numpy as np
+"""
+Векторный индекс блюд в памяти процесса (numpy), с сохранением в persist_dir.
+
+Строки лежат в заранее выделенном буфере float32, ёмкость удваивается по
+мере роста, id -> номер строки — словарь, поэтому upsert и delete — O(1)
+амортизированно. delete только помечает строку пустой (tombstone); когда
+пустых строк становится много, буфер уплотняется в фоновом потоке.
+Строки хранятся уже нормированными (косинусная мера), поэтому query —
+одно умножение матрицы на вектор и argpartition для top_k, без копий
+матрицы.
+
+Сохранение: поколения индекса в формате app/vector/index_files.py (только
+живые строки, атомарная замена манифеста, откат к целому поколению при
+загрузке) и журнал journal.NNNNNN.ndjson поверх поколения N. Одиночный
+upsert / delete дописывает в журнал одну строку; при загрузке журнал
+проигрывается поверх поколения. flush() пишет новое поколение:
+в конце bulk(), когда в журнале набралось vector.journal_max_entries
+записей, фоновым потоком раз в vector.flush_interval_seconds и при
+остановке приложения.
+
+Несколько рабочих процессов делят один persist_dir. Запись в журнал,
+загрузка и flush идут под межпроцессной блокировкой (flock на
+persist_dir/.lock). Запись дописывается в журнал текущего поколения на
+диске. flush, если другие процессы успели записать поколение или дописать
+журнал, сначала перечитывает индекс с диска (поколение + весь журнал) и
+накладывает сверху только свои незажурналированные изменения из bulk(),
+поэтому чужие изменения не теряются. Если поколение то же и журнал только
+дописан, проигрывается лишь его новый хвост — база заново не отображается
+и не проверяется.
+"""
+import os, json, time, logging, threading, contextlib, numpy as np
+try:
+    import fcntl
+except ImportError:  # не POSIX: блокировки между процессами нет, один процесс на persist_dir
+    fcntl = None
 from app.config import settings
+from app.vector import index_files
 PERSIST = settings['vector']['persist_dir']
 os.makedirs(PERSIST, exist_ok=True)
-EMB_FILE = os.path.join(PERSIST, 'embeddings.npy')
-META_FILE = os.path.join(PERSIST, 'meta.json')
+MODEL_NAME = settings.get('embeddings', {}).get('model_name')
+FLUSH_INTERVAL = settings['vector'].get('flush_interval_seconds', 60)
+JOURNAL_MAX_ENTRIES = settings['vector'].get('journal_max_entries', 1000)
+
+logger = logging.getLogger(__name__)
+
+MIN_CAPACITY = 16
+COMPACT_MIN_DEAD = 64       # уплотнять, когда пустых строк не меньше этого
+COMPACT_DEAD_RATIO = 0.25   # и они составляют такую долю занятых строк
+USE_MMAP = settings['vector'].get('mmap', True)
+RELOAD_CHECK_SECONDS = settings['vector'].get('reload_check_seconds', 1.0)
+LOCK_FILE = '.lock'
+
+# sha256 embeddings поколения -> строки нормированы (проверяется один раз на поколение)
+_NORMALIZED = {}
 
 class NumpyVectorStore:
     def __init__(self):
-        self._emb = None
-        self._ids = []
+        self._lock = threading.RLock()
+        # строки [0, _nb) — базовое поколение с диска (mmap, только чтение), [_nb, _nb + _n) — _buf
+        self._base = np.zeros((0, 1), dtype='float32')
+        self._nb = 0
+        self._buf = np.zeros((0, 1), dtype='float32')  # строки [0, _n) заняты, включая tombstone
+        self._n = 0
+        self._row_ids = []      # id строки или None (удалена), по сквозной нумерации
+        self._alive = np.zeros(0, dtype=bool)
+        self._index = {}        # id -> сквозной номер строки
         self._meta = {}
-        self._load()
+        self._dead = 0
+        self._compacting = False
+        self._bulk = 0          # глубина вложенных bulk()
+        self._dirty = False     # базовые файлы отстают от памяти
+        self._journaled = 0     # записей в журнале
+        self._journal_bytes = 0 # сколько байт журнала уже учтено в памяти
+        self._unjournaled = set()  # id, изменённые в bulk() и ещё не записанные на диск
+        self._generation = 0    # поколение на диске, поверх него — журнал
+        self._checked_at = 0.0  # time.monotonic() последней проверки manifest.json
+        self._dir_locked = False
+        with self._dir_lock():
+            self._load()
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def ids(self):
+        with self._lock:
+            return [i for i in self._row_ids[:self._nb + self._n] if i is not None]
+
+    @property
+    def generation(self):
+        return self._generation
+
+    @property
+    def mapped(self):
+        """Базовая матрица отображена в память (делится между процессами через page cache)"""
+        return isinstance(self._base, np.memmap)
+
+    def _journal_path(self, generation=None):
+        generation = self._generation if generation is None else generation
+        return os.path.join(PERSIST, f'journal.{generation:06d}.ndjson')
+
+    @contextlib.contextmanager
+    def _dir_lock(self):
+        """Межпроцессная блокировка persist_dir; повторный вход в том же процессе не блокирует"""
+        with self._lock:
+            if self._dir_locked or fcntl is None:
+                yield
+                return
+            with open(os.path.join(PERSIST, LOCK_FILE), 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                self._dir_locked = True
+                try:
+                    yield
+                finally:
+                    self._dir_locked = False
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _disk_state(self):
+        """(поколение в manifest.json, размер его журнала в байтах)"""
+        manifest = index_files.read_manifest(PERSIST)
+        generation = manifest.get('generation', 0) if manifest else 0
+        try:
+            size = os.path.getsize(self._journal_path(generation))
+        except OSError:
+            size = 0
+        return generation, size
+
+    def _in_sync(self):
+        """В памяти учтено всё, что лежит на диске (никто другой не писал)"""
+        return self._disk_state() == (self._generation, self._journal_bytes)
 
     def _load(self):
-        if os.path.exists(EMB_FILE):
-            self._emb = np.load(EMB_FILE)
+        try:
+            loaded = index_files.load_index(PERSIST, mmap=USE_MMAP)
+        except (index_files.IndexCorrupt, OSError, ValueError) as e:
+            # лучше пустой индекс (его восстановит /api/admin/reindex), чем id на чужих векторах
+            logger.error("Vector index is unusable, starting empty: %s", e)
+            loaded = None
+        if loaded is None:
+            ids, emb, meta, manifest = [], np.zeros((0, 1), dtype='float32'), {}, None
         else:
-            self._emb = np.zeros((0,1))
-        if os.path.exists(META_FILE):
-            with open(META_FILE,'r',encoding='utf-8') as f:
-                self._meta = json.load(f)
-                self._ids = list(self._meta.keys())
-        else:
-            self._meta = {}
-            self._ids = []
+            ids, emb, meta, manifest = loaded
+        ids = [str(i) for i in ids]
+        self._generation = manifest['generation'] if manifest else 0
+        current = index_files.read_manifest(PERSIST)
+        if manifest and (current or {}).get('generation') != self._generation:
+            # откат с битого поколения: журнал и _in_sync должны смотреть на загруженное
+            index_files.restore_generation(PERSIST, manifest)
+        if manifest and MODEL_NAME and manifest.get('model') and manifest['model'] != MODEL_NAME:
+            logger.warning("Vector index was built with %s, configured model is %s; reindex needed",
+                           manifest['model'], MODEL_NAME)
+        if emb.ndim != 2:
+            emb = np.zeros((0, 1), dtype='float32')
+        normalized = True
+        sha = manifest['sha256']['embeddings'] if manifest else None
+        if sha is not None and sha not in _NORMALIZED:
+            _NORMALIZED[sha] = emb.dtype == np.float32 and _is_normalized(emb)
+        if len(emb) and (emb.dtype != np.float32 or not (_NORMALIZED[sha] if sha else _is_normalized(emb))):
+            # старые файлы с ненормированными строками: копия в памяти, на диск — при следующем flush
+            emb = _normalized(np.asarray(emb, dtype='float32'))
+            normalized = False
+        self._base = emb
+        self._nb = len(ids)
+        self._buf = np.zeros((MIN_CAPACITY, emb.shape[1]), dtype='float32')
+        self._n = 0
+        self._row_ids = ids + [None] * len(self._buf)
+        self._alive = np.zeros(self._nb + len(self._buf), dtype=bool)
+        self._alive[:self._nb] = True
+        self._index = {id: row for row, id in enumerate(ids)}
+        self._meta = {id: meta.get(id, {}) for id in ids}
+        self._dead = 0
+        self._journaled = 0
+        self._journal_bytes = 0
+        self._unjournaled = set()
+        self._dirty = not normalized
+        self._checked_at = time.monotonic()
+        self._replay()
+
+    def _replay(self, start=0):
+        """Проигрывает журнал (с байта start) поверх того, что в памяти; оборванная строка пропускается"""
+        path = self._journal_path()
+        if not os.path.exists(path):
+            return
+        n = size = 0
+        with open(path, 'rb') as f:
+            f.seek(start)
+            for line in f:
+                size += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping broken vector journal line")
+                    continue
+                if entry.get('op') == 'upsert':
+                    self._put(entry['id'], entry['emb'], entry.get('meta') or {})
+                elif entry.get('op') == 'delete':
+                    self._remove(entry['id'])
+                n += 1
+        self._journaled += n
+        self._journal_bytes = start + size
+        self._dirty = self._dirty or n > 0
+
+    def _catch_up(self):
+        """Догоняет диск: то же поколение и журнал только дописан — проигрывает хвост, иначе _load()"""
+        with self._dir_lock():
+            generation, size = self._disk_state()
+            if generation == self._generation and size >= self._journal_bytes:
+                self._replay(self._journal_bytes)
+                self._checked_at = time.monotonic()
+            else:
+                self._load()
+
+    def reload_if_changed(self, force=False):
+        """Перечитывает индекс, если другой процесс записал новое поколение или дописал журнал;
+        True, если перечитали.
+
+        Проверка manifest.json и размера журнала — не чаще раза в vector.reload_check_seconds.
+        Зажурналированные изменения этого процесса уже на диске и перечитываются вместе
+        с чужими; пока есть незаписанные изменения из bulk(), индекс не перечитывается.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return False
+        self._checked_at = now
+        if self._in_sync():
+            return False
+        with self._lock:
+            if self._unjournaled or self._bulk or self._compacting:
+                return False
+            self._catch_up()
+            logger.info("Vector index caught up: generation %s, journal %s bytes",
+                        self._generation, self._journal_bytes)
+            return True
+
+    def _row(self, row):
+        return self._base[row] if row < self._nb else self._buf[row - self._nb]
+
+    def _live(self):
+        """(ids, строки) живых записей в порядке строк"""
+        base_rows = np.flatnonzero(self._alive[:self._nb])
+        buf_rows = np.flatnonzero(self._alive[self._nb:self._nb + self._n])
+        ids = [self._row_ids[row] for row in base_rows] + [self._row_ids[self._nb + row] for row in buf_rows]
+        width = max(self._base.shape[1], self._buf.shape[1])
+        emb = np.zeros((len(ids), width), dtype='float32')
+        emb[:len(base_rows), :self._base.shape[1]] = self._base[base_rows]
+        emb[len(base_rows):, :self._buf.shape[1]] = self._buf[buf_rows]
+        return ids, emb
 
     def _save(self):
-        np.save(EMB_FILE, self._emb)
-        with open(META_FILE,'w',encoding='utf-8') as f:
-            json.dump(self._meta, f, ensure_ascii=False, indent=2)
+        with self._lock, self._dir_lock():
+            if not self._in_sync():
+                # другие процессы записали поколение или дописали журнал: берём состояние с диска
+                # (наши зажурналированные изменения там тоже есть), сверху — свои изменения из bulk()
+                pending = [(id, self._row(self._index[id]).copy(), self._meta[id]) if id in self._index else (id, None, None)
+                           for id in self._unjournaled]
+                self._catch_up()
+                for id, emb, metadata in pending:
+                    if emb is None:
+                        self._remove(id)
+                    else:
+                        self._put(id, emb, metadata)
+                if not pending and not self._dirty:
+                    return  # наши изменения уже в поколении, записанном другим процессом
+            ids, emb = self._live()
+            meta = {id: self._meta[id] for id in ids}
+            old_journal = self._journal_path()
+            manifest = index_files.write_index(PERSIST, ids, emb, meta, model=MODEL_NAME)
+            _NORMALIZED[manifest['sha256']['embeddings']] = True  # _live() — нормированные строки
+            # новое поколение уже содержит всё из журнала; отображаем его вместо копии в памяти
+            if os.path.exists(old_journal):
+                os.remove(old_journal)
+            self._dirty = False
+            self._load()
+
+    def flush(self):
+        """Переписывает базовые файлы, если есть несохранённые изменения; True, если писали"""
+        with self._lock:
+            if not self._dirty:
+                return False
+            self._save()
+            return True
+
+    @contextlib.contextmanager
+    def bulk(self):
+        """Изменения внутри блока не журналируются; на выходе — один flush()"""
+        with self._lock:
+            self._bulk += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._bulk -= 1
+                if not self._bulk:
+                    self.flush()
+
+    def _journal(self, entry):
+        """Одна строка в журнал текущего поколения на диске (внутри bulk — только пометка)"""
+        with self._lock:
+            self._dirty = True
+            if self._bulk:
+                self._unjournaled.add(entry['id'])
+                return
+            line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+            with self._dir_lock():
+                # другой процесс мог уже записать новое поколение: пишем в его журнал
+                generation, size = self._disk_state()
+                with open(self._journal_path(generation), 'ab') as f:
+                    f.write(line)
+                if (generation, size) == (self._generation, self._journal_bytes):
+                    self._journal_bytes += len(line)
+            self._journaled += 1
+            if self._journaled >= JOURNAL_MAX_ENTRIES:
+                self._save()
 
     def upsert(self, id, emb, metadata):
-        id = str(id)
-        emb = np.array(emb, dtype='float32')
-        if self._emb.size == 0:
-            self._emb = emb.reshape(1,-1)
-            self._ids = [id]
-        else:
-            # ensure dims
-            if emb.shape[0] != self._emb.shape[1]:
-                # resize existing to match new dim by padding zeros (rare)
-                if emb.shape[0] > self._emb.shape[1]:
-                    pad = np.zeros((self._emb.shape[0], emb.shape[0]-self._emb.shape[1]), dtype='float32')
-                    self._emb = np.hstack([self._emb, pad])
-                else:
-                    emb = np.pad(emb, (0, self._emb.shape[1]-emb.shape[0]), 'constant').astype('float32')
-            if id in self._ids:
-                idx = self._ids.index(id)
-                self._emb[idx] = emb
+        with self._lock:
+            row = self._put(id, emb, metadata)
+            if not self._bulk:
+                self._journal({'op': 'upsert', 'id': str(id), 'emb': self._row(row).tolist(), 'meta': metadata})
             else:
-                self._emb = np.vstack([self._emb, emb])
-                self._ids.append(id)
-        self._meta[id] = metadata
-        self._save()
+                self._dirty = True
+                self._unjournaled.add(str(id))
+
+    def upsert_many(self, items):
+        """items — [(id, emb, metadata)]; файлы индекса пишутся один раз"""
+        n = 0
+        with self.bulk():
+            for id, emb, metadata in items:
+                self._put(id, emb, metadata)
+                self._unjournaled.add(str(id))
+                n += 1
+            if n:
+                self._dirty = True
+        return n
+
+    def _grow(self, rows, dim):
+        """Ёмкость _buf >= rows (удвоением) и ширина >= dim; копирование только при росте"""
+        cap, width = self._buf.shape
+        if dim > self._base.shape[1] and self._nb:
+            # разная размерность (редко): базу приходится скопировать с дополнением нулями
+            self._base = np.pad(self._base, ((0, 0), (0, dim - self._base.shape[1])), 'constant')
+        if rows <= cap and dim <= width:
+            return
+        new_cap = max(cap, MIN_CAPACITY)
+        while new_cap < rows:
+            new_cap *= 2
+        buf = np.zeros((new_cap, max(dim, width)), dtype='float32')
+        buf[:self._n, :width] = self._buf[:self._n]
+        self._buf = buf
+        self._row_ids.extend([None] * (self._nb + new_cap - len(self._row_ids)))
+        alive = np.zeros(self._nb + new_cap, dtype=bool)
+        alive[:self._nb + self._n] = self._alive[:self._nb + self._n]
+        self._alive = alive
+
+    def _put(self, id, emb, metadata):
+        id = str(id)
+        emb = _normalized(np.asarray(emb, dtype='float32').reshape(-1))
+        with self._lock:
+            if not self._nb and not self._n and not self._index:
+                # пустой индекс принимает размерность первого вектора
+                self._base = np.zeros((0, emb.shape[0]), dtype='float32')
+                self._buf = np.zeros((max(MIN_CAPACITY, len(self._buf)), emb.shape[0]), dtype='float32')
+                self._row_ids = [None] * len(self._buf)
+                self._alive = np.zeros(len(self._buf), dtype=bool)
+            row = self._index.get(id)
+            if row is not None and row < self._nb:
+                # строки базы только для чтения: старая помечается удалённой, новая — в _buf
+                self._remove(id)
+                row = None
+            # разная размерность (редко): дополняем нулями меньшую сторону
+            self._grow(self._n + (row is None), emb.shape[0])
+            width = self._buf.shape[1]
+            if emb.shape[0] < width:
+                emb = np.pad(emb, (0, width - emb.shape[0]), 'constant')
+            if row is None:
+                row = self._nb + self._n
+                self._n += 1
+                self._index[id] = row
+                self._row_ids[row] = id
+                self._alive[row] = True
+            self._buf[row - self._nb] = emb
+            self._meta[id] = metadata
+            return row
 
     def delete(self, id):
         id = str(id)
-        if id in self._ids:
-            idx = self._ids.index(id)
-            self._emb = np.delete(self._emb, idx, axis=0)
-            self._ids.pop(idx)
+        with self._lock:
+            if not self._remove(id):
+                return
+            self._journal({'op': 'delete', 'id': id})
+            compact = self._needs_compaction()
+            if compact:
+                self._compacting = True
+        if compact:
+            threading.Thread(target=self.compact, name='vector-compact', daemon=True).start()
+
+    def _remove(self, id):
+        id = str(id)
+        with self._lock:
+            row = self._index.pop(id, None)
+            if row is None:
+                return False
+            self._row_ids[row] = None
+            self._alive[row] = False
+            if row >= self._nb:
+                self._buf[row - self._nb] = 0
             self._meta.pop(id, None)
-            self._save()
+            self._dead += 1
+            return True
+
+    def _needs_compaction(self):
+        return (not self._compacting and self._dead >= COMPACT_MIN_DEAD
+                and self._dead >= COMPACT_DEAD_RATIO * (self._nb + self._n))
+
+    def compact(self):
+        """Убирает tombstone-строки: пишет новое поколение из живых строк и отображает его"""
+        with self._lock:
+            try:
+                self._dirty = True
+                self._save()
+            finally:
+                self._compacting = False
 
     def query(self, emb, top_k=10):
-        if self._emb.size == 0:
-            return []
-        emb = np.array(emb, dtype='float32')
-        # normalize
-        def norm(a):
-            n = np.linalg.norm(a, axis=1, keepdims=True)
-            n[n==0]=1
-            return a / n
-        A = norm(self._emb)
-        v = emb.reshape(1,-1)
-        v = v / (np.linalg.norm(v)+1e-10)
-        sims = (A @ v.T).reshape(-1)
-        idxs = sims.argsort()[::-1][:top_k]
-        res = []
-        for i in idxs:
-            res.append({'id': int(self._ids[i]), 'score': float(sims[i]), 'metadata': self._meta.get(self._ids[i], {})})
-        return res
+        self.reload_if_changed()
+        with self._lock:
+            if not self._index:
+                return []
+            nb, n = self._nb, self._n
+            width = max(self._base.shape[1], self._buf.shape[1])
+            emb = np.asarray(emb, dtype='float32').reshape(-1)
+            if emb.shape[0] != width:
+                emb = np.pad(emb, (0, max(0, width - emb.shape[0])), 'constant')[:width]
+            v = _normalized(emb)
+            # строки нормированы; база — представление mmap, без копии
+            sims = np.empty(nb + n, dtype='float32')
+            if nb:
+                np.matmul(self._base, v[:self._base.shape[1]], out=sims[:nb])
+            if n:
+                np.matmul(self._buf[:n], v[:self._buf.shape[1]], out=sims[nb:])
+            if self._dead:
+                sims[~self._alive[:nb + n]] = -np.inf
+            idxs = _top_k(sims, min(top_k, len(self._index)))
+            res = []
+            for i in idxs:
+                id = self._row_ids[i]
+                res.append({'id': int(id), 'score': float(sims[i]), 'metadata': self._meta.get(id, {})})
+            return res
+
+
+def _normalized(emb):
+    """Вектор или строки матрицы единичной длины (нулевые остаются нулевыми)"""
+    norm = np.linalg.norm(emb, axis=-1, keepdims=True)
+    norm[norm == 0] = 1
+    return (emb / norm).astype('float32', copy=False)
+
+
+def _is_normalized(emb, tol=1e-3):
+    """Все ненулевые строки единичной длины (проверка по блокам, без копии всей матрицы)"""
+    for start in range(0, len(emb), 65536):
+        norms = np.linalg.norm(emb[start:start + 65536], axis=1)
+        if np.any((norms > tol) & (np.abs(norms - 1) > tol)):
+            return False
+    return True
+
+
+def _top_k(sims, k):
+    """Индексы k наибольших по убыванию: argpartition O(n) + сортировка k"""
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(sims):
+        part = np.argpartition(sims, -k)[-k:]
+    else:
+        part = np.arange(len(sims))
+    return part[np.argsort(sims[part])[::-1]]
+
+
+class VectorFlusher:
+    """Фоновый поток: раз в interval секунд VECTOR_STORE.flush(); stop() делает последний flush"""
+
+    def __init__(self, store, interval=FLUSH_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='vector-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.store.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.store.flush()
+            except Exception:
+                logger.exception("Vector store flush failed")
+
 
 VECTOR_STORE = NumpyVectorStore()
+_FLUSHER = None
+
+
+def start_vector_flusher():
+    global _FLUSHER
+    if not FLUSH_INTERVAL:
+        return None
+    if _FLUSHER is None:
+        _FLUSHER = VectorFlusher(VECTOR_STORE)
+    _FLUSHER.start()
+    return _FLUSHER
+
+
+def stop_vector_flusher():
+    """Останавливает фоновый flush и сохраняет несохранённые изменения"""
+    global _FLUSHER
+    if _FLUSHER is not None:
+        _FLUSHER.stop()
+        _FLUSHER = None
+    else:
+        VECTOR_STORE.flush()
@@ -0,0 +1 @@
+# benchmarks - замеры производительности слоя БД (запуск: python -m benchmarks.<module>)
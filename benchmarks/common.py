@@ -0,0 +1,77 @@
+# benchmarks/common.py - общие помощники для замеров
+import os
+import random
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from app.db import sqlite_db
+from app.db.snapshots import restore_snapshot
+
+INIT_SQL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db', 'init.sql')
+
+
+@contextmanager
+def use_database(path, init_sql=INIT_SQL):
+    """sqlite_db и его пул на время блока смотрят в path (новая база -> init.sql, иначе миграции)"""
+    old_db = sqlite_db.DB
+    sqlite_db.close_pool()
+    sqlite_db.DB = path
+    try:
+        sqlite_db.ensure_schema(init_sql)
+        yield path
+    finally:
+        sqlite_db.close_pool()
+        sqlite_db.DB = old_db
+
+
+@contextmanager
+def temp_database(init_sql=INIT_SQL):
+    """Временная база из init.sql; sqlite_db и его пул на время блока смотрят в неё"""
+    tmpdir = tempfile.mkdtemp(prefix='tea_bench_')
+    try:
+        with use_database(os.path.join(tmpdir, 'bench.db'), init_sql) as path:
+            yield path
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+@contextmanager
+def snapshot_database(snapshot_path, init_sql=INIT_SQL):
+    """Временная копия снимка (app/db/snapshots.py); сам снимок замеры не меняют"""
+    tmpdir = tempfile.mkdtemp(prefix='tea_bench_')
+    try:
+        path = restore_snapshot(snapshot_path, os.path.join(tmpdir, 'bench.db'))
+        with use_database(path, init_sql) as path:
+            yield path
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def seed_orders(n_orders, max_items=5, seed=42):
+    """Добавляет n_orders заказов по 1..max_items позиций из существующих блюд"""
+    rnd = random.Random(seed)
+    statuses = ['ожидает', 'готовится', 'готов', 'выдан']
+    with sqlite_db.connection() as conn:
+        dishes = [tuple(r) for r in conn.execute("SELECT id, price, name, image_path, category_id FROM dishes")]
+        for i in range(n_orders):
+            cur = conn.execute(
+                "INSERT INTO orders (table_number, total, status, created_at) VALUES (?,?,?,datetime('now', ?))",
+                (str(rnd.randint(1, 30)), 0.0, rnd.choice(statuses), f'-{n_orders - i} minutes'))
+            oid = cur.lastrowid
+            conn.executemany(
+                """INSERT INTO order_items (order_id, dish_id, quantity, unit_price, dish_name, dish_image_path, category_id)
+                   VALUES (?,?,?,?,?,?,?)""",
+                [(oid, d[0], rnd.randint(1, 3), *d[1:]) for d in
+                 (rnd.choice(dishes) for _ in range(rnd.randint(1, max_items)))])
+
+
+def timed(fn, repeat=5):
+    """Лучшее и среднее время вызова fn (мс)"""
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    return {'best_ms': round(min(times), 2), 'mean_ms': round(sum(times) / len(times), 2)}
@@ -0,0 +1,129 @@
+# benchmarks/order_submit.py
+"""
+Пропускная способность оформления заказа.
+
+По умолчанию сравнивает старый create_order (SELECT цены + INSERT на каждую
+позицию) с новым (один IN-запрос цен в задании записи + executemany) на временной базе,
+а новый — с очередью записи (group commit) и без неё. Обе реализации делают
+одну и ту же работу: сначала без обновления витрин аналитики, затем с ним
+(record_order на обеих сторонах) — разница между блоками и есть цена витрин:
+    python -m benchmarks.order_submit --lines 30 --orders 2000 --threads 8
+
+С --url шлёт POST /api/orders на запущенный сервер:
+    python -m benchmarks.order_submit --url http://localhost:8000 --orders 500
+(заказы создаются в рабочей базе этого сервера)
+"""
+import argparse
+import json
+import random
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from app.config import settings
+from app.db import sqlite_db
+from benchmarks.common import temp_database
+
+
+def legacy_create_order(guest_id, table_number, items):
+    """Старая реализация: 2 запроса на каждую позицию (+ витрины, как у новой, если они включены)"""
+    with sqlite_db.connection() as conn:
+        cur = conn.cursor()
+        total = 0.0
+        for it in items:
+            cur.execute("SELECT price FROM dishes WHERE id = ?", (it['dish_id'],))
+            r = cur.fetchone()
+            price = r['price'] if r else 0.0
+            total += price * it['quantity']
+        cur.execute("INSERT INTO orders (guest_id, table_number, total) VALUES (?,?,?)", (guest_id, table_number, total))
+        order_id = cur.lastrowid
+        for it in items:
+            cur.execute("INSERT INTO order_items (order_id, dish_id, quantity) VALUES (?,?,?)", (order_id, it['dish_id'], it['quantity']))
+        sqlite_db.record_order(cur, order_id)
+    return order_id
+
+
+def make_payloads(dish_ids, n, lines, seed=1):
+    rnd = random.Random(seed)
+    return [[{'dish_id': rnd.choice(dish_ids), 'quantity': rnd.randint(1, 3)} for _ in range(lines)] for _ in range(n)]
+
+
+def run(submit, payloads, threads):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        list(ex.map(submit, payloads))
+    elapsed = time.perf_counter() - t0
+    return {'elapsed_s': round(elapsed, 3), 'orders_per_s': round(len(payloads) / elapsed, 1)}
+
+
+@contextmanager
+def writer_enabled(enabled):
+    """Переключает database.writer.enabled: без очереди каждый поток коммитит сам"""
+    cfg = settings['database'].setdefault('writer', {})
+    old = cfg.get('enabled', True)
+    sqlite_db.close_pool()
+    cfg['enabled'] = enabled
+    try:
+        yield
+    finally:
+        sqlite_db.close_pool()
+        cfg['enabled'] = old
+
+
+@contextmanager
+def rollups_enabled(enabled):
+    """Выключает обновление витрин аналитики при оформлении заказа (в обеих реализациях)"""
+    old = sqlite_db.record_order
+    if not enabled:
+        sqlite_db.record_order = lambda cur, order_id: None
+    try:
+        yield
+    finally:
+        sqlite_db.record_order = old
+
+
+def post_order(url):
+    def submit(items):
+        body = json.dumps({'table_number': '1', 'items': items}).encode('utf-8')
+        req = urllib.request.Request(url.rstrip('/') + '/api/orders', data=body,
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            resp.read()
+    return submit
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--orders', type=int, default=2000)
+    ap.add_argument('--lines', type=int, default=30)
+    ap.add_argument('--threads', type=int, default=8)
+    ap.add_argument('--url', default=None)
+    args = ap.parse_args()
+
+    if args.url:
+        with urllib.request.urlopen(args.url.rstrip('/') + '/api/dishes', timeout=30) as resp:
+            dish_ids = [d['id'] for d in json.load(resp)]
+        payloads = make_payloads(dish_ids, args.orders, args.lines)
+        print(f"POST /api/orders lines={args.lines}: {run(post_order(args.url), payloads, args.threads)}")
+        return
+
+    with temp_database():
+        dish_ids = [d['id'] for d in sqlite_db.list_dishes({'is_available': 1})]
+        payloads = make_payloads(dish_ids, args.orders, args.lines)
+        print(f"orders={args.orders} lines={args.lines} threads={args.threads}")
+        legacy = lambda items: legacy_create_order(None, '1', items)
+        submit = lambda items: sqlite_db.create_order(None, '1', items)
+        for rollups in (False, True):
+            print(f"  {'with' if rollups else 'without'} analytics rollups:")
+            with rollups_enabled(rollups):
+                with writer_enabled(False):
+                    print(f"    legacy create_order:  {run(legacy, payloads, args.threads)}")
+                    print(f"    batched, own commits: {run(submit, payloads, args.threads)}")
+                with writer_enabled(True):
+                    print(f"    batched, write queue: {run(submit, payloads, args.threads)}")
+                    print(f"    write queue: {sqlite_db.db_stats()['writer']}")
+
+
+if __name__ == '__main__':
+    main()
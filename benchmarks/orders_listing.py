@@ -0,0 +1,59 @@
+# benchmarks/orders_listing.py
+"""
+list_orders_filtered: запрос позиций на каждый заказ (N+1) против одного
+запроса с json_group_array.
+
+Запуск:
+    python -m benchmarks.orders_listing --orders 10000
+"""
+import argparse
+
+from app.db import sqlite_db
+from benchmarks.common import temp_database, seed_orders, timed
+
+
+def legacy_list_orders_filtered(status=None):
+    """Старая реализация: отдельный SELECT из order_items на каждый заказ"""
+    query = """
+        SELECT o.*, g.phone as guest_phone, g.name as guest_name
+        FROM orders o LEFT JOIN guests g ON o.guest_id = g.id WHERE 1=1
+    """
+    params = []
+    if status:
+        query += " AND o.status = ?"
+        params.append(status)
+    query += " ORDER BY o.created_at DESC"
+    with sqlite_db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        rows = [dict(r) for r in cur.fetchall()]
+        for order in rows:
+            cur.execute("SELECT oi.dish_id, oi.quantity FROM order_items oi WHERE oi.order_id = ?", (order['id'],))
+            order['items'] = [dict(item) for item in cur.fetchall()]
+    return rows
+
+
+def _normalized(rows):
+    # общая проекция: у новых позиций есть ещё снимок блюда (dish_name, unit_price), у старых — нет
+    return [(r['id'], sorted((x['dish_id'], x['quantity']) for x in r['items'])) for r in rows]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--orders', type=int, default=10000)
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args()
+
+    with temp_database():
+        seed_orders(args.orders)
+        assert _normalized(legacy_list_orders_filtered()) == _normalized(sqlite_db.list_orders_filtered())
+        print(f"orders={args.orders}")
+        for status in (None, 'готов'):
+            print(f"  status={status!r}")
+            print(f"    N+1 queries:        {timed(lambda: legacy_list_orders_filtered(status), args.repeat)}")
+            print(f"    json_group_array:   {timed(lambda: sqlite_db.list_orders_filtered(status), args.repeat)}")
+            print(f"    include_items=False:{timed(lambda: sqlite_db.list_orders_filtered(status, include_items=False), args.repeat)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/pool_churn.py
+"""
+Сравнение: новое соединение на каждый запрос (старый get_conn) против пула.
+
+Запуск:
+    python -m benchmarks.pool_churn --threads 16 --requests 2000
+
+Работает на временной копии db/tea_house.db, рабочая база не меняется.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import settings
+from app.db.pool import ConnectionPool
+
+QUERIES = [
+    ("SELECT d.*, c.name as category_name FROM dishes d LEFT JOIN categories c ON d.category_id = c.id WHERE d.is_available = 1", ()),
+    ("SELECT * FROM dishes WHERE id = ?", (1,)),
+    ("SELECT o.*, g.phone as guest_phone FROM orders o LEFT JOIN guests g ON o.guest_id = g.id ORDER BY o.created_at DESC", ()),
+]
+
+
+def run_legacy(path, i):
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL;")
+    q, params = QUERIES[i % len(QUERIES)]
+    conn.execute(q, params).fetchall()
+    conn.close()
+
+
+def make_pooled(pool):
+    def run_pooled(path, i):
+        with pool.connection() as conn:
+            q, params = QUERIES[i % len(QUERIES)]
+            conn.execute(q, params).fetchall()
+    return run_pooled
+
+
+def measure(fn, path, threads, requests):
+    latencies = []
+
+    def one(i):
+        t = time.perf_counter()
+        fn(path, i)
+        latencies.append(time.perf_counter() - t)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        list(ex.map(one, range(requests)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(requests / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 3),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--threads', type=int, default=16)
+    ap.add_argument('--requests', type=int, default=2000)
+    ap.add_argument('--db', default=settings['database']['sqlite_path'])
+    args = ap.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='pool_bench_')
+    path = os.path.join(tmpdir, 'bench.db')
+    shutil.copyfile(args.db, path)
+    try:
+        before = measure(run_legacy, path, args.threads, args.requests)
+        pool = ConnectionPool(path, size=settings['database'].get('pool_size', 8))
+        after = measure(make_pooled(pool), path, args.threads, args.requests)
+        print(f"threads={args.threads} requests={args.requests}")
+        print(f"  before (connect per request): {before}")
+        print(f"  after  (pooled):              {after}")
+        print(f"  pool stats: {pool.stats()}")
+        pool.close_all()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+# benchmarks/suite.py
+"""
+Набор замеров sqlite_db на синтетических данных (benchmarks/synthetic.py).
+
+Каждый сценарий выполняется ops раз при каждом уровне параллельности
+(потоки, как у FastAPI для синхронных роутов); в отчёт JSON попадают
+пропускная способность и перцентили задержки. Отчёты разных версий
+сравниваются командой compare.
+
+    python -m benchmarks.suite run --dishes 10000 --orders 200000 --concurrency 1,8 --out report.json
+    python -m benchmarks.suite run --db /tmp/big.db --scenarios get_dish,create_order
+    python -m benchmarks.suite run --snapshot db/snapshots/snapshot-20260101-000000.db
+    python -m benchmarks.suite compare old.json new.json
+"""
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.db import sqlite_db
+from benchmarks.common import snapshot_database, temp_database, use_database
+from benchmarks.synthetic import generate_menu, generate_orders, dataset_stats
+
+ACTIVE_STATUSES = ['ожидает', 'готовится', 'готов']
+
+
+class Dataset:
+    """id, из которых сценарии выбирают случайные значения"""
+
+    def __init__(self):
+        with sqlite_db.connection() as conn:
+            self.dish_ids = [r[0] for r in conn.execute("SELECT id FROM dishes")]
+            self.available_ids = [r[0] for r in conn.execute("SELECT id FROM dishes WHERE is_available = 1")]
+            self.category_ids = [r[0] for r in conn.execute("SELECT id FROM categories")]
+            self.order_ids = [r[0] for r in conn.execute("SELECT id FROM orders")]
+
+
+def _list_dishes(ds, rnd):
+    filters = {'is_available': 1, 'category_id': rnd.choice(ds.category_ids)}
+    if rnd.random() < 0.5:
+        filters['max_price'] = rnd.choice([10, 20, 40])
+    sqlite_db.list_dishes(filters, with_relations=rnd.random() < 0.5)
+
+
+def _get_dish(ds, rnd):
+    sqlite_db.get_dish(rnd.choice(ds.dish_ids))
+
+
+def _create_order(ds, rnd):
+    items = [{'dish_id': rnd.choice(ds.available_ids), 'quantity': rnd.randint(1, 3)} for _ in range(rnd.randint(1, 6))]
+    sqlite_db.create_order(None, str(rnd.randint(1, 40)), items)
+
+
+def _list_orders_filtered(ds, rnd):
+    sqlite_db.list_orders_filtered(rnd.choice(ACTIVE_STATUSES), include_items=True)
+
+
+def _list_orders_page(ds, rnd):
+    sqlite_db.list_orders_page(rnd.choice([None] + ACTIVE_STATUSES), include_items=True, limit=50)
+
+
+def _get_order_with_items(ds, rnd):
+    sqlite_db.get_order_with_items(rnd.choice(ds.order_ids))
+
+
+def _update_order_status(ds, rnd):
+    sqlite_db.update_order_status(rnd.choice(ds.order_ids), rnd.choice(ACTIVE_STATUSES))
+
+
+# имя -> (функция, ops по умолчанию); чтение раньше записи, чтобы записи не меняли данные для чтения
+SCENARIOS = {
+    'list_dishes': (_list_dishes, 200),
+    'get_dish': (_get_dish, 2000),
+    'list_orders_filtered': (_list_orders_filtered, 50),
+    'list_orders_page': (_list_orders_page, 500),
+    'get_order_with_items': (_get_order_with_items, 2000),
+    'create_order': (_create_order, 1000),
+    'update_order_status': (_update_order_status, 1000),
+}
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def run_scenario(name, ds, ops, concurrency, seed=0):
+    fn = SCENARIOS[name][0]
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(ops))
+
+    def worker(wid):
+        rnd = random.Random(f'{seed}-{name}-{wid}')
+        local = []
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            t = time.perf_counter()
+            try:
+                fn(ds, rnd)
+            except Exception as e:  # ошибки считаем, замер продолжается
+                with lock:
+                    errors.append(repr(e))
+                continue
+            local.append((time.perf_counter() - t) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'scenario': name,
+        'concurrency': concurrency,
+        'ops': ops,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'elapsed_s': round(elapsed, 4),
+        'ops_per_s': round(ops / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            'p50': round(_percentile(latencies, 50), 3),
+            'p90': round(_percentile(latencies, 90), 3),
+            'p99': round(_percentile(latencies, 99), 3),
+            'max': round(latencies[-1], 3) if latencies else 0.0,
+        },
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(args):
+    scenarios = args.scenarios.split(',') if args.scenarios else list(SCENARIOS)
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {unknown}; available: {list(SCENARIOS)}")
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    if args.snapshot:
+        db_context = snapshot_database(args.snapshot)
+    else:
+        db_context = use_database(args.db) if args.db else temp_database()
+    with db_context:
+        generated = None
+        # переиспользуемая база (--db) заполняется только если в ней ещё нет данных такого размера;
+        # копия снимка (--snapshot) берётся как есть
+        if not args.snapshot and (not args.db or dataset_stats()['dishes'] < args.dishes):
+            t = time.perf_counter()
+            generate_menu(args.dishes, seed=args.seed)
+            generate_orders(args.orders, seed=args.seed + 1)
+            generated = round(time.perf_counter() - t, 2)
+        ds = Dataset()
+        report = {
+            'meta': {
+                'revision': _git_revision(),
+                'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+                'params': vars(args),
+            },
+            'dataset': {**dataset_stats(), 'generate_s': generated},
+            'results': [],
+        }
+        for name in scenarios:
+            ops = args.ops or SCENARIOS[name][1]
+            for level in levels:
+                res = run_scenario(name, ds, ops, level, seed=args.seed)
+                report['results'].append(res)
+                lat = res['latency_ms']
+                print(f"{name:24s} x{level:<3d} {res['ops_per_s']:>10} ops/s  p50 {lat['p50']:>8} ms  "
+                      f"p99 {lat['p99']:>8} ms  errors {res['errors']}", file=sys.stderr)
+        report['writer'] = sqlite_db.db_stats()['writer']
+
+    out = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(out)
+    else:
+        print(out)
+    return report
+
+
+def compare(old_path, new_path):
+    """Таблица изменений ops/s и p50/p99 между двумя отчётами"""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    old_by_key = {(r['scenario'], r['concurrency']): r for r in old['results']}
+
+    def delta(a, b):
+        return f"{(b - a) / a * 100:+.1f}%" if a else 'n/a'
+
+    print(f"{old['meta'].get('revision')} -> {new['meta'].get('revision')}")
+    print(f"{'scenario':24s} {'conc':>4s} {'ops/s':>18s} {'p50 ms':>18s} {'p99 ms':>18s}")
+    for r in new['results']:
+        o = old_by_key.get((r['scenario'], r['concurrency']))
+        if not o:
+            print(f"{r['scenario']:24s} {r['concurrency']:>4d}   (нет в старом отчёте)")
+            continue
+        print(f"{r['scenario']:24s} {r['concurrency']:>4d} "
+              f"{delta(o['ops_per_s'], r['ops_per_s']):>18s} "
+              f"{delta(o['latency_ms']['p50'], r['latency_ms']['p50']):>18s} "
+              f"{delta(o['latency_ms']['p99'], r['latency_ms']['p99']):>18s}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest='command', required=True)
+    run_p = sub.add_parser('run')
+    run_p.add_argument('--db', default=None, help='файл базы для переиспользования данных (по умолчанию — временная)')
+    run_p.add_argument('--snapshot', default=None, help='снимок базы: замеры идут на его временной копии')
+    run_p.add_argument('--dishes', type=int, default=1000)
+    run_p.add_argument('--orders', type=int, default=20000)
+    run_p.add_argument('--concurrency', default='1,8')
+    run_p.add_argument('--ops', type=int, default=None, help='ops на сценарий (по умолчанию — своё у каждого)')
+    run_p.add_argument('--scenarios', default=None, help='через запятую: ' + ','.join(SCENARIOS))
+    run_p.add_argument('--seed', type=int, default=1)
+    run_p.add_argument('--out', default=None)
+    cmp_p = sub.add_parser('compare')
+    cmp_p.add_argument('old')
+    cmp_p.add_argument('new')
+    args = ap.parse_args()
+    if args.command == 'run':
+        run_suite(args)
+    else:
+        compare(args.old, args.new)
+
+
+if __name__ == '__main__':
+    main()
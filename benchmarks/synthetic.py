@@ -0,0 +1,153 @@
+# benchmarks/synthetic.py
+"""
+Генератор синтетических данных для замеров: меню (1k–100k блюд с тегами и
+ингредиентами) и история заказов (до миллионов позиций).
+
+Пишет напрямую большими executemany в текущую базу sqlite_db (обычно
+временную, см. benchmarks.common.temp_database / use_database), агрегаты
+продаж затем пересобираются одним проходом. Данные детерминированы seed.
+
+    python -m benchmarks.synthetic --db /tmp/big.db --dishes 10000 --orders 200000
+"""
+import argparse
+import itertools
+import random
+import time
+
+from app.db import sqlite_db
+from benchmarks.common import use_database
+
+BASES = ['Плов', 'Лагман', 'Шурпа', 'Манты', 'Самса', 'Шашлык', 'Мастава', 'Нарын', 'Димлама', 'Чучвара',
+         'Хоним', 'Казан-кабоб', 'Салат', 'Суп', 'Лепёшка', 'Чай', 'Компот', 'Халва', 'Чак-чак', 'Пахлава']
+MODIFIERS = ['классический', 'по-фергански', 'по-самаркандски', 'домашний', 'с бараниной', 'с говядиной',
+             'с курицей', 'с тыквой', 'с нутом', 'овощной', 'острый', 'праздничный', 'с зеленью', 'постный']
+INGREDIENT_NAMES = ['Рис', 'Морковь', 'Лук', 'Баранина', 'Говядина', 'Курица', 'Нут', 'Тыква', 'Чеснок',
+                    'Зира', 'Барбарис', 'Изюм', 'Перец', 'Помидор', 'Огурец', 'Зелень', 'Лапша', 'Картофель',
+                    'Мука', 'Курдюк', 'Кинза', 'Укроп', 'Редька', 'Фасоль', 'Маш', 'Кунжут', 'Мёд', 'Орехи']
+TAG_NAMES = ['острое', 'веганское', 'хит', 'новинка', 'сытное', 'лёгкое', 'детское', 'постное', 'горячее',
+             'холодное', 'на компанию', 'фирменное']
+STATUSES = ['ожидает', 'готовится', 'готов', 'выдан']
+
+
+def _ts(seconds_ago):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - seconds_ago))
+
+
+def generate_menu(n_dishes, n_ingredients=None, n_tags=None, tags_per_dish=(0, 3),
+                  ingredients_per_dish=(2, 8), seed=1):
+    """Добавляет n_dishes блюд; возвращает список id новых блюд"""
+    rnd = random.Random(seed)
+    n_ingredients = n_ingredients or max(len(INGREDIENT_NAMES), n_dishes // 5)
+    n_tags = n_tags or max(len(TAG_NAMES), n_dishes // 200)
+
+    with sqlite_db.connection() as conn:
+        category_ids = [r[0] for r in conn.execute("SELECT id FROM categories")]
+        meal_ids = [r[0] for r in conn.execute("SELECT id FROM meal_times")] or [None]
+
+        first = conn.execute("SELECT IFNULL(MAX(id), 0) FROM ingredients").fetchone()[0] + 1
+        conn.executemany("INSERT INTO ingredients (id, name) VALUES (?, ?)", [
+            (first + i, INGREDIENT_NAMES[i] if i < len(INGREDIENT_NAMES) else f'{rnd.choice(INGREDIENT_NAMES)} {i}')
+            for i in range(n_ingredients)])
+        ingredient_ids = list(range(first, first + n_ingredients))
+
+        first = conn.execute("SELECT IFNULL(MAX(id), 0) FROM tags").fetchone()[0] + 1
+        conn.executemany("INSERT INTO tags (id, name, tag_type) VALUES (?, ?, 'synthetic')", [
+            (first + i, TAG_NAMES[i] if i < len(TAG_NAMES) else f'{rnd.choice(TAG_NAMES)} {i}')
+            for i in range(n_tags)])
+        tag_ids = list(range(first, first + n_tags))
+
+        first = conn.execute("SELECT IFNULL(MAX(id), 0) FROM dishes").fetchone()[0] + 1
+        dish_ids = list(range(first, first + n_dishes))
+        dishes, dish_tags, dish_ingredients = [], [], []
+        for did in dish_ids:
+            name = f'{rnd.choice(BASES)} {rnd.choice(MODIFIERS)} №{did}'
+            dishes.append((did, name, f'{name}: синтетическое блюдо', round(rnd.lognormvariate(3.0, 0.6), 2),
+                           rnd.choice(category_ids), rnd.choice(meal_ids), rnd.randint(0, 3),
+                           1 if rnd.random() < 0.2 else 0, rnd.randint(5, 90), 1 if rnd.random() < 0.9 else 0))
+            for tid in rnd.sample(tag_ids, rnd.randint(*tags_per_dish)):
+                dish_tags.append((did, tid))
+            for k, iid in enumerate(rnd.sample(ingredient_ids, rnd.randint(*ingredients_per_dish))):
+                dish_ingredients.append((did, iid, f'{rnd.randint(10, 500)} г', 1 if k == 0 else 0))
+        conn.executemany("""INSERT INTO dishes (id, name, description, price, category_id, meal_time_id, spice_level,
+                            is_vegan, cooking_time, is_available) VALUES (?,?,?,?,?,?,?,?,?,?)""", dishes)
+        conn.executemany("INSERT INTO dish_tags (dish_id, tag_id) VALUES (?, ?)", dish_tags)
+        conn.executemany("INSERT INTO dish_ingredients (dish_id, ingredient_id, quantity, is_primary) VALUES (?,?,?,?)",
+                         dish_ingredients)
+    sqlite_db._menu_changed()
+    return dish_ids
+
+
+def generate_orders(n_orders, items_per_order=(1, 6), days=90, n_guests=None, guest_share=0.6,
+                    batch=20000, seed=2):
+    """Добавляет n_orders заказов за последние days дней; популярность блюд ~ Zipf.
+
+    Старые заказы в основном выданы, свежие — в работе. Возвращает число позиций.
+    """
+    rnd = random.Random(seed)
+    with sqlite_db.connection() as conn:
+        dishes = {r[0]: tuple(r[1:]) for r in conn.execute(
+            "SELECT id, price, name, image_path, category_id FROM dishes WHERE is_available = 1")}
+    dish_ids = list(dishes)
+    rnd.shuffle(dish_ids)
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(dish_ids))))
+    n_guests = n_guests or max(10, n_orders // 20)
+
+    with sqlite_db.connection() as conn:
+        first_guest = conn.execute("SELECT IFNULL(MAX(id), 0) FROM guests").fetchone()[0] + 1
+        conn.executemany("INSERT INTO guests (id, phone, name) VALUES (?, ?, ?)",
+                         [(first_guest + i, f'+7999{first_guest + i:07d}', f'Гость {i}') for i in range(n_guests)])
+        next_order = conn.execute("SELECT IFNULL(MAX(id), 0) FROM orders_all").fetchone()[0] + 1
+
+    span = days * 86400
+    total_items = 0
+    done = 0
+    while done < n_orders:
+        chunk = min(batch, n_orders - done)
+        orders, items = [], []
+        for k in range(chunk):
+            oid = next_order + done + k
+            ago = span * (1 - (done + k) / n_orders)  # по возрастанию времени
+            lines = [(did, rnd.randint(1, 3))
+                     for did in rnd.choices(dish_ids, cum_weights=cum_weights, k=rnd.randint(*items_per_order))]
+            total = sum(dishes[did][0] * qty for did, qty in lines)
+            status = 'выдан' if ago > 3 * 3600 else rnd.choice(STATUSES)
+            guest = first_guest + rnd.randrange(n_guests) if rnd.random() < guest_share else None
+            created = _ts(ago)
+            orders.append((oid, guest, str(rnd.randint(1, 40)), round(total, 2), status, created,
+                           _ts(max(ago - rnd.randint(600, 3600), 0)) if status == 'выдан' else None))
+            items.extend((oid, did, qty, created, *dishes[did]) for did, qty in lines)
+        with sqlite_db.connection() as conn:
+            conn.executemany("""INSERT INTO orders (id, guest_id, table_number, total, status, created_at, completed_at)
+                                VALUES (?,?,?,?,?,?,?)""", orders)
+            conn.executemany("""INSERT INTO order_items (order_id, dish_id, quantity, created_at, unit_price, dish_name,
+                                dish_image_path, category_id) VALUES (?,?,?,?,?,?,?,?)""", items)
+        done += chunk
+        total_items += len(items)
+    sqlite_db.rebuild_sales_rollups()
+    return total_items
+
+
+def dataset_stats():
+    with sqlite_db.connection() as conn:
+        return {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                for t in ('dishes', 'dish_tags', 'dish_ingredients', 'ingredients', 'tags',
+                          'guests', 'orders', 'order_items', 'orders_archive')}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--db', required=True, help='файл базы (создаётся из db/init.sql, если пустой)')
+    ap.add_argument('--dishes', type=int, default=1000)
+    ap.add_argument('--orders', type=int, default=10000)
+    ap.add_argument('--days', type=int, default=90)
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args()
+    with use_database(args.db):
+        t = time.perf_counter()
+        generate_menu(args.dishes, seed=args.seed)
+        items = generate_orders(args.orders, days=args.days, seed=args.seed + 1)
+        print(f"generated in {time.perf_counter() - t:.1f}s, order_items +{items}: {dataset_stats()}")
+
+
+if __name__ == '__main__':
+    main()
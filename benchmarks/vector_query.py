@@ -0,0 +1,136 @@
+# benchmarks/vector_query.py
+"""
+Задержка и выделения памяти на один запрос к векторному индексу.
+
+Сравнение: прежний NumpyVectorStore.query (до предварительной нормировки:
+ненормированные строки в буфере, нормы всей матрицы и полный argsort на
+каждый запрос; код перенесён без изменений) против текущего (строки
+нормированы заранее, argpartition + сортировка top_k). Обе стороны
+возвращают одинаковые результаты: id, score и метаданные.
+
+Запуск:
+    python -m benchmarks.vector_query --sizes 1000,10000,100000 --queries 200
+
+Индекс пишется во временный каталог, data/vector_store не меняется.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.vector import vector_store
+
+
+class LegacyStore:
+    """Состояние прежнего NumpyVectorStore: ненормированные строки в буфере с удвоением ёмкости"""
+
+    def __init__(self, X, metadata):
+        cap = 16
+        while cap < len(X):
+            cap *= 2
+        self._lock = threading.RLock()
+        self._buf = np.zeros((cap, X.shape[1]), dtype='float32')
+        self._buf[:len(X)] = X
+        self._n = len(X)
+        self._row_ids = [str(i) for i in range(len(X))] + [None] * (cap - len(X))
+        self._alive = np.zeros(cap, dtype=bool)
+        self._alive[:len(X)] = True
+        self._index = {str(i): i for i in range(len(X))}
+        self._meta = {str(i): metadata[i] for i in range(len(X))}
+        self._dead = 0
+
+    def query(self, emb, top_k=10):
+        # без изменений из прежней реализации
+        with self._lock:
+            if not self._index:
+                return []
+            A = self._buf[:self._n]
+            row_ids = self._row_ids[:self._n]
+            emb = np.asarray(emb, dtype='float32').reshape(-1)
+            if emb.shape[0] != A.shape[1]:
+                emb = np.pad(emb, (0, max(0, A.shape[1] - emb.shape[0])), 'constant')[:A.shape[1]]
+            # normalize
+            n = np.linalg.norm(A, axis=1, keepdims=True)
+            n[n==0]=1
+            v = emb / (np.linalg.norm(emb)+1e-10)
+            sims = (A @ v) / n.reshape(-1)
+            if self._dead:
+                sims[~self._alive[:self._n]] = -np.inf
+            idxs = sims.argsort()[::-1][:min(top_k, len(self._index))]
+            res = []
+            for i in idxs:
+                res.append({'id': int(row_ids[i]), 'score': float(sims[i]), 'metadata': self._meta.get(row_ids[i], {})})
+            return res
+
+
+def build_store(size, dim, seed):
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((size, dim)).astype('float32')
+    # индекс пишется во временный каталог, затем новый экземпляр отображает его в память — как рабочий процесс
+    vector_store.NumpyVectorStore().upsert_many((i, X[i], {'id': i}) for i in range(size))
+    t = time.perf_counter()
+    store = vector_store.NumpyVectorStore()
+    load_ms = round((time.perf_counter() - t) * 1000, 1)
+    return store, X, load_ms
+
+
+def measure(fn, queries):
+    latencies = []
+    for q in queries:
+        t = time.perf_counter()
+        fn(q)
+        latencies.append(time.perf_counter() - t)
+    latencies.sort()
+    tracemalloc.start()
+    fn(queries[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 3),
+        'p99_ms': round(latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000, 3),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--sizes', default='1000,10000,100000')
+    ap.add_argument('--dim', type=int, default=384)
+    ap.add_argument('--queries', type=int, default=200)
+    ap.add_argument('--top-k', type=int, default=20)
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='vector_bench_')
+    old_persist = vector_store.PERSIST
+    vector_store.PERSIST = tmpdir
+    try:
+        for size in (int(s) for s in args.sizes.split(',')):
+            for name in os.listdir(tmpdir):
+                os.remove(os.path.join(tmpdir, name))
+            store, X, load_ms = build_store(size, args.dim, args.seed)
+            rng = np.random.default_rng(args.seed + 1)
+            queries = list(rng.standard_normal((args.queries, args.dim)).astype('float32'))
+            legacy = LegacyStore(X, [{'id': i} for i in range(size)])
+            before = measure(lambda q: legacy.query(q, args.top_k), queries)
+            after = measure(lambda q: store.query(q, args.top_k), queries)
+            same = all(
+                [(r['id'], r['metadata']) for r in store.query(q, args.top_k)]
+                == [(r['id'], r['metadata']) for r in legacy.query(q, args.top_k)]
+                for q in queries[:10])
+            print(f"dishes={size} dim={args.dim} top_k={args.top_k}")
+            print(f"  before (norms + argsort per query): {before}")
+            print(f"  after  (pre-normalized + argpartition): {after}")
+            print(f"  same top_k: {same}; load {load_ms} ms, mmap: {store.mapped}")
+    finally:
+        vector_store.PERSIST = old_persist
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,10 @@
 -- db/init.sql (перевённый под нормализованную структуру)
 PRAGMA foreign_keys = ON;
 
--- DROP (безопасно при разработке)
-DROP TABLE IF EXISTS order_items;
-DROP TABLE IF EXISTS orders;
-DROP TABLE IF EXISTS guests;
-DROP TABLE IF EXISTS dish_ingredients;
-DROP TABLE IF EXISTS dish_tags;
-DROP TABLE IF EXISTS ingredients;
-DROP TABLE IF EXISTS dishes;
-DROP TABLE IF EXISTS tags;
-DROP TABLE IF EXISTS categories;
-DROP TABLE IF EXISTS meal_times;
-DROP TABLE IF EXISTS available_ingredients;
-DROP TABLE IF EXISTS ingredients_hierarchy;
-DROP TABLE IF EXISTS cache_entries;
+-- Скрипт не деструктивный: таблицы создаются только если их нет, начальные
+-- данные вставляются через INSERT OR IGNORE (для связей это опирается на
+-- уникальные индексы из db/migrations/0001_hot_path_indexes.sql).
+-- Индексы и дальнейшие изменения схемы — только через db/migrations/.
 
 CREATE TABLE IF NOT EXISTS categories (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -341,5 +331,5 @@ INSERT OR IGNORE INTO orders (id, guest_id, table_number, total, status) VALUES
 (1,1,'5',1050,'completed'),
 (2,2,'2',520,'pending');
 
-INSERT OR IGNORE INTO order_items (order_id, dish_id, quantity) VALUES
-(1,1,2),(1,6,1),(2,3,1),(2,5,1);
\ No newline at end of file
+INSERT OR IGNORE INTO order_items (id, order_id, dish_id, quantity) VALUES
+(1,1,1,2),(2,1,6,1),(3,2,3,1),(4,2,5,1);
\ No newline at end of file
@@ -0,0 +1,28 @@
+-- 0001: индексы под запросы app/db/sqlite_db.py
+
+-- дубликаты связей (копились от повторных init_db и старого update_dish)
+DELETE FROM dish_tags
+WHERE id NOT IN (SELECT MIN(id) FROM dish_tags GROUP BY dish_id, tag_id);
+DELETE FROM dish_ingredients
+WHERE id NOT IN (SELECT MIN(id) FROM dish_ingredients GROUP BY dish_id, ingredient_id);
+
+-- tags / ingredients блюда (_attach_relations, _save_dish_relations)
+CREATE UNIQUE INDEX IF NOT EXISTS ux_dish_tags_dish_tag ON dish_tags(dish_id, tag_id);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_dish_ingredients_dish_ingredient ON dish_ingredients(dish_id, ingredient_id);
+
+-- позиции заказа (list_orders_filtered, get_order_with_items, delete_order_if_completed)
+CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id);
+-- ON DELETE SET NULL при удалении блюда
+CREATE INDEX IF NOT EXISTS idx_order_items_dish ON order_items(dish_id);
+
+-- список заказов: фильтр по статусу + сортировка по времени, и просто по времени
+CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at);
+
+-- list_dishes: is_available всегда в фильтре, дальше категория / цена
+CREATE INDEX IF NOT EXISTS idx_dishes_available_category_price ON dishes(is_available, category_id, price);
+
+-- resolve_ingredient_ids (поиск по названию)
+CREATE INDEX IF NOT EXISTS idx_ingredients_name ON ingredients(name);
+
+-- guests(phone) уже покрыт UNIQUE-ограничением
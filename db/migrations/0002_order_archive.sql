@@ -0,0 +1,41 @@
+-- 0002: архив выданных заказов (app/db/archive.py)
+
+-- время выдачи; по нему архиватор решает, что заказ "остыл"
+ALTER TABLE orders ADD COLUMN completed_at TEXT;
+UPDATE orders SET completed_at = created_at WHERE status = 'выдан' AND completed_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_orders_status_completed ON orders(status, completed_at);
+
+-- та же структура без внешних ключей: архив только дописывается
+CREATE TABLE IF NOT EXISTS orders_archive (
+    id INTEGER PRIMARY KEY,
+    guest_id INTEGER,
+    table_number TEXT,
+    total REAL,
+    status TEXT,
+    created_at TEXT,
+    completed_at TEXT,
+    archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS order_items_archive (
+    id INTEGER PRIMARY KEY,
+    order_id INTEGER,
+    dish_id INTEGER,
+    quantity INTEGER,
+    created_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_orders_archive_status_created ON orders_archive(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_archive_created ON orders_archive(created_at);
+CREATE INDEX IF NOT EXISTS idx_order_items_archive_order ON order_items_archive(order_id);
+
+-- история = горячие + архив (id не пересекаются: orders AUTOINCREMENT)
+CREATE VIEW IF NOT EXISTS orders_all AS
+    SELECT id, guest_id, table_number, total, status, created_at, completed_at FROM orders
+    UNION ALL
+    SELECT id, guest_id, table_number, total, status, created_at, completed_at FROM orders_archive;
+
+CREATE VIEW IF NOT EXISTS order_items_all AS
+    SELECT id, order_id, dish_id, quantity, created_at FROM order_items
+    UNION ALL
+    SELECT id, order_id, dish_id, quantity, created_at FROM order_items_archive;
@@ -0,0 +1,34 @@
+-- 0003: агрегаты продаж (app/db/analytics.py); заполняются по истории в sqlite_db.migrate()
+
+CREATE TABLE IF NOT EXISTS sales_hourly (
+    hour TEXT PRIMARY KEY,              -- 'YYYY-MM-DD HH:00', UTC
+    orders INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sales_dish_daily (
+    day TEXT NOT NULL,
+    dish_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, dish_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sales_category_daily (
+    day TEXT NOT NULL,
+    category_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, category_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS guest_stats (
+    guest_id INTEGER PRIMARY KEY,
+    orders INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    first_order_at TEXT,
+    last_order_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_guest_stats_last_order ON guest_stats(last_order_at);
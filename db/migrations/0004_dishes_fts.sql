@@ -0,0 +1,87 @@
+-- 0004: полнотекстовый индекс блюд (FTS5, ранжирование bm25) для лексического поиска
+-- rowid = dishes.id; ingredients / tags — названия через пробел
+
+CREATE VIRTUAL TABLE IF NOT EXISTS dishes_fts USING fts5(
+    name, description, ingredients, tags,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+INSERT INTO dishes_fts (rowid, name, description, ingredients, tags)
+SELECT d.id, d.name, IFNULL(d.description, ''),
+       IFNULL((SELECT group_concat(i.name, ' ') FROM dish_ingredients di JOIN ingredients i ON i.id = di.ingredient_id
+               WHERE di.dish_id = d.id), ''),
+       IFNULL((SELECT group_concat(t.name, ' ') FROM dish_tags dt JOIN tags t ON t.id = dt.tag_id
+               WHERE dt.dish_id = d.id), '')
+FROM dishes d;
+
+-- для триггеров переименования ниже (и ON DELETE CASCADE тегов / ингредиентов)
+CREATE INDEX IF NOT EXISTS idx_dish_tags_tag ON dish_tags(tag_id);
+CREATE INDEX IF NOT EXISTS idx_dish_ingredients_ingredient ON dish_ingredients(ingredient_id);
+
+-- dishes
+CREATE TRIGGER IF NOT EXISTS dishes_fts_ai AFTER INSERT ON dishes BEGIN
+    INSERT INTO dishes_fts (rowid, name, description, ingredients, tags)
+    VALUES (new.id, new.name, IFNULL(new.description, ''), '', '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS dishes_fts_au AFTER UPDATE OF name, description ON dishes BEGIN
+    UPDATE dishes_fts SET name = new.name, description = IFNULL(new.description, '') WHERE rowid = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS dishes_fts_ad AFTER DELETE ON dishes BEGIN
+    DELETE FROM dishes_fts WHERE rowid = old.id;
+END;
+
+-- состав блюда
+CREATE TRIGGER IF NOT EXISTS dish_ingredients_fts_ai AFTER INSERT ON dish_ingredients BEGIN
+    UPDATE dishes_fts SET ingredients = IFNULL((
+        SELECT group_concat(i.name, ' ') FROM dish_ingredients di JOIN ingredients i ON i.id = di.ingredient_id
+        WHERE di.dish_id = new.dish_id), '') WHERE rowid = new.dish_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS dish_ingredients_fts_ad AFTER DELETE ON dish_ingredients BEGIN
+    UPDATE dishes_fts SET ingredients = IFNULL((
+        SELECT group_concat(i.name, ' ') FROM dish_ingredients di JOIN ingredients i ON i.id = di.ingredient_id
+        WHERE di.dish_id = old.dish_id), '') WHERE rowid = old.dish_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS dish_ingredients_fts_au AFTER UPDATE OF dish_id, ingredient_id ON dish_ingredients BEGIN
+    UPDATE dishes_fts SET ingredients = IFNULL((
+        SELECT group_concat(i.name, ' ') FROM dish_ingredients di JOIN ingredients i ON i.id = di.ingredient_id
+        WHERE di.dish_id = dishes_fts.rowid), '') WHERE rowid IN (old.dish_id, new.dish_id);
+END;
+
+-- теги блюда
+CREATE TRIGGER IF NOT EXISTS dish_tags_fts_ai AFTER INSERT ON dish_tags BEGIN
+    UPDATE dishes_fts SET tags = IFNULL((
+        SELECT group_concat(t.name, ' ') FROM dish_tags dt JOIN tags t ON t.id = dt.tag_id
+        WHERE dt.dish_id = new.dish_id), '') WHERE rowid = new.dish_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS dish_tags_fts_ad AFTER DELETE ON dish_tags BEGIN
+    UPDATE dishes_fts SET tags = IFNULL((
+        SELECT group_concat(t.name, ' ') FROM dish_tags dt JOIN tags t ON t.id = dt.tag_id
+        WHERE dt.dish_id = old.dish_id), '') WHERE rowid = old.dish_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS dish_tags_fts_au AFTER UPDATE OF dish_id, tag_id ON dish_tags BEGIN
+    UPDATE dishes_fts SET tags = IFNULL((
+        SELECT group_concat(t.name, ' ') FROM dish_tags dt JOIN tags t ON t.id = dt.tag_id
+        WHERE dt.dish_id = dishes_fts.rowid), '') WHERE rowid IN (old.dish_id, new.dish_id);
+END;
+
+-- переименование ингредиента / тега
+CREATE TRIGGER IF NOT EXISTS ingredients_fts_au AFTER UPDATE OF name ON ingredients BEGIN
+    UPDATE dishes_fts SET ingredients = IFNULL((
+        SELECT group_concat(i.name, ' ') FROM dish_ingredients di JOIN ingredients i ON i.id = di.ingredient_id
+        WHERE di.dish_id = dishes_fts.rowid), '')
+    WHERE rowid IN (SELECT dish_id FROM dish_ingredients WHERE ingredient_id = new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS tags_fts_au AFTER UPDATE OF name ON tags BEGIN
+    UPDATE dishes_fts SET tags = IFNULL((
+        SELECT group_concat(t.name, ' ') FROM dish_tags dt JOIN tags t ON t.id = dt.tag_id
+        WHERE dt.dish_id = dishes_fts.rowid), '')
+    WHERE rowid IN (SELECT dish_id FROM dish_tags WHERE tag_id = new.id);
+END;
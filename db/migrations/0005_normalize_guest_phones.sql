@@ -0,0 +1,16 @@
+-- 0005: телефоны гостей в нормализованном виде (как sqlite_db.normalize_phone):
+-- без пробелов, скобок, дефисов и точек; 8XXXXXXXXXX и XXXXXXXXXX -> +7XXXXXXXXXX, иначе +цифры.
+-- Номера с посторонними символами и номера, нормализованный вид которых уже занят другим гостем
+-- (OR IGNORE), остаются как есть.
+
+UPDATE OR IGNORE guests SET phone = (
+    SELECT CASE
+        WHEN d = '' OR d GLOB '*[^0-9]*' THEN guests.phone
+        WHEN length(d) = 11 AND substr(d, 1, 1) = '8' THEN '+7' || substr(d, 2)
+        WHEN length(d) = 10 THEN '+7' || d
+        ELSE '+' || d
+    END
+    FROM (SELECT replace(replace(replace(replace(replace(replace(guests.phone,
+                 ' ', ''), '-', ''), '(', ''), ')', ''), '.', ''), '+', '') AS d)
+)
+WHERE phone IS NOT NULL;
@@ -0,0 +1,30 @@
+-- 0006: снимок блюда в позиции заказа на момент заказа (цена, название, картинка, категория).
+-- Карточка заказа, доска кухни и агрегаты продаж читают только order_items —
+-- без JOIN с dishes, и история не меняется при смене цены или удалении блюда.
+
+ALTER TABLE order_items ADD COLUMN unit_price REAL;
+ALTER TABLE order_items ADD COLUMN dish_name TEXT;
+ALTER TABLE order_items ADD COLUMN dish_image_path TEXT;
+ALTER TABLE order_items ADD COLUMN category_id INTEGER;
+
+ALTER TABLE order_items_archive ADD COLUMN unit_price REAL;
+ALTER TABLE order_items_archive ADD COLUMN dish_name TEXT;
+ALTER TABLE order_items_archive ADD COLUMN dish_image_path TEXT;
+ALTER TABLE order_items_archive ADD COLUMN category_id INTEGER;
+
+-- старые позиции: лучшее, что есть, — текущие данные блюда (у удалённых блюд остаётся NULL)
+UPDATE order_items SET unit_price = d.price, dish_name = d.name, dish_image_path = d.image_path,
+                       category_id = d.category_id
+FROM dishes d WHERE d.id = order_items.dish_id;
+
+UPDATE order_items_archive SET unit_price = d.price, dish_name = d.name, dish_image_path = d.image_path,
+                               category_id = d.category_id
+FROM dishes d WHERE d.id = order_items_archive.dish_id;
+
+DROP VIEW IF EXISTS order_items_all;
+CREATE VIEW order_items_all AS
+    SELECT id, order_id, dish_id, quantity, created_at, unit_price, dish_name, dish_image_path, category_id
+    FROM order_items
+    UNION ALL
+    SELECT id, order_id, dish_id, quantity, created_at, unit_price, dish_name, dish_image_path, category_id
+    FROM order_items_archive;
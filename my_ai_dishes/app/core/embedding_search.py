@@ -7,6 +7,8 @@ from typing import List, Dict, Any
 from ..models.schemas import DishWithScore, SearchTask
 from .embeddings import EmbeddingService
 from .vector_store import VectorStore
+from .lexical_index import LexicalIndex
+from .scoring import compute_relevance
 
 
 class EmbeddingSearch:
@@ -15,6 +17,7 @@ class EmbeddingSearch:
     def __init__(self):
         self.embedding_service = EmbeddingService(use_lm_studio=False)
         self.vector_store = VectorStore()
+        self.lexical_index = LexicalIndex()
         
         # Загружаем векторную базу
         if not self.vector_store.load():
@@ -41,10 +44,21 @@ class EmbeddingSearch:
         # Ищем в векторной базе
         vector_results = self.vector_store.search(query_embedding, top_k=top_k)
         
+        # Лексические оценки (FTS5 bm25); точные совпадения по названию/ингредиентам,
+        # не попавшие в векторный top-K, добавляем с их векторной оценкой
+        lexical = self.lexical_index.scores(task.search_query, limit=top_k)
+        found_ids = {str(r["dish"].get("id")) for r in vector_results}
+        vector_results += self.vector_store.scores_for(
+            query_embedding, [i for i in lexical if i not in found_ids])
+        
         # Конвертируем в DishWithScore
         dishes_with_scores = []
         for result in vector_results:
             dish_data = result["dish"]
+            # косинус в [0, 1]: compute_relevance пропускает через сигмоиду всё вне [0, 1],
+            # и отрицательные (или чуть больше 1 из-за округления) обогнали бы малые положительные
+            vector_score = min(max(float(result.get("vector_score", 0)), 0.0), 1.0)
+            lexical_score = lexical.get(str(dish_data.get("id")), 0.0)
             
             # Создаем DishWithScore напрямую из данных meta.json
             # DishWithScore сам позаботится о конвертации spice_level и is_vegan
@@ -63,15 +77,17 @@ class EmbeddingSearch:
                 ingredients=dish_data.get("ingredients", []),
                 tags=dish_data.get("tags", []),
                 
-                # Счета релевантности
-                relevance_score=float(result.get("vector_score", 0)),
-                vector_score=float(result.get("vector_score", 0)),
-                lexical_score=0.0
+                # Счета релевантности (relevance_score — по весам scoring.compute_relevance)
+                vector_score=vector_score,
+                lexical_score=lexical_score
             )
+            compute_relevance(dish)
             
             dishes_with_scores.append(dish)
         
-        print(f"[Search] Найдено: {len(dishes_with_scores)} блюд")
+        dishes_with_scores.sort(key=lambda d: d.relevance_score, reverse=True)
+        
+        print(f"[Search] Найдено: {len(dishes_with_scores)} блюд (лексических совпадений: {len(lexical)})")
         if dishes_with_scores:
             print(f"[Search] Лучшее: {dishes_with_scores[0].name} ({dishes_with_scores[0].relevance_score:.3f})")
             print(f"[Search] Категория: {dishes_with_scores[0].category}, Цена: {dishes_with_scores[0].price}")
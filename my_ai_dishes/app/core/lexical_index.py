@@ -0,0 +1,76 @@
+"""
+Лексический поиск блюд по FTS5-индексу основной базы (таблица dishes_fts)
+
+Индекс строится и поддерживается триггерами в основном приложении
+(db/migrations/0004_dishes_fts.sql); здесь только чтение. Веса колонок,
+разбор запроса и сам запрос берутся из app/db/fts.py основного приложения
+(загружается по пути к файлу: пакет app здесь свой). Если базы или индекса
+нет — пустой результат, поиск работает только по эмбеддингам.
+"""
+import importlib.util
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict
+from ..config import SQLITE_DB_PATH, PROJECT_MAIN_DIR
+
+
+def _load_fts():
+    path = PROJECT_MAIN_DIR / "app" / "db" / "fts.py"
+    spec = importlib.util.spec_from_file_location("tea_house_fts", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+fts = _load_fts()
+
+
+def _missing_index(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return "no such table" in message or "no such module" in message
+
+
+class LexicalIndex:
+    """bm25-оценки блюд по тексту запроса: {dish_id (str): score 0..1}"""
+
+    def __init__(self, db_path: Path = SQLITE_DB_PATH):
+        self.db_path = Path(db_path)
+        self._conn = None
+        self._lock = threading.Lock()
+        self.available = True
+
+    def _connection(self):
+        if self._conn is None:
+            if not self.db_path.exists():
+                print(f"[LexicalIndex] База не найдена: {self.db_path}")
+                self.available = False
+                return None
+            self._conn = sqlite3.connect(f"file:{self.db_path.as_posix()}?mode=ro", uri=True,
+                                         check_same_thread=False)
+        return self._conn
+
+    def scores(self, text: str, limit: int = 50) -> Dict[str, float]:
+        """Лучшие совпадения по индексу; score нормирован на лучшее совпадение"""
+        match = fts.fts_query(text)
+        if not self.available or match is None:
+            return {}
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return {}
+            try:
+                rows = conn.execute(fts.search_sql(), (*fts.FTS_WEIGHTS, match, int(limit))).fetchall()
+            except sqlite3.OperationalError as e:
+                if _missing_index(e):
+                    # старая база без миграции 0004 (или SQLite без FTS5) — отключаем насовсем
+                    print(f"[LexicalIndex] Индекс недоступен: {e}")
+                    self.available = False
+                else:
+                    # временная ошибка (database is locked и т.п.) — только этот запрос без лексики
+                    print(f"[LexicalIndex] Ошибка запроса: {e}")
+                return {}
+        if not rows:
+            return {}
+        best = -rows[0][2] or 1.0
+        return {str(dish_id): -rank / best for dish_id, _name, rank in rows}
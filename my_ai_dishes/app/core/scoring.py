@@ -1,8 +1,8 @@
 # app/core/scoring.py
 from typing import List
 import logging
-from app.models.schemas import DishWithScore
-from app.utils.advanced_llm_client import AdvancedLLMClient
+from ..models.schemas import DishWithScore
+from ..utils.advanced_llm_client import AdvancedLLMClient
 import math
 import json
 
@@ -1,28 +1,143 @@
 """
 Модуль для работы с векторной базой данных
+
+Читает индекс основного приложения (app/vector/index_files.py): manifest.json
+указывает на текущее поколение embeddings.NNNNNN.npy + meta.NNNNNN.json с
+контрольными суммами. Если поколение повреждено — берётся предыдущее целое
+(manifest.NNNNNN.json). Без манифеста читаются старые embeddings.npy +
+meta.json, но только при совпадении числа строк и id.
+
+Эмбеддинги отображаются в память (np.load с mmap_mode='r'): процессы делят
+одну копию в page cache, при старте матрица не десериализуется. Когда
+основное приложение пишет новое поколение (атомарная замена manifest.json),
+search() не чаще раза в RELOAD_CHECK_SECONDS замечает это и перечитывает индекс;
+новый индекс публикуется одним неизменяемым снимком (IndexSnapshot).
 """
+import hashlib
 import json
+import threading
+import time
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
 from pathlib import Path
 from ..config import EMBEDDINGS_NPY_PATH, META_JSON_PATH
 
+INDEX_FORMAT = 2
+RELOAD_CHECK_SECONDS = 1.0
+
+
+def _sha256_file(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _read_generation(directory: Path, manifest: Dict[str, Any]) -> Tuple[np.ndarray, List[str], Dict[str, Any]]:
+    """Эмбеддинги, ids и метаданные поколения; ValueError, если оно не прошло проверку"""
+    if manifest.get("format") != INDEX_FORMAT:
+        raise ValueError(f"неизвестный формат индекса: {manifest.get('format')}")
+    meta_bytes = (directory / manifest["meta"]).read_bytes()
+    if _sha256_file(directory / manifest["embeddings"]) != manifest["sha256"]["embeddings"]:
+        raise ValueError("контрольная сумма embeddings не совпадает")
+    if hashlib.sha256(meta_bytes).hexdigest() != manifest["sha256"]["meta"]:
+        raise ValueError("контрольная сумма meta не совпадает")
+    embeddings = np.load(directory / manifest["embeddings"], mmap_mode="r")
+    meta = json.loads(meta_bytes)
+    ids = [str(i) for i in meta["ids"]]
+    if embeddings.ndim != 2 or embeddings.shape != (manifest["rows"], manifest["dim"]) or len(ids) != manifest["rows"]:
+        raise ValueError(f"размеры не совпадают с манифестом: {embeddings.shape}, {len(ids)} id")
+    return embeddings, ids, meta["metadata"]
+
+
+def load_index(directory: Path) -> Optional[Tuple[np.ndarray, List[str], Dict[str, Any], Optional[int]]]:
+    """(embeddings, ids, metadata, generation) последнего целого поколения; None, если манифеста нет"""
+    manifests = []
+    for path in [directory / "manifest.json"] + sorted(directory.glob("manifest.*.json"), reverse=True):
+        try:
+            manifests.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    if not manifests:
+        return None
+    manifests.sort(key=lambda m: m.get("generation", 0), reverse=True)
+    errors = []
+    for manifest in manifests:
+        try:
+            embeddings, ids, metadata = _read_generation(directory, manifest)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            errors.append(f"поколение {manifest.get('generation')}: {e}")
+            print(f"[VectorStore] Поколение {manifest.get('generation')} повреждено, откат: {e}")
+            continue
+        return embeddings, ids, metadata, manifest.get("generation")
+    raise ValueError("; ".join(errors))
+
+
+class IndexSnapshot(NamedTuple):
+    """Загруженный индекс; публикуется целиком одним присваиванием и не меняется"""
+    embeddings: Any               # матрица (mmap) или []
+    normed: np.ndarray            # нормированные строки embeddings
+    dish_ids: Tuple[str, ...]     # id по строкам матрицы
+    dishes_meta: Dict[str, Any]   # {id: dish_data}
+    row_by_id: Dict[str, int]     # id -> строка матрицы (для scores_for)
+    generation: Optional[int]     # поколение индекса (None — старый формат)
+
+
+EMPTY_SNAPSHOT = IndexSnapshot([], np.zeros((0, 0), dtype=np.float32), (), {}, {}, None)
+
 
 class VectorStore:
-    """Класс для работы с векторной базой блюд"""
+    """Класс для работы с векторной базой блюд
+
+    Всё загруженное лежит в одном неизменяемом снимке self._snapshot: load() собирает
+    новый снимок в локальных переменных и подменяет ссылку одним присваиванием,
+    search() и scores_for() читают ссылку один раз. Поэтому перечитывание индекса
+    в одном потоке не может показать другому потоку id от одного поколения,
+    а строки или метаданные — от другого.
+    """
     
     def __init__(self, 
                  embeddings_path: Path = EMBEDDINGS_NPY_PATH,
                  meta_path: Path = META_JSON_PATH):
         self.embeddings_path = embeddings_path
         self.meta_path = meta_path
-        self.dishes_meta = {}  # Словарь {id: dish_data}
-        self.embeddings = []
-        self.dish_ids = []  # Сохраняем IDs для связи с метаданными
+        self._snapshot = EMPTY_SNAPSHOT
+        self._reload_lock = threading.Lock()  # одно перечитывание за раз
+        self._checked_at = 0.0  # time.monotonic() последней проверки manifest.json
+    
+    # Поля текущего снимка (только чтение)
+    @property
+    def embeddings(self):
+        return self._snapshot.embeddings
+    
+    @property
+    def dish_ids(self) -> Tuple[str, ...]:
+        return self._snapshot.dish_ids
+    
+    @property
+    def dishes_meta(self) -> Dict[str, Any]:
+        return self._snapshot.dishes_meta
+    
+    @property
+    def generation(self) -> Optional[int]:
+        return self._snapshot.generation
         
     def load(self) -> bool:
-        """Загрузка векторной базы из embeddings.npy и meta.json"""
+        """Загрузка векторной базы: поколение по manifest.json или старые embeddings.npy и meta.json.
+
+        При ошибке текущий снимок не меняется.
+        """
+        self._checked_at = time.monotonic()
         try:
+            index = load_index(self.embeddings_path.parent)
+            if index is not None:
+                embeddings, ids, meta_data, generation = index
+                print(f"[VectorStore] Поколение индекса {generation}: {len(embeddings)} векторов")
+                meta_data = {dish_id: meta_data.get(dish_id, {}) for dish_id in ids}
+                self._snapshot = _build_snapshot(embeddings, meta_data, generation)
+                return True
+            
             # Проверяем существование файлов
             if not self.embeddings_path.exists():
                 print(f"[VectorStore] Файл embeddings не найден: {self.embeddings_path}")
@@ -34,48 +149,21 @@ class VectorStore:
             
             # 1. Загружаем эмбеддинги
             print(f"[VectorStore] Загрузка эмбеддингов из: {self.embeddings_path}")
-            self.embeddings = np.load(self.embeddings_path)
-            print(f"[VectorStore] Загружено {len(self.embeddings)} векторов, размерность: {self.embeddings.shape[1]}")
+            embeddings = np.load(self.embeddings_path, mmap_mode="r")
+            print(f"[VectorStore] Загружено {len(embeddings)} векторов, размерность: {embeddings.shape[1]}")
             
             # 2. Загружаем метаданные
             print(f"[VectorStore] Загрузка метаданных из: {self.meta_path}")
             with open(self.meta_path, 'r', encoding='utf-8') as f:
                 meta_data = json.load(f)
             
-            # Преобразуем метаданные в нужный формат
-            self.dishes_meta = {}
-            self.dish_ids = []
-            
-            for dish_id, dish_data in meta_data.items():
-                # Сохраняем ID для связи с эмбеддингами (по индексу)
-                self.dish_ids.append(dish_id)
-                
-                # Обогащаем данные: добавляем ID и приводим к нужному формату
-                enriched_dish = {
-                    "id": dish_id,
-                    "name": dish_data.get("name", ""),
-                    "category": dish_data.get("category"),
-                    "price": dish_data.get("price", 0.0),
-                    "spice_level": dish_data.get("spice_level", 0),
-                    "is_vegan": dish_data.get("is_vegan", 0),
-                    # Поля, которых нет в meta.json - заполняем пустыми значениями
-                    "description": "",
-                    "ingredients": [],
-                    "tags": []
-                }
-                self.dishes_meta[dish_id] = enriched_dish
-            
-            print(f"[VectorStore] Загружено {len(self.dishes_meta)} блюд из meta.json")
-            
-            # 3. Проверяем соответствие количества
-            if len(self.embeddings) != len(self.dish_ids):
-                print(f"[WARNING] Несоответствие: {len(self.embeddings)} эмбеддингов vs {len(self.dish_ids)} блюд")
-                # Берем минимум для безопасности
-                min_len = min(len(self.embeddings), len(self.dish_ids))
-                self.embeddings = self.embeddings[:min_len]
-                self.dish_ids = self.dish_ids[:min_len]
-                print(f"[VectorStore] Исправлено до {min_len} записей")
+            # 3. Проверяем соответствие количества: при расхождении id попали бы на чужие векторы
+            if len(embeddings) != len(meta_data):
+                print(f"[VectorStore] Несоответствие: {len(embeddings)} эмбеддингов vs {len(meta_data)} блюд, "
+                      f"индекс не загружен (нужна переиндексация)")
+                return False
             
+            self._snapshot = _build_snapshot(embeddings, meta_data, None)
             return True
             
         except Exception as e:
@@ -84,29 +172,57 @@ class VectorStore:
             traceback.print_exc()
             return False
     
+    def reload_if_changed(self) -> bool:
+        """Перечитывает индекс, если manifest.json указывает на новое поколение"""
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return False
+        if not self._reload_lock.acquire(blocking=False):
+            return False  # перечитывает другой поток; пока ищем по текущему снимку
+        try:
+            self._checked_at = now
+            try:
+                manifest = json.loads((self.embeddings_path.parent / "manifest.json").read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                return False
+            if manifest.get("generation") == self.generation:
+                return False
+            # новое поколение не прочиталось — load() оставляет старый снимок
+            if self.load():
+                print(f"[VectorStore] Индекс перечитан: поколение {self.generation}")
+                return True
+            return False
+        finally:
+            self._reload_lock.release()
+    
     def search(self, query_vector: List[float], top_k: int = 10) -> List[Dict[str, Any]]:
         """Поиск ближайших векторов"""
-        if len(self.embeddings) == 0 or len(self.dish_ids) == 0:
+        self.reload_if_changed()
+        snapshot = self._snapshot
+        if len(snapshot.embeddings) == 0 or len(snapshot.dish_ids) == 0:
             return []
         
         # Конвертируем в numpy
-        query_vec = np.array(query_vector)
+        query_vec = np.asarray(query_vector, dtype=np.float32)
         
-        # Нормализуем для косинусного расстояния
+        # Нормализуем для косинусного расстояния (строки матрицы нормированы при загрузке)
         query_norm = query_vec / (np.linalg.norm(query_vec) + 1e-10)
-        embeddings_norm = self.embeddings / (np.linalg.norm(self.embeddings, axis=1, keepdims=True) + 1e-10)
         
         # Вычисляем косинусные сходства
-        similarities = np.dot(embeddings_norm, query_norm)
+        similarities = snapshot.normed @ query_norm
         
-        # Получаем индексы топ-K
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        # Получаем индексы топ-K: argpartition O(n), сортируем только k
+        k = min(top_k, len(similarities))
+        if k <= 0:
+            return []
+        top_indices = np.argpartition(similarities, -k)[-k:] if k < len(similarities) else np.arange(k)
+        top_indices = top_indices[np.argsort(similarities[top_indices])[::-1]]
         
         # Формируем результаты
         results = []
         for idx in top_indices:
-            dish_id = self.dish_ids[idx]
-            dish_data = self.dishes_meta[dish_id].copy()
+            dish_id = snapshot.dish_ids[idx]
+            dish_data = snapshot.dishes_meta[dish_id].copy()
             
             results.append({
                 "dish": dish_data,
@@ -115,12 +231,63 @@ class VectorStore:
         
         return results
     
+    def scores_for(self, query_vector: List[float], dish_ids: List[str]) -> List[Dict[str, Any]]:
+        """Косинусное сходство запроса с конкретными блюдами (для лексических совпадений вне top-K)"""
+        snapshot = self._snapshot
+        rows = [snapshot.row_by_id[i] for i in dish_ids if i in snapshot.row_by_id]
+        if not rows:
+            return []
+        query_vec = np.asarray(query_vector, dtype=np.float32)
+        query_norm = query_vec / (np.linalg.norm(query_vec) + 1e-10)
+        similarities = snapshot.normed[rows] @ query_norm
+        return [{"dish": snapshot.dishes_meta[snapshot.dish_ids[row]].copy(), "vector_score": float(sim)}
+                for row, sim in zip(rows, similarities)]
+    
     def get_stats(self) -> Dict[str, Any]:
         """Статистика векторной базы"""
+        snapshot = self._snapshot
         return {
-            "total_dishes": len(self.dishes_meta),
-            "dishes_with_embeddings": len(self.embeddings),
-            "embedding_dimension": self.embeddings.shape[1] if len(self.embeddings) > 0 else 0,
+            "total_dishes": len(snapshot.dishes_meta),
+            "dishes_with_embeddings": len(snapshot.embeddings),
+            "embedding_dimension": snapshot.embeddings.shape[1] if len(snapshot.embeddings) > 0 else 0,
             "embeddings_path": str(self.embeddings_path),
             "meta_path": str(self.meta_path)
-        }
\ No newline at end of file
+        }
+
+
+def _build_snapshot(embeddings, meta_data: Dict[str, Any], generation: Optional[int]) -> IndexSnapshot:
+    """Снимок индекса; meta_data — {id: данные блюда} в порядке строк матрицы"""
+    dish_ids = []
+    dishes_meta = {}
+    
+    for dish_id, dish_data in meta_data.items():
+        # Сохраняем ID для связи с эмбеддингами (по индексу)
+        dish_ids.append(dish_id)
+        
+        # Обогащаем данные: добавляем ID и приводим к нужному формату
+        enriched_dish = {
+            "id": dish_id,
+            "name": dish_data.get("name", ""),
+            "category": dish_data.get("category"),
+            "price": dish_data.get("price", 0.0),
+            "spice_level": dish_data.get("spice_level", 0),
+            "is_vegan": dish_data.get("is_vegan", 0),
+            # Поля, которых нет в meta.json - заполняем пустыми значениями
+            "description": "",
+            "ingredients": [],
+            "tags": []
+        }
+        dishes_meta[dish_id] = enriched_dish
+    
+    print(f"[VectorStore] Загружено {len(dishes_meta)} блюд")
+    
+    # Нормируем один раз при загрузке: search — одно умножение матрицы на вектор.
+    # Основное приложение пишет строки уже нормированными — тогда берём mmap без копии.
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    if embeddings.dtype == np.float32 and np.allclose(norms[norms > 1e-3], 1, atol=1e-3):
+        normed = embeddings
+    else:
+        normed = np.ascontiguousarray(embeddings / (norms + 1e-10), dtype=np.float32)
+    
+    return IndexSnapshot(embeddings, normed, tuple(dish_ids), dishes_meta,
+                         {dish_id: i for i, dish_id in enumerate(dish_ids)}, generation)
@@ -25,6 +25,9 @@ VECTOR_STORE_DIR = PROJECT_MAIN_DIR / "data" / "vector_store"
 EMBEDDINGS_NPY_PATH = VECTOR_STORE_DIR / "embeddings.npy"
 META_JSON_PATH = VECTOR_STORE_DIR / "meta.json"
 
+# Основная база (FTS5-индекс блюд для лексического поиска)
+SQLITE_DB_PATH = PROJECT_MAIN_DIR / "db" / "tea_house.db"
+
 print(f"[SETTINGS] Путь к vector_store: {VECTOR_STORE_DIR}")
 print(f"[SETTINGS] Путь к embeddings: {EMBEDDINGS_NPY_PATH}")
 print(f"[SETTINGS] Путь к meta: {META_JSON_PATH}")
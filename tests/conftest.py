@@ -0,0 +1,19 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+import pytest
+
+# корень проекта — в sys.path, чтобы импортировался пакет app
+ROOT = str(Path(__file__).resolve().parents[1])
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def db():
+    """Временная база из db/init.sql; sqlite_db на время теста смотрит в неё"""
+    from benchmarks.common import temp_database
+    from app.db import sqlite_db
+    with temp_database():
+        yield sqlite_db
@@ -0,0 +1,28 @@
+# tests/test_order_statuses.py
+
+
+def _status(db, order_id):
+    with db.connection() as conn:
+        return conn.execute("SELECT status FROM orders WHERE id = ?", (order_id,)).fetchone()['status']
+
+
+def test_legacy_completed_order_cannot_move_back(db):
+    assert _status(db, 1) == 'completed'  # так заказ заведён в init.sql
+    res, = db.update_order_statuses([(1, 'ожидает')])
+    assert not res['ok'] and res['error'] == 'invalid_transition'
+    res, = db.update_order_statuses([(1, 'выдан')])
+    assert res['ok'] and res.get('unchanged')
+    assert _status(db, 1) == 'completed'
+
+
+def test_legacy_pending_order_moves_forward(db):
+    res, = db.update_order_statuses([(2, 'готовится')])
+    assert res['ok'] and not res.get('unchanged')
+    assert _status(db, 2) == 'готовится'
+
+
+def test_unknown_current_status_is_rejected(db):
+    db.write(lambda conn: conn.execute("UPDATE orders SET status = 'lost' WHERE id = 2"))
+    res, = db.update_order_statuses([(2, 'готов')])
+    assert not res['ok'] and res['error'] == 'unknown_current_status'
+    assert _status(db, 2) == 'lost'
@@ -0,0 +1,40 @@
+# tests/test_orders.py
+import pytest
+
+
+def _dish(db, available=True):
+    with db.connection() as conn:
+        return conn.execute("SELECT id, price FROM dishes WHERE is_available = ? LIMIT 1",
+                            (int(available),)).fetchone()
+
+
+def test_quantity_below_one_is_rejected(db):
+    dish = _dish(db)
+    with pytest.raises(db.OrderValidationError) as e:
+        db.create_order(None, '1', [{'dish_id': dish['id'], 'quantity': 1},
+                                    {'dish_id': dish['id'], 'quantity': -5}])
+    assert e.value.bad_quantity == [dish['id']]
+
+
+def test_price_and_availability_are_read_at_write_time(db):
+    dish = _dish(db)
+    # цена меняется в обход этого процесса (как из другого рабочего процесса)
+    with db.connection() as conn:
+        conn.execute("UPDATE dishes SET price = price + 100 WHERE id = ?", (dish['id'],))
+    oid = db.create_order(None, '1', [{'dish_id': dish['id'], 'quantity': 2}])
+    with db.connection() as conn:
+        total = conn.execute("SELECT total FROM orders WHERE id = ?", (oid,)).fetchone()['total']
+        conn.execute("UPDATE dishes SET is_available = 0 WHERE id = ?", (dish['id'],))
+    assert total == pytest.approx((dish['price'] + 100) * 2)
+    with pytest.raises(db.OrderValidationError) as e:
+        db.create_order(None, '1', [{'dish_id': dish['id'], 'quantity': 1}])
+    assert e.value.unavailable == [dish['id']]
+
+
+def test_deleted_dish_is_a_validation_error(db):
+    dish = _dish(db)
+    with db.connection() as conn:
+        conn.execute("DELETE FROM dishes WHERE id = ?", (dish['id'],))
+    with pytest.raises(db.OrderValidationError) as e:
+        db.create_order(None, '1', [{'dish_id': dish['id'], 'quantity': 1}])
+    assert e.value.unknown == [dish['id']]
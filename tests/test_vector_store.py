@@ -0,0 +1,59 @@
+# tests/test_vector_store.py
+import os
+
+import numpy as np
+import pytest
+
+from app.vector import vector_store
+
+
+@pytest.fixture
+def persist_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, 'PERSIST', str(tmp_path))
+    return tmp_path
+
+
+def _corrupt(path):
+    with open(path, 'r+b') as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b'\xff\xff\xff\xff')
+
+
+def test_upsert_after_rollback_survives_reload_and_flush(persist_dir):
+    store = vector_store.NumpyVectorStore()
+    store.upsert_many((i, np.eye(8)[i], {'i': i}) for i in range(5))
+    store.upsert_many([(5, np.eye(8)[5], {'i': 5})])
+    assert store.generation == 2
+    _corrupt(persist_dir / 'embeddings.000002.npy')
+
+    store = vector_store.NumpyVectorStore()
+    assert store.generation == 1 and len(store) == 5
+    store.upsert(100, np.ones(8), {'i': 100})
+    assert (persist_dir / 'journal.000001.ndjson').exists()
+
+    store.reload_if_changed(force=True)
+    assert '100' in store.ids
+    assert store._in_sync()
+    assert store.flush()
+
+    fresh = vector_store.NumpyVectorStore()
+    assert '100' in fresh.ids and len(fresh) == 6
+    assert fresh.query(np.ones(8), 1)[0]['id'] == 100
+
+
+def test_journal_append_by_other_worker_replays_only_the_tail(persist_dir, monkeypatch):
+    store = vector_store.NumpyVectorStore()
+    store.upsert_many((i, np.eye(8)[i], {'i': i}) for i in range(8))
+    base = store._base
+    hashed = []
+    real_sha = vector_store.index_files._sha256_file
+    monkeypatch.setattr(vector_store.index_files, '_sha256_file', lambda path: hashed.append(path) or real_sha(path))
+
+    other = vector_store.NumpyVectorStore()   # второй рабочий процесс
+    other.upsert(42, np.ones(8), {'i': 42})
+    other.delete(3)
+
+    assert store.reload_if_changed(force=True)
+    assert store._base is base and hashed == []
+    assert '42' in store.ids and '3' not in store.ids
+    assert store.query(np.ones(8), 1)[0]['id'] == 42
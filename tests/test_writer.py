@@ -0,0 +1,27 @@
+# tests/test_writer.py
+import sqlite3
+
+import pytest
+
+from app.db.writer import WriteQueue
+
+
+def test_writer_survives_connect_failure(tmp_path):
+    path = str(tmp_path / 'w.db')
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise sqlite3.OperationalError("unable to open database file")
+        return sqlite3.connect(path, check_same_thread=False)
+
+    writer = WriteQueue(connect)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            writer.run(lambda conn: conn.execute("CREATE TABLE t (x)"))
+        writer.run(lambda conn: conn.execute("CREATE TABLE t (x)"))
+        assert writer.run(lambda conn: conn.execute("INSERT INTO t VALUES (1)").lastrowid) == 1
+    finally:
+        writer.close()
+    assert len(attempts) == 2